@@ -1,17 +1,80 @@
 """OLAP Cubes"""
 
+import sys
+
 __version__ = "1.1"
 
-from .common import *
-from .query import *
-from .metadata import *
-from .workspace import *
-from .errors import *
-from .formatters import *
-from .mapper import *
-from .calendar import *
-from .auth import *
-from .logging import *
-from .namespace import *
+# Submodules which public names are available in the package. The submodules
+# are imported when one of their names is used for the first time, so
+# importing the package does not import SQLAlchemy, Flask or other packages
+# that are not needed. The modules are searched in this order - modules that
+# are fast to import go first.
+_EXPORTING_MODULES = [
+    "errors",
+    "logging",
+    "common",
+    "namespace",
+    "metadata",
+    "calendar",
+    "query",
+    "auth",
+    "mapper",
+    "workspace",
+    "formatters",
+]
+
+
+def _public_names(module):
+    """Returns names that would be imported by ``from module import *``."""
+    try:
+        return list(module.__all__)
+    except AttributeError:
+        return [name for name in dir(module) if not name.startswith("_")]
+
+
+if sys.version_info >= (3, 7):
+    import importlib
+    import importlib.util
+
+    def __getattr__(name):
+        if name == "__all__":
+            names = []
+            for module_name in _EXPORTING_MODULES:
+                module = importlib.import_module("." + module_name, __name__)
+                names += _public_names(module)
+            return names
+
+        # Submodule, such as cubes.sql or cubes.compat. It has to be checked
+        # first - `from . import compat` in a submodule asks for the
+        # attribute while the exporting modules are being imported.
+        module_name = "%s.%s" % (__name__, name)
+        if module_name in sys.modules \
+                or importlib.util.find_spec(module_name) is not None:
+            return importlib.import_module(module_name)
+
+        for module_name in _EXPORTING_MODULES:
+            module = importlib.import_module("." + module_name, __name__)
+            if name in _public_names(module):
+                value = getattr(module, name)
+                globals()[name] = value
+                return value
+
+        raise AttributeError("module '%s' has no attribute '%s'"
+                             % (__name__, name))
 
+    def __dir__():
+        return sorted(set(list(globals().keys()) + __getattr__("__all__")))
 
+else:
+    # Module __getattr__() is not supported
+    from .common import *
+    from .query import *
+    from .metadata import *
+    from .workspace import *
+    from .errors import *
+    from .formatters import *
+    from .mapper import *
+    from .calendar import *
+    from .auth import *
+    from .logging import *
+    from .namespace import *
@@ -174,6 +174,52 @@ class Calendar(object):
 
         return path
 
+    def path_time(self, path, units):
+        """Returns a datetime of the beginning of the period represented by
+        `path` with date/time `units`. The path has to contain the year.
+        Paths with `weekday` unit can not be converted to time."""
+
+        if isinstance(units, Hierarchy):
+            units = calendar_hierarchy_units(units)
+
+        values = dict(zip(units, path))
+
+        if "weekday" in values:
+            raise ArgumentError("Can not get time of a path with weekday")
+        if "year" not in values:
+            raise ArgumentError("Can not get time of a path without year")
+
+        try:
+            if "month" in values:
+                month = int(values["month"])
+            elif "quarter" in values:
+                month = (int(values["quarter"]) - 1) * 3 + 1
+            else:
+                month = 1
+
+            time = datetime(int(values["year"]),
+                            month,
+                            int(values.get("day", 1)),
+                            int(values.get("hour", 0)),
+                            int(values.get("minute", 0)))
+        except (TypeError, ValueError) as e:
+            raise ArgumentError("Invalid calendar path %s: %s" % (path, e))
+
+        return time
+
+    def shift_path(self, path, units, unit, amount):
+        """Returns `path` with date/time `units` shifted by `amount` of
+        calendar `unit`s, for example the previous month of a year-month path
+        is ``calendar.shift_path(path, units, "month", -1)``."""
+
+        if isinstance(units, Hierarchy):
+            units = calendar_hierarchy_units(units)
+
+        units = units[:len(path)]
+        time = add_time_units(self.path_time(path, units), unit, amount)
+
+        return self.path(time, units)
+
     def now_path(self, units):
         """Returns a path representing current date and time with `units` as
         path items."""
@@ -5,9 +5,13 @@ levels"""
 
 from __future__ import absolute_import
 
+import importlib
 import re
 import os.path
 import json
+import operator
+import threading
+import time
 
 from collections import OrderedDict
 
@@ -16,7 +20,9 @@ from . import compat
 
 __all__ = [
     "IgnoringDictionary",
+    "LRUCache",
     "MissingPackage",
+    "LazyPackage",
     "localize_common",
     "localize_attributes",
     "get_localizable_attributes",
@@ -26,6 +32,7 @@ __all__ = [
     "assert_all_instances",
     "read_json_file",
     "sorted_dependencies",
+    "record_rows",
 ]
 
 class IgnoringDictionary(OrderedDict):
@@ -47,6 +54,81 @@ class IgnoringDictionary(OrderedDict):
 
         return "{%s}" % ", ".join(items)
 
+
+class LRUCache(object):
+    def __init__(self, size=None, timeout=None):
+        """Creates a thread-safe cache of at most `size` items (unlimited if
+        ``None``). The least recently used items are removed first. Items
+        expire `timeout` seconds after they were stored, if specified."""
+
+        self.size = size
+        self.timeout = timeout
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Returns the value for `key` or `default` if there is no such item
+        or if it has expired."""
+
+        with self._lock:
+            try:
+                (value, expires) = self._items.pop(key)
+            except KeyError:
+                return default
+
+            if expires is not None and expires < time.time():
+                return default
+
+            self._items[key] = (value, expires)
+
+        return value
+
+    def set(self, key, value):
+        """Stores `value` for `key`."""
+
+        if self.timeout is not None:
+            expires = time.time() + self.timeout
+        else:
+            expires = None
+
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (value, expires)
+
+            if self.size is not None:
+                while len(self._items) > self.size:
+                    self._items.popitem(last=False)
+
+    def remove(self, key):
+        """Removes item `key` from the cache, if it is present."""
+        with self._lock:
+            self._items.pop(key, None)
+
+    def remove_where(self, predicate):
+        """Removes items which keys match the `predicate` – a function of
+        one argument. Returns number of removed items."""
+        with self._lock:
+            keys = [key for key in self._items if predicate(key)]
+            for key in keys:
+                del self._items[key]
+
+        return len(keys)
+
+    def keys(self):
+        """Returns list of keys of the cached items (including expired
+        items), the least recently used first."""
+        with self._lock:
+            return list(self._items.keys())
+
+    def clear(self):
+        """Removes all items from the cache."""
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
 def assert_instance(obj, class_, label):
     """Raises ArgumentError when `obj` is not instance of `cls`"""
     if not isinstance(obj, class_):
@@ -104,6 +186,41 @@ class MissingPackage(object):
                                   (self.package, source, use, comment))
 
 
+class LazyPackage(object):
+    """Placeholder of an optional package that is imported on the first use
+    of its attribute, together with its `submodules`. Packages that are slow
+    to import and are needed only for certain features are not imported with
+    Cubes. If the package is not installed, then it behaves as
+    `MissingPackage`."""
+
+    def __init__(self, package, feature=None, submodules=None, source=None,
+                 comment=None):
+        self._package = package
+        self._feature = feature
+        self._submodules = submodules or []
+        self._source = source
+        self._comment = comment
+        self._module = None
+
+    def __getattr__(self, name):
+        # Only attributes of the package get here
+        if name.startswith("__") or name in ("_module", "_package"):
+            raise AttributeError(name)
+
+        if self._module is None:
+            try:
+                module = importlib.import_module(self._package)
+                for submodule in self._submodules:
+                    importlib.import_module("%s.%s" % (self._package,
+                                                       submodule))
+            except ImportError:
+                module = MissingPackage(self._package, self._feature,
+                                        self._source, self._comment)
+            self._module = module
+
+        return getattr(self._module, name)
+
+
 def optional_import(name, feature=None, source=None, comment=None):
     """Optionally import package `name`. If package does not exist, import a
     placeholder object, that raises an exception with more detailed
@@ -130,6 +247,41 @@ def expand_dictionary(record, separator='.'):
         current[path[-1]] = value
     return result
 
+def record_rows(records, fields):
+    """Returns an iterator of tuples of `fields` values from `records`.
+    Iterators that are able to provide rows directly, such as SQL result
+    iterators, are asked for the rows with their method `rows(fields)`.
+    Missing fields are ``None``."""
+
+    if hasattr(records, "rows"):
+        return records.rows(fields)
+    else:
+        return _dictionary_rows(records, fields)
+
+
+def _dictionary_rows(records, fields):
+    """Yields tuples of `fields` values of dictionaries `records`."""
+
+    if not fields:
+        for record in records:
+            yield ()
+        return
+
+    getter = operator.itemgetter(*fields)
+    single = len(fields) == 1
+
+    for record in records:
+        try:
+            row = getter(record)
+        except KeyError:
+            row = tuple(record.get(field) for field in fields)
+        else:
+            if single:
+                row = (row, )
+
+        yield row
+
+
 def localize_common(obj, trans):
     """Localize common attributes: label and description"""
 
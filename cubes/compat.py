@@ -14,10 +14,7 @@ if py3k:
     int_types = int,
     iterbytes = iter
 
-    from urllib.parse import urlparse
-    from urllib.request import urlopen, build_opener
-    from urllib.request import HTTPPasswordMgrWithDefaultRealm
-    from urllib.request import HTTPBasicAuthHandler
+    from urllib.parse import urlparse, parse_qs
     from urllib.parse import urlencode
     from configparser import ConfigParser
     from io import StringIO
@@ -33,13 +30,38 @@ if py3k:
     def open_unicode(filename):
         return open(filename, encoding="utf-8")
 
+    def intern_string(s):
+        """Returns interned `s` if it is a native string, otherwise returns
+        `s`."""
+        if type(s) is str:
+            return sys.intern(s)
+        return s
+
+    # urllib.request (with http.client, email and ssl) is slow to import and
+    # needed only for models and stores behind an URL
+    def urlopen(*args, **kwargs):
+        from urllib.request import urlopen
+        return urlopen(*args, **kwargs)
+
+    def build_opener(*handlers):
+        from urllib.request import build_opener
+        return build_opener(*handlers)
+
+    def HTTPPasswordMgrWithDefaultRealm():
+        from urllib.request import HTTPPasswordMgrWithDefaultRealm
+        return HTTPPasswordMgrWithDefaultRealm()
+
+    def HTTPBasicAuthHandler(password_mgr=None):
+        from urllib.request import HTTPBasicAuthHandler
+        return HTTPBasicAuthHandler(password_mgr)
+
 else:
     string_type = basestring
     binary_type = str
     text_type = unicode
     int_types = int, long
 
-    from urlparse import urlparse
+    from urlparse import urlparse, parse_qs
     from urllib2 import urlopen, build_opener
     from urllib2 import HTTPPasswordMgrWithDefaultRealm
     from urllib2 import HTTPBasicAuthHandler
@@ -67,3 +89,10 @@ else:
 
     def open_unicode(filename):
         return open(filename)
+
+    def intern_string(s):
+        """Returns interned `s` if it is a native string, otherwise returns
+        `s`."""
+        if type(s) is str:
+            return intern(s)
+        return s
@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
+import json
+import os
 from collections import OrderedDict
 from textwrap import dedent
-from pkg_resources import iter_entry_points
 
 from .common import decamelize, coalesce_options
 from .errors import ArgumentError, InternalError, BackendError
+from .errors import ConfigurationError
 
 
 __all__ = [
     "EXTENSION_TYPES",
     "ExtensionFinder",
+    "scan_entry_points",
+    "write_extension_index",
+    "read_extension_index",
+    "use_extension_index",
 ]
 
 # Known extension types.
@@ -72,6 +78,29 @@ _BUILTIN_EXTENSIONS = {
 _DEFAULT_OPTIONS = {
 }
 
+# Version of the extension index file format
+EXTENSION_INDEX_VERSION = 1
+
+# Environment variable with path to the extension index file
+EXTENSION_INDEX_VARIABLE = "CUBES_EXTENSION_INDEX"
+
+# Extensions advertised through entry points: dictionary of extension types
+# and dictionaries of names and references. `None` – not loaded yet, entry
+# points are scanned, if the index is not specified in the environment.
+_extension_index = None
+
+
+class _IndexEntry(object):
+    """Extension entry from the extension index – replacement of the entry
+    point object."""
+    def __init__(self, name, reference):
+        self.name = name
+        self.reference = reference
+
+    def load(self):
+        return _load_reference(self.reference)
+
+
 class _Extension(object):
     """
     Cubes Extension wrapper.
@@ -139,6 +168,10 @@ class _Extension(object):
 
         self.option_types = self.option_types or {}
 
+    def load(self):
+        """Loads the extension factory. Returns the factory."""
+        return self.factory
+
     @property
     def is_builtin(self):
         return self.entry is None
@@ -173,24 +206,44 @@ class ExtensionFinder(object):
         self.type_ = type_
         self.group = "cubes.{}".format(type_)
         self.extensions = {}
+        self.discovered = False
 
         self.builtins = _BUILTIN_EXTENSIONS.get(self.type_, {})
 
-    def discover(self, name=None):
-        """Find all entry points."""
-        for obj in iter_entry_points(group=self.group, name=name):
-            ext = _Extension(self.type_, obj)
-            self.extensions[ext.name] = ext
+    def discover(self, force=False):
+        """Find all entry points. The entry points are found only once, or
+        read from the extension index, if it is used (see
+        `use_extension_index()`). Set `force` to `True` to find them again.
+        Extensions that were already loaded are kept."""
+
+        if self.discovered and not force:
+            return
+
+        index = _get_extension_index()
+
+        if index is not None:
+            entries = [_IndexEntry(name, reference)
+                       for name, reference
+                       in index.get(self.type_, {}).items()]
+        else:
+            # pkg_resources is slow to import, it is needed only for
+            # extensions which are not built-in
+            from pkg_resources import iter_entry_points
+            entries = iter_entry_points(group=self.group)
+
+        for entry in entries:
+            if entry.name not in self.extensions:
+                self.extensions[entry.name] = _Extension(self.type_, entry)
+
+        self.discovered = True
 
     def builtin(self, name):
         try:
-            ext_mod = self.builtins[name]
+            reference = self.builtins[name]
         except KeyError:
             return None
 
-        (modname, attr) = ext_mod.split(":")
-        module = _load_module(modname)
-        factory = getattr(module, attr)
+        factory = _load_reference(reference)
         ext = _Extension(self.type_, name=name, factory=factory)
         self.extensions[name] = ext
 
@@ -198,16 +251,16 @@ class ExtensionFinder(object):
 
     def names(self):
         """Return list of extension names."""
-        if not self.extensions:
-            self.discover()
+        self.discover()
 
-        names = list(self.builtins.keys())
-        names += self.extensions.keys()
+        names = set(self.builtins.keys())
+        names |= set(self.extensions.keys())
 
         return sorted(names)
 
     def get(self, name):
-        """Return extenson object by name. Load if necessary."""
+        """Return extenson object by name. Load if necessary. Extensions are
+        kept once they are loaded."""
         ext = self.extensions.get(name)
 
         if not ext:
@@ -246,13 +299,128 @@ class ExtensionFinder(object):
         return ext.create(*args, **kwargs)
 
     def register(self, _ext_name, factory):
-        ext = _Extension(self.type_, name=_ext_name)
-        ext.factory = factory
-        self.extensions["name"] = ext
+        ext = _Extension(self.type_, name=_ext_name, factory=factory)
+        self.extensions[_ext_name] = ext
 
         return ext
 
 
+def _load_reference(reference):
+    """Returns object referenced as ``module:attribute`` where the attribute
+    might be a dotted path. The whole module is returned if there is no
+    attribute."""
+
+    (modname, _, attrs) = reference.partition(":")
+    obj = _load_module(modname)
+
+    if attrs:
+        for attr in attrs.split("."):
+            obj = getattr(obj, attr)
+
+    return obj
+
+
+def _entry_reference(entry):
+    """Returns reference ``module:attribute`` of entry point `entry`."""
+    if entry.attrs:
+        return "{}:{}".format(entry.module_name, ".".join(entry.attrs))
+    else:
+        return entry.module_name
+
+
+def scan_entry_points():
+    """Returns a dictionary of extension types and dictionaries of names and
+    references (``module:attribute``) of all extensions advertised through
+    entry points of installed packages."""
+
+    from pkg_resources import iter_entry_points
+
+    index = {}
+    for type_ in _BUILTIN_EXTENSIONS:
+        group = "cubes.{}".format(type_)
+        index[type_] = {entry.name: _entry_reference(entry)
+                        for entry in iter_entry_points(group=group)}
+
+    return index
+
+
+def write_extension_index(path):
+    """Scans the entry points of installed packages and writes them to the
+    extension index file `path` (JSON). The index should be written again
+    when packages with Cubes extensions are installed or removed. Returns
+    the index dictionary."""
+
+    index = scan_entry_points()
+    content = {
+        "version": EXTENSION_INDEX_VERSION,
+        "extensions": index
+    }
+
+    temp_path = "%s.%d.tmp" % (path, os.getpid())
+    replace = getattr(os, "replace", os.rename)
+
+    with open(temp_path, "w") as f:
+        json.dump(content, f, indent=4, sort_keys=True)
+    replace(temp_path, path)
+
+    return index
+
+
+def read_extension_index(path):
+    """Reads the extension index file `path` written by
+    `write_extension_index()`."""
+
+    try:
+        with open(path) as f:
+            content = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        raise ConfigurationError("Can not read extension index '{}': {}"
+                                 .format(path, e))
+
+    if not isinstance(content, dict) \
+            or content.get("version") != EXTENSION_INDEX_VERSION:
+        raise ConfigurationError("Extension index '{}' has unknown version, "
+                                 "it should be written again".format(path))
+
+    return content.get("extensions", {})
+
+
+def use_extension_index(path):
+    """Use extensions from the index file `path` instead of scanning the
+    entry points. `None` means to scan the entry points again. Extensions
+    that were already loaded are kept."""
+
+    global _extension_index
+
+    if path is None:
+        _extension_index = False
+    else:
+        _extension_index = read_extension_index(path)
+
+    for finder in _FINDERS:
+        finder.discovered = False
+
+
+def _get_extension_index():
+    """Returns the extension index or `None` if the entry points should be
+    scanned. The index is read from the file specified in the environment
+    variable ``CUBES_EXTENSION_INDEX`` on the first use."""
+
+    global _extension_index
+
+    if _extension_index is None:
+        path = os.environ.get(EXTENSION_INDEX_VARIABLE)
+        if path:
+            _extension_index = read_extension_index(path)
+        else:
+            _extension_index = False
+
+    if _extension_index is False:
+        return None
+    else:
+        return _extension_index
+
+
 def _load_module(modulepath):
     """Load module `modulepath` and return the last module object in the
     module path."""
@@ -272,3 +440,6 @@ formatter = ExtensionFinder("formatters")
 model_provider = ExtensionFinder("providers")
 request_log_handler = ExtensionFinder("request_log_handlers")
 store = ExtensionFinder("stores")
+
+_FINDERS = [authenticator, authorizer, browser, formatter, model_provider,
+            request_log_handler, store]
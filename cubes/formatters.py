@@ -6,39 +6,51 @@ import codecs
 import csv
 import datetime
 import decimal
+import itertools
 import json
-import os
-import tempfile
-from collections import namedtuple
+import math
+import re
+import struct
+import time
+import zlib
+from collections import namedtuple, OrderedDict
 
 try:
-    import jinja2
+    import orjson
 except ImportError:
-    from .common import MissingPackage
-
-    jinja2 = MissingPackage("jinja2", "Templating engine")
-
-try:
-    import openpyxl
-except ImportError:
-    from .common import MissingPackage
-
-    openpyxl = MissingPackage('openpyxl', 'pyexcel or other xlsx/xlsm reader/writer')
+    # The standard library encoder is used instead
+    orjson = None
 
 from .errors import ArgumentError
+from .common import record_rows, LazyPackage
 from . import compat
 from . import ext
 
 from .query import SPLIT_DIMENSION_NAME
 
+# Imported when used – they are slow to import
+jinja2 = LazyPackage("jinja2", "Templating engine")
+pyarrow = LazyPackage("pyarrow", "Arrow and Parquet output",
+                      submodules=["parquet"])
+
 __all__ = [
     "create_formatter",
+    "make_cross_table",
+    "pivot_cross_table",
     "CrossTableFormatter",
     "HTMLCrossTableFormatter",
     "SlicerJSONEncoder",
+    "FastJSONEncoder",
+    "json_encoder",
+    "convert_records",
     "csv_generator",
     'xlsx_generator',
+    "arrow_generator",
+    "arrow_field_types",
     "JSONLinesGenerator",
+    "compact_records",
+    "expand_records",
+    "ColumnConverters",
 ]
 
 
@@ -91,40 +103,488 @@ def csv_generator_p2(records, fields, include_header=True, header=None,
 
 
 def csv_generator_p3(records, fields, include_header=True, header=None,
-                     dialect=csv.excel):
-    def _row_string(row):
-        writer.writerow(row)
-        data = queue.getvalue()
-        queue.truncate(0)
+                     dialect=csv.excel, chunk_size=None):
+    """Yields CSV output of `records` in chunks of approximately
+    `chunk_size` characters (default is `CHUNK_SIZE`). Values are converted
+    by the `csv` module."""
 
-        return data
+    chunk_size = chunk_size or CHUNK_SIZE
 
     queue = compat.StringIO()
     writer = csv.writer(queue, dialect=dialect)
 
     if include_header:
-        yield _row_string(header or fields)
-
-    for record in records:
-        row = [record.get(field) for field in fields]
-
-        yield _row_string(row)
+        writer.writerow(header or fields)
+
+    for rows in _row_batches(records, fields):
+        writer.writerows(rows)
+
+        if queue.tell() >= chunk_size:
+            yield queue.getvalue()
+            queue.seek(0)
+            queue.truncate()
+
+    yield queue.getvalue()
+
+
+# Size of output chunks of the buffered writers
+CHUNK_SIZE = 64 * 1024
+
+# Number of rows written at once by the buffered writers
+ROW_BATCH_SIZE = 256
+
+# Size of the uncompressed data to be compressed at once by the streaming
+# XLSX writer
+XLSX_CHUNK_SIZE = CHUNK_SIZE
+
+
+def _row_batches(records, fields, size=ROW_BATCH_SIZE):
+    """Yields lists of at most `size` rows of `fields` of `records`."""
+
+    rows = record_rows(records, fields)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            break
+        yield batch
+
+_XLSX_CONTENT_TYPES = u"""\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">\
+<Default Extension="rels" \
+ContentType="application/vnd.openxmlformats-package.relationships+xml"/>\
+<Default Extension="xml" ContentType="application/xml"/>\
+<Override PartName="/xl/workbook.xml" \
+ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>\
+<Override PartName="/xl/worksheets/sheet1.xml" \
+ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>\
+<Override PartName="/xl/styles.xml" \
+ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>\
+</Types>"""
+
+_XLSX_RELS = u"""\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">\
+<Relationship Id="rId1" \
+Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" \
+Target="xl/workbook.xml"/>\
+</Relationships>"""
+
+_XLSX_WORKBOOK = u"""\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" \
+xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">\
+<sheets><sheet name="%s" sheetId="1" r:id="rId1"/></sheets>\
+</workbook>"""
+
+_XLSX_WORKBOOK_RELS = u"""\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">\
+<Relationship Id="rId1" \
+Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" \
+Target="worksheets/sheet1.xml"/>\
+<Relationship Id="rId2" \
+Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" \
+Target="styles.xml"/>\
+</Relationships>"""
+
+# Cell styles: 0 – general, 1 – date, 2 – date and time
+_XLSX_STYLES = u"""\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">\
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>\
+<fills count="2"><fill><patternFill patternType="none"/></fill>\
+<fill><patternFill patternType="gray125"/></fill></fills>\
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border>\
+</borders>\
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/>\
+</cellStyleXfs>\
+<cellXfs count="3">\
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>\
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" \
+applyNumberFormat="1"/>\
+<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" \
+applyNumberFormat="1"/>\
+</cellXfs>\
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/>\
+</cellStyles>\
+</styleSheet>"""
+
+_XLSX_SHEET_START = u"""\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">\
+<sheetData>"""
+
+_XLSX_SHEET_END = u"</sheetData></worksheet>"
+
+_XLSX_EPOCH = datetime.datetime(1899, 12, 30)
+
+# Characters that are not allowed in XML 1.0 documents
+_XML_ILLEGAL_RX = re.compile(u"[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+def _xml_escape(text, entities=None):
+    """Escapes ``&``, ``<``, ``>`` and other `entities` in `text` as
+    `xml.sax.saxutils.escape()` does. The `xml.sax` package imports
+    `urllib.request`, which is slow to import."""
+
+    text = text.replace("&", "&amp;").replace(">", "&gt;")
+    text = text.replace("<", "&lt;")
+
+    for character, entity in (entities or {}).items():
+        text = text.replace(character, entity)
+
+    return text
+
+
+class _ZipStream(object):
+    """Minimal writer of a ZIP archive to a stream of byte chunks. Entries
+    are deflated as they are written and their sizes and checksums follow
+    the data in data descriptors, therefore nothing has to be seeked back
+    and only one chunk is kept in memory.
+
+    Note: ZIP64 is not supported – the archive and its entries have to be
+    smaller than 4 GB."""
+
+    def __init__(self):
+        self.offset = 0
+        self.entries = []
+        (year, month, day, hour, minute, second) = time.localtime()[0:6]
+        self.dos_time = (hour << 11) | (minute << 5) | (second // 2)
+        self.dos_date = ((year - 1980) << 9) | (month << 5) | day
+
+    def _output(self, data):
+        self.offset += len(data)
+        if self.offset > 0xFFFFFFFF:
+            raise ArgumentError("XLSX output is larger than 4 GB")
+        return data
 
+    def entry(self, name, chunks):
+        """Yields bytes of a ZIP entry `name` with content from the
+        iterable of unicode string `chunks`."""
+
+        name = name.encode("utf-8")
+        header_offset = self.offset
+
+        yield self._output(struct.pack("<IHHHHHIIIHH",
+                                       0x04034b50, 20, 0x08, 8,
+                                       self.dos_time, self.dos_date,
+                                       0, 0, 0, len(name), 0) + name)
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        crc = 0
+        size = 0
+        compressed_size = 0
+
+        for chunk in chunks:
+            data = chunk.encode("utf-8")
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+
+            data = compressor.compress(data)
+            if data:
+                compressed_size += len(data)
+                yield self._output(data)
+
+        data = compressor.flush()
+        compressed_size += len(data)
+        crc &= 0xFFFFFFFF
+
+        if size > 0xFFFFFFFF:
+            raise ArgumentError("XLSX sheet is larger than 4 GB")
+
+        yield self._output(data + struct.pack("<IIII", 0x08074b50, crc,
+                                              compressed_size, size))
+
+        self.entries.append((name, crc, compressed_size, size,
+                             header_offset))
+
+    def close(self):
+        """Returns bytes of the central directory of the archive."""
+
+        directory = []
+        for (name, crc, compressed_size, size, offset) in self.entries:
+            header = struct.pack("<IHHHHHHIIIHHHHHII",
+                                 0x02014b50, 20, 20, 0x08, 8,
+                                 self.dos_time, self.dos_date,
+                                 crc, compressed_size, size,
+                                 len(name), 0, 0, 0, 0, 0, offset)
+            directory.append(header + name)
+
+        directory = b"".join(directory)
+        end = struct.pack("<IHHHHIIH", 0x06054b50, 0, 0,
+                          len(self.entries), len(self.entries),
+                          len(directory), self.offset, 0)
+
+        return self._output(directory + end)
+
+
+def _xlsx_column(index):
+    """Returns spreadsheet column name for zero-based column `index`, such
+    as ``A`` or ``AB``."""
+
+    name = u""
+    index += 1
+    while index:
+        (index, remainder) = divmod(index - 1, 26)
+        name = compat.text_type(chr(ord("A") + remainder)) + name
+    return name
+
+
+def _xlsx_cell(reference, value):
+    """Returns XML of a worksheet cell with `value`. Numbers, booleans, dates
+    and times are typed, other values are converted to inline strings.
+    Empty values have no cell."""
+
+    if value is None:
+        return u""
+    elif isinstance(value, bool):
+        return u'<c r="%s" t="b"><v>%d</v></c>' % (reference, value)
+    elif isinstance(value, compat.int_types + (decimal.Decimal, )) \
+            or isinstance(value, float) and not math.isinf(value) \
+                                        and not math.isnan(value):
+        return u'<c r="%s"><v>%s</v></c>' % (reference, value)
+    elif isinstance(value, datetime.datetime):
+        delta = value.replace(tzinfo=None) - _XLSX_EPOCH
+        serial = delta.days + delta.seconds / 86400.0
+        return u'<c r="%s" s="2"><v>%r</v></c>' % (reference, serial)
+    elif isinstance(value, datetime.date):
+        serial = (value - _XLSX_EPOCH.date()).days
+        return u'<c r="%s" s="1"><v>%d</v></c>' % (reference, serial)
+
+    text = _XML_ILLEGAL_RX.sub(u"", compat.to_unicode(value))
+    return u'<c r="%s" t="inlineStr"><is><t xml:space="preserve">%s</t>' \
+           u'</is></c>' % (reference, _xml_escape(text))
+
+
+def _xlsx_sheet_rows(records, fields, header=None):
+    """Yields worksheet XML of `records` in chunks of approximately
+    `XLSX_CHUNK_SIZE` characters."""
+
+    columns = [_xlsx_column(i) for i in range(len(fields))]
+    buffer = [_XLSX_SHEET_START]
+    buffered = 0
+    row_number = 1
+
+    rows = record_rows(records, fields)
+
+    if header:
+        rows = itertools.chain([tuple(header)], rows)
+
+    for row in rows:
+        line = [u'<row r="%d">' % row_number]
+        for column, value in zip(columns, row):
+            line.append(_xlsx_cell(u"%s%d" % (column, row_number), value))
+        line.append(u"</row>")
+
+        line = u"".join(line)
+        buffer.append(line)
+        buffered += len(line)
+        row_number += 1
+
+        if buffered >= XLSX_CHUNK_SIZE:
+            yield u"".join(buffer)
+            buffer = []
+            buffered = 0
+
+    buffer.append(_XLSX_SHEET_END)
+    yield u"".join(buffer)
+
+
+def xlsx_generator(records, fields, include_header=True, header=None,
+                   sheet_name="Sheet1"):
+    """Yields bytes of an XLSX workbook with one worksheet containing
+    `records` – dictionaries with keys `fields`. The workbook is streamed
+    as it is being written, memory use does not depend on the number of
+    records and no temporary files are created.
+
+    Numbers, booleans, dates and times are stored as typed cells, other
+    values as strings."""
 
-def xlsx_generator(records, fields, include_header=True, header=None):
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
     if include_header:
         header = header or fields
-        worksheet.append(header)
-    for record in records:
-        row = [record.get(key) for key in fields]
-        worksheet.append(row)
+    else:
+        header = None
+
+    archive = _ZipStream()
+    parts = [
+        ("[Content_Types].xml", [_XLSX_CONTENT_TYPES]),
+        ("_rels/.rels", [_XLSX_RELS]),
+        ("xl/workbook.xml", [_XLSX_WORKBOOK % _xml_escape(sheet_name[:31],
+                                                          {'"': "&quot;"})]),
+        ("xl/_rels/workbook.xml.rels", [_XLSX_WORKBOOK_RELS]),
+        ("xl/styles.xml", [_XLSX_STYLES]),
+        ("xl/worksheets/sheet1.xml",
+         _xlsx_sheet_rows(records, fields, header)),
+    ]
+
+    for (name, chunks) in parts:
+        for data in archive.entry(name, chunks):
+            if data:
+                yield data
+
+    yield archive.close()
+
+
+# Number of rows in one Arrow record batch or Parquet row group
+ARROW_BATCH_SIZE = 16384
+
+ARROW_FORMATS = ["arrow", "parquet"]
+
+# Aggregate functions that always result in an integer
+INTEGER_FUNCTIONS = ["count", "count_nonempty", "count_distinct",
+                     "approx_count_distinct"]
+
+
+def arrow_field_types(cube, fields):
+    """Returns list of column types of `fields` of `cube` for
+    `arrow_generator()`: ``integer`` for counts and the fact key, ``float``
+    for measures and other aggregates and ``None`` for the rest – the type is
+    derived from the values."""
+
+    key = cube.key or "__fact_key__"
+    measures = set(measure.ref for measure in cube.measures)
+    aggregates = dict((aggregate.ref, aggregate)
+                      for aggregate in cube.aggregates)
+
+    types = []
+    for field in fields:
+        if field == key:
+            types.append("integer")
+        elif field in measures:
+            types.append("float")
+        elif field in aggregates:
+            if aggregates[field].function in INTEGER_FUNCTIONS:
+                types.append("integer")
+            else:
+                types.append("float")
+        else:
+            types.append(None)
+
+    return types
+
+
+class _ArrowSink(object):
+    """Write-only file that keeps written data until it is drained. The
+    position is not reset by draining, as Parquet refers to offsets of the
+    data written before."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _arrow_type(type_, column):
+    """Returns Arrow type and value converter of a `column` with `type_`
+    (see `arrow_field_types()`). Type of a column without `type_` is derived
+    from its values: decimal numbers are converted to floats and columns
+    without values are strings."""
+
+    if type_ == "integer":
+        return (pyarrow.int64(), int)
+    elif type_ == "float":
+        return (pyarrow.float64(), float)
+    elif type_ == "string":
+        return (pyarrow.string(), compat.to_unicode)
+    elif type_ is not None:
+        raise ArgumentError("Unknown column type '%s'" % (type_, ))
+
+    try:
+        arrow_type = pyarrow.array(column).type
+    except (pyarrow.ArrowException, TypeError, ValueError):
+        return (pyarrow.string(), compat.to_unicode)
+
+    if pyarrow.types.is_decimal(arrow_type):
+        return (pyarrow.float64(), float)
+    elif pyarrow.types.is_null(arrow_type):
+        return (pyarrow.string(), compat.to_unicode)
+    else:
+        return (arrow_type, None)
+
+
+def arrow_generator(records, fields, format="arrow", types=None,
+                    batch_size=None):
+    """Yields `records` as Arrow IPC stream (`format` ``arrow``) or as
+    Parquet file (`format` ``parquet``) with columns `fields`. Records are
+    converted in batches of `batch_size` rows (default is
+    `ARROW_BATCH_SIZE`) and every batch is yielded as soon as it is written.
+
+    `types` is a list of column types ``integer``, ``float``, ``string`` or
+    ``None`` – the type is derived from the values of the first batch. See
+    also `arrow_field_types()`. Requires the `pyarrow` package."""
+
+    if format not in ARROW_FORMATS:
+        raise ArgumentError("Unknown columnar format '%s'" % (format, ))
+
+    types = types or [None] * len(fields)
+    sink = _ArrowSink()
+    writer = None
+    converters = None
+
+    for rows in _row_batches(records, fields, batch_size or ARROW_BATCH_SIZE):
+        columns = list(zip(*rows))
+
+        if writer is None:
+            (arrow_types, converters) = zip(*[_arrow_type(type_, column)
+                                              for type_, column
+                                              in zip(types, columns)])
+            schema = pyarrow.schema([pyarrow.field(field, arrow_type)
+                                     for field, arrow_type
+                                     in zip(fields, arrow_types)])
+            writer = _arrow_writer(sink, schema, format)
+
+        arrays = []
+        for column, field, convert in zip(columns, schema, converters):
+            if convert:
+                column = [None if value is None else convert(value)
+                          for value in column]
+            arrays.append(pyarrow.array(column, type=field.type))
+
+        batch = pyarrow.RecordBatch.from_arrays(arrays, fields)
+
+        if format == "parquet":
+            writer.write_table(pyarrow.Table.from_batches([batch]))
+        else:
+            writer.write_batch(batch)
+
+        yield sink.drain()
+
+    if writer is None:
+        schema = pyarrow.schema([pyarrow.field(field, _arrow_type(type_, [])[0])
+                                 for field, type_ in zip(fields, types)])
+        writer = _arrow_writer(sink, schema, format)
 
-    fd, fn = tempfile.mkstemp()
-    os.close(fd)
-    workbook.save(filename=fn)
-    return fn
+    writer.close()
+    yield sink.drain()
+
+
+def _arrow_writer(sink, schema, format):
+    stream = pyarrow.PythonFile(sink, mode="w")
+    if format == "parquet":
+        return pyarrow.parquet.ParquetWriter(stream, schema)
+    else:
+        return pyarrow.RecordBatchStreamWriter(stream, schema)
 
 
 if compat.py3k:
@@ -133,19 +593,208 @@ else:
     csv_generator = csv_generator_p2
 
 
+# Converters of values that are not native JSON types
+JSON_CONVERTERS = {
+    decimal.Decimal: float,
+    datetime.date: datetime.date.isoformat,
+    datetime.datetime: datetime.datetime.isoformat,
+}
+
+
+class ColumnConverters(object):
+    def __init__(self, converters, count):
+        """Converts values of rows with `count` columns. A converter of a
+        column is chosen from the dictionary `converters` by type of the
+        first non-empty value in the column. Values of other types than the
+        type of the column are left as they are."""
+
+        self.converters = converters
+        self.count = count
+
+        # Columns with unknown type and (index, type, converter) of the
+        # columns to be converted
+        self.unknown = list(range(count))
+        self.columns = []
+
+    def _resolve(self, row):
+        unknown = []
+        for i in self.unknown:
+            value = row[i]
+            if value is None:
+                unknown.append(i)
+                continue
+
+            type_ = type(value)
+            converter = self.converters.get(type_)
+            if converter:
+                self.columns.append((i, type_, converter))
+
+        self.unknown = unknown
+
+    def __call__(self, row):
+        """Returns list of converted values of `row`."""
+
+        if self.unknown:
+            self._resolve(row)
+
+        if not self.columns:
+            return row
+
+        row = list(row)
+        for (i, type_, converter) in self.columns:
+            value = row[i]
+            if type(value) is type_:
+                row[i] = converter(value)
+
+        return row
+
+
 class JSONLinesGenerator(object):
-    def __init__(self, iterable, separator='\n'):
+    def __init__(self, iterable, separator='\n', fields=None,
+                 chunk_size=None):
         """Creates a generator that yields one JSON record per record from
-        `iterable` separated by a newline character.."""
+        `iterable` separated by a newline character. The records are
+        buffered and yielded in chunks of approximately `chunk_size`
+        characters (default is `CHUNK_SIZE`).
+
+        If `fields` are specified, then only the fields are included in the
+        output records, otherwise the fields of the first record are used for
+        all the records."""
+
         self.iterable = iterable
         self.separator = separator
+        self.fields = fields
+        self.chunk_size = chunk_size or CHUNK_SIZE
 
-        self.encoder = SlicerJSONEncoder(indent=None)
+        self.encoder = json_encoder()
 
     def __iter__(self):
-        for obj in self.iterable:
-            string = self.encoder.encode(obj)
-            yield u"{}{}".format(string, self.separator)
+        records = iter(self.iterable)
+        fields = self.fields
+
+        if fields is None:
+            try:
+                first = next(records)
+            except StopIteration:
+                return
+
+            fields = list(first.keys())
+            records = itertools.chain([first], records)
+
+        convert = ColumnConverters(JSON_CONVERTERS, len(fields))
+        encode = self.encoder.encode
+        separator = self.separator
+
+        buffer = []
+        buffered = 0
+
+        for rows in _row_batches(records, fields):
+            for row in rows:
+                line = encode(dict(zip(fields, convert(row))))
+                buffer.append(line)
+                buffered += len(line)
+
+            if buffered >= self.chunk_size:
+                buffer.append(u"")
+                yield separator.join(buffer)
+                buffer = []
+                buffered = 0
+
+        if buffer:
+            buffer.append(u"")
+            yield separator.join(buffer)
+
+
+# Layouts of records in JSON responses: ``records`` – list of dictionaries,
+# ``rows`` – list of lists of values, ``columns`` – list of values per field
+RECORD_LAYOUTS = ["records", "rows", "columns"]
+
+
+def compact_records(records, fields, layout="rows", limit=None):
+    """Returns values of `fields` of `records` as a list of rows – lists of
+    values in order of `fields` (`layout` ``rows``) or as an ordered
+    dictionary with a list of values for every field (`layout`
+    ``columns``). At most `limit` records are included if specified."""
+
+    rows = record_rows(records, fields)
+
+    if limit is not None:
+        rows = itertools.islice(rows, limit)
+
+    if layout == "rows":
+        return list(rows)
+    elif layout == "columns":
+        columns = [[] for field in fields]
+        appends = [column.append for column in columns]
+
+        for row in rows:
+            for append, value in zip(appends, row):
+                append(value)
+
+        return OrderedDict(zip(fields, columns))
+    else:
+        raise ArgumentError("Unknown record layout '%s'" % (layout, ))
+
+
+def expand_records(data, fields, layout="rows"):
+    """Returns iterator of dictionaries from `data` in `layout` created by
+    `compact_records()`."""
+
+    if layout == "records":
+        return iter(data)
+    elif layout == "rows":
+        return (dict(zip(fields, row)) for row in data)
+    elif layout == "columns":
+        columns = [data[field] for field in fields]
+        return (dict(zip(fields, row)) for row in zip(*columns))
+    else:
+        raise ArgumentError("Unknown record layout '%s'" % (layout, ))
+
+
+def convert_records(records, converters=None):
+    """Returns list of dictionaries `records` with values converted by
+    `converters` – a dictionary of value type and converter, default is
+    `JSON_CONVERTERS`. Converter of a key is chosen by the type of its first
+    non-empty value, therefore the types are looked up once per key instead
+    of once per value. Records with converted values are copied."""
+
+    if not records or not isinstance(records[0], dict):
+        return records
+
+    converters = converters or JSON_CONVERTERS
+
+    # Keys with unknown type and (key, type, converter) of the keys to be
+    # converted
+    unknown = list(records[0].keys())
+    columns = []
+    result = []
+
+    for record in records:
+        if unknown:
+            empty = []
+            for key in unknown:
+                value = record.get(key)
+                if value is None:
+                    empty.append(key)
+                    continue
+
+                converter = converters.get(type(value))
+                if converter:
+                    columns.append((key, type(value), converter))
+            unknown = empty
+
+        copied = False
+        for (key, type_, converter) in columns:
+            value = record.get(key)
+            if type(value) is type_:
+                if not copied:
+                    record = dict(record)
+                    copied = True
+                record[key] = converter(value)
+
+        result.append(record)
+
+    return result
 
 
 class SlicerJSONEncoder(json.JSONEncoder):
@@ -185,11 +834,116 @@ class SlicerJSONEncoder(json.JSONEncoder):
                 pass
 
             if array is not None:
-                return array
+                # Records from iterators, such as facts or drilldown cells,
+                # are converted column by column
+                return convert_records(array)
             else:
                 return json.JSONEncoder.default(self, o)
 
 
+class FastJSONEncoder(object):
+    def __init__(self, indent=None):
+        """Creates a JSON encoder backed by the `orjson` package with the same
+        conversions of values as `SlicerJSONEncoder`. The output is compact,
+        `indent` is not supported and integers are limited to 64 bits.
+
+        :Attributes:
+        * `iterator_limit` - limits number of objects to be fetched from
+          iterator. Default: 1000.
+        * `batch_size` - number of records of an iterator encoded at once by
+          `iterencode()`. Default: 100.
+        """
+
+        if indent is not None:
+            raise ArgumentError("Fast JSON encoder does not support indent")
+
+        self.indent = None
+        self.options = orjson.OPT_NON_STR_KEYS
+        self.batch_size = 100
+
+        # Conversion of the values that orjson does not know
+        self.converter = SlicerJSONEncoder()
+
+    @property
+    def iterator_limit(self):
+        return self.converter.iterator_limit
+
+    @iterator_limit.setter
+    def iterator_limit(self, limit):
+        self.converter.iterator_limit = limit
+
+    def encode(self, o):
+        data = orjson.dumps(o, default=self.converter.default,
+                            option=self.options)
+        return data.decode("utf-8")
+
+    def iterencode(self, o):
+        """Yields the JSON document of `o` in chunks. Iterators in the top
+        level dictionary, such as drilldown cells of an aggregation result,
+        are fetched and encoded in batches of `batch_size` records, other
+        values are encoded at once."""
+
+        if hasattr(o, "to_dict") and callable(getattr(o, "to_dict")):
+            o = o.to_dict()
+
+        if not isinstance(o, dict) \
+                or not all(isinstance(key, compat.string_type) for key in o):
+            yield self.encode(o)
+            return
+
+        yield "{"
+        for i, (key, value) in enumerate(o.items()):
+            prefix = "," if i else ""
+            yield prefix + self.encode(key) + ":"
+
+            if _is_iterator(value):
+                for chunk in self._iterencode_records(value):
+                    yield chunk
+            else:
+                yield self.encode(value)
+        yield "}"
+
+    def _iterencode_records(self, iterator):
+        """Yields JSON array of records from `iterator` in batches. Number of
+        the records is limited the same way as in `encode()`."""
+
+        # SlicerJSONEncoder.default() fetches one record over the limit
+        records = itertools.islice(iterator, self.iterator_limit + 1)
+
+        yield "["
+        first = True
+        while True:
+            batch = list(itertools.islice(records, self.batch_size))
+            if not batch:
+                break
+            data = self.encode(convert_records(batch))
+            yield ("" if first else ",") + data[1:-1]
+            first = False
+        yield "]"
+
+
+def _is_iterator(value):
+    """Returns `True` if `value` is an iterable that is encoded as a list of
+    records, such as a result iterator, but not a string, list or
+    dictionary."""
+
+    if isinstance(value, (compat.string_type, bytes, list, tuple, dict)):
+        return False
+    if hasattr(value, "to_dict") and callable(getattr(value, "to_dict")):
+        return False
+    return hasattr(value, "__iter__")
+
+
+def json_encoder(indent=None):
+    """Returns a JSON encoder: `FastJSONEncoder` if the `orjson` package is
+    installed and no `indent` is requested, otherwise `SlicerJSONEncoder`."""
+
+    if orjson is not None and indent is None:
+        return FastJSONEncoder()
+    else:
+        return SlicerJSONEncoder(indent=indent)
+
+
 class Formatter(object):
     """Empty class for the time being. Currently used only for finding all
     built-in subclasses"""
@@ -208,7 +962,23 @@ class Formatter(object):
 CrossTable = namedtuple("CrossTable", ["columns", "rows", "data"])
 
 
-def make_cross_table(result, onrows=None, oncolumns=None, aggregates_on=None):
+# Label of the subtotal rows and columns of a cross table
+TOTAL_LABEL = "Total"
+
+# Functions that compute subtotals of aggregates with given aggregate
+# function from the aggregated values. Subtotals of other aggregates are not
+# computed.
+SUBTOTAL_FUNCTIONS = {
+    "sum": sum,
+    "count": sum,
+    "count_nonempty": sum,
+    "min": min,
+    "max": max,
+}
+
+
+def make_cross_table(result, onrows=None, oncolumns=None, aggregates_on=None,
+                     order_headers=False, subtotals=False, header_limit=None):
     """
     Creates a cross table from a drilldown (might be any list of records).
     `onrows` contains list of attribute names to be placed at rows and
@@ -222,6 +992,16 @@ def make_cross_table(result, onrows=None, oncolumns=None, aggregates_on=None):
     * ``columns`` – there will be one column per aggregate per "on column"
       dimension member
 
+    If `order_headers` is `True` then the rows and columns are ordered by the
+    `order_attribute` of the drilled-down levels, otherwise they are in the
+    order of the records. If `subtotals` is `True` then a subtotal row and
+    column is added after every group of rows and columns with the same
+    leading header values and a grand total is added at the end. Only sums,
+    counts, minimums and maximums have subtotals.
+
+    If `header_limit` is specified and there are more distinct row headers
+    or column headers than the limit, then `ArgumentError` is raised.
+
     Returns a named tuble with attributes:
 
     * `columns` - labels of columns. The tuples correspond to values of
@@ -233,62 +1013,245 @@ def make_cross_table(result, onrows=None, oncolumns=None, aggregates_on=None):
 
     """
 
+    table = pivot_cross_table(result, onrows, oncolumns, aggregates_on,
+                              order_headers=order_headers,
+                              subtotals=subtotals,
+                              header_limit=header_limit)
+
+    return CrossTable(table.columns, table.rows, list(table.data))
+
+
+def pivot_cross_table(result, onrows=None, oncolumns=None, aggregates_on=None,
+                      order_headers=False, subtotals=False, header_limit=None):
+    """Returns a cross table as `make_cross_table()` does, but the `data` is
+    an iterator of rows that are created from the pivoted matrix as they are
+    consumed. Use this function for streaming output of large tables."""
+
     if not result.drilldown:
         # TODO: we should at least create one-row/one-column table
         raise ArgumentError("Can't create cross-table without drilldown.")
 
+    aggregates_on = aggregates_on or "cells"
+    if aggregates_on not in ("cells", "rows", "columns"):
+        raise ArgumentError("Unknown aggregates placement '%s'"
+                            % (aggregates_on, ))
+
+    onrows = list(onrows or [])
+    oncolumns = list(oncolumns or [])
     aggregates = result.aggregates
+    agg_refs = [agg.ref for agg in aggregates]
 
-    matrix = {}
-    row_hdrs = []
-    column_hdrs = []
+    rows = _PivotAxis(onrows, result, order_headers, header_limit, "rows")
+    columns = _PivotAxis(oncolumns, result, order_headers, header_limit,
+                         "columns")
+
+    # Assign ordinals first, then fill the preallocated matrix of aggregate
+    # tuples
+    cells = []
+    for record in result.cells:
+        cells.append((rows.ordinal(record),
+                      columns.ordinal(record),
+                      tuple(record[ref] for ref in agg_refs)))
+
+    width = len(columns.headers)
+    matrix = [None] * (len(rows.headers) * width)
+    for (row, column, values) in cells:
+        matrix[row * width + column] = values
+    del cells
+
+    functions = [SUBTOTAL_FUNCTIONS.get(agg.function) for agg in aggregates]
+    row_items = rows.items(subtotals)
+    column_items = columns.items(subtotals)
+
+    def cell(row_ordinals, column_ordinals):
+        if len(row_ordinals) == 1 and len(column_ordinals) == 1:
+            return matrix[row_ordinals[0] * width + column_ordinals[0]]
+
+        found = [matrix[row * width + column]
+                 for row in row_ordinals
+                 for column in column_ordinals]
+        found = [values for values in found if values is not None]
+        if not found:
+            return None
+
+        totals = []
+        for i, function in enumerate(functions):
+            values = [values[i] for values in found if values[i] is not None]
+            if function and values:
+                totals.append(function(values))
+            else:
+                totals.append(None)
 
-    agg_refs = [agg.ref for agg in aggregates]
+        return tuple(totals)
+
+    def table_row(row_ordinals):
+        return [cell(row_ordinals, ordinals) for (_, ordinals) in column_items]
+
+    labels = [agg.label or agg.name for agg in aggregates]
+    empty = (None, ) * len(aggregates)
 
-    if aggregates_on is None or aggregates_on == "cells":
-        for record in result.cells:
-            # Get table coordinates
-            hrow = tuple(record[f] for f in onrows)
-            hcol = tuple(record[f] for f in oncolumns)
+    if aggregates_on == "cells":
+        row_hdrs = [header for (header, _) in row_items]
+        column_hdrs = [header for (header, _) in column_items]
 
-            if hrow not in row_hdrs:
-                row_hdrs.append(hrow)
-            if hcol not in column_hdrs:
-                column_hdrs.append(hcol)
+        data = (table_row(ordinals) for (_, ordinals) in row_items)
 
-            matrix[(hrow, hcol)] = tuple(record[a] for a in agg_refs)
+    elif aggregates_on == "rows":
+        row_hdrs = [header + (label, ) for (header, _) in row_items
+                    for label in labels]
+        column_hdrs = [header for (header, _) in column_items]
+
+        def generate_data():
+            for (_, ordinals) in row_items:
+                values = [values or empty for values in table_row(ordinals)]
+                for i in range(len(labels)):
+                    yield [item[i] for item in values]
+
+        data = generate_data()
 
     else:
-        for record in result.cells:
-            # Get table coordinates
-            base_hrow = [record[f] for f in onrows]
-            base_hcol = [record[f] for f in oncolumns]
+        row_hdrs = [header for (header, _) in row_items]
+        column_hdrs = [header + (label, ) for (header, _) in column_items
+                       for label in labels]
+
+        def generate_data():
+            for (_, ordinals) in row_items:
+                row = []
+                for values in table_row(ordinals):
+                    row.extend(values or empty)
+                yield row
 
-            for agg in aggregates:
+        data = generate_data()
 
-                if aggregates_on == "rows":
-                    hrow = tuple(base_hrow + [agg.label or agg.name])
-                    hcol = tuple(base_hcol)
+    return CrossTable(column_hdrs, row_hdrs, data)
 
-                elif aggregates_on == "columns":
-                    hrow = tuple(base_hrow)
-                    hcol = tuple(base_hcol + [agg.label or agg.name])
 
-                if hrow not in row_hdrs:
-                    row_hdrs.append(hrow)
+class _PivotAxis(object):
+    def __init__(self, attributes, result, order_headers=False, limit=None,
+                 name=None):
+        """Rows or columns of a cross table with `attributes` (references)
+        of records of the aggregation `result`. Headers – tuples of attribute
+        values – get their ordinals in the order they are encountered. There
+        can be at most `limit` headers."""
+
+        self.attributes = attributes
+        self.headers = []
+        self.index = {}
+        self.limit = limit
+        self.name = name
+
+        # Order attribute references and directions of the headers
+        if order_headers:
+            levels = {}
+            for item in result.drilldown.drilldown:
+                for level in item.levels:
+                    for attribute in level.attributes:
+                        levels[attribute.ref] = level
+
+            self.order = []
+            for ref in attributes:
+                level = levels.get(ref)
+                if level:
+                    self.order.append((level.order_attribute.ref,
+                                       level.order == "desc"))
+                else:
+                    self.order.append((ref, False))
+            self.keys = []
+        else:
+            self.order = None
 
-                if hcol not in column_hdrs:
-                    column_hdrs.append(hcol)
+    def ordinal(self, record):
+        """Returns ordinal of the header of `record`."""
 
-                matrix[(hrow, hcol)] = record[agg.ref]
+        header = tuple(record[ref] for ref in self.attributes)
 
-    data = []
+        try:
+            return self.index[header]
+        except KeyError:
+            ordinal = len(self.headers)
+            if self.limit is not None and ordinal >= self.limit:
+                raise ArgumentError("Cross table has more than {} {}"
+                                    .format(self.limit, self.name))
 
-    for hrow in row_hdrs:
-        row = [matrix.get((hrow, hcol)) for hcol in column_hdrs]
-        data.append(row)
+            self.index[header] = ordinal
+            self.headers.append(header)
 
-    return CrossTable(column_hdrs, row_hdrs, data)
+            if self.order is not None:
+                self.keys.append(tuple(record.get(ref, value)
+                                       for (ref, _), value
+                                       in zip(self.order, header)))
+
+            return ordinal
+
+    def ordered(self):
+        """Returns list of ordinals in the order of the headers."""
+
+        ordinals = list(range(len(self.headers)))
+
+        if self.order is not None:
+            # Stable sort by the least significant key first
+            for i in reversed(range(len(self.order))):
+                ordinals.sort(key=lambda ordinal: _order_key(self.keys[ordinal][i]),
+                              reverse=self.order[i][1])
+
+        return ordinals
+
+    def items(self, subtotals=False):
+        """Returns list of tuples (`header`, `ordinals`) where `ordinals` is
+        a list with the header's ordinal or a list of ordinals of a
+        subtotal."""
+
+        ordinals = self.ordered()
+        depth = len(self.attributes)
+
+        if not subtotals or not depth:
+            return [(self.headers[ordinal], [ordinal])
+                    for ordinal in ordinals]
+
+        # Group the headers with the same leading values together, keep
+        # order of the groups
+        ranks = [{} for _ in range(depth)]
+        for ordinal in ordinals:
+            header = self.headers[ordinal]
+            for k in range(depth):
+                ranks[k].setdefault(header[:k + 1], len(ranks[k]))
+
+        ordinals.sort(key=lambda ordinal:
+                      tuple(ranks[k][self.headers[ordinal][:k + 1]]
+                            for k in range(depth)))
+
+        def total(header, k):
+            return header[:k] + (TOTAL_LABEL, ) + (None, ) * (depth - k - 1)
+
+        items = []
+        groups = [[] for _ in range(depth)]
+        previous = None
+
+        for ordinal in ordinals:
+            header = self.headers[ordinal]
+
+            if previous is not None:
+                for k in range(depth - 1, 0, -1):
+                    if header[:k] != previous[:k]:
+                        items.append((total(previous, k), groups[k]))
+                        groups[k] = []
+
+            for group in groups:
+                group.append(ordinal)
+
+            items.append((header, [ordinal]))
+            previous = header
+
+        if previous is not None:
+            for k in range(depth - 1, -1, -1):
+                items.append((total(previous, k), groups[k]))
+
+        return items
+
+
+def _order_key(value):
+    """Sort key of a header value – empty values are last."""
+    return (value is None, value)
 
 
 def coalesce_table_labels(attributes, onrows, oncolumns):
@@ -336,26 +1299,56 @@ class CrossTableFormatter(Formatter):
         """
 
         self.indent = indent or 4
-        self.encoder = SlicerJSONEncoder(indent=indent)
+        self.encoder = json_encoder(indent=indent)
 
     def format(self, cube, result, onrows=None, oncolumns=None, aggregates=None,
-               aggregates_on=None):
+               aggregates_on=None, order_headers=False, subtotals=False,
+               header_limit=None):
+        return u"".join(self.generate(cube, result,
+                                      onrows=onrows,
+                                      oncolumns=oncolumns,
+                                      aggregates_on=aggregates_on,
+                                      order_headers=order_headers,
+                                      subtotals=subtotals,
+                                      header_limit=header_limit))
+
+    def generate(self, cube, result, onrows=None, oncolumns=None,
+                 aggregates=None, aggregates_on=None, order_headers=False,
+                 subtotals=False, header_limit=None):
+        """Yields the formatted output in parts – one part per table row.
+        See `make_cross_table()` for description of the arguments."""
+
         onrows, oncolumns = coalesce_table_labels(result.attributes,
                                                   onrows,
                                                   oncolumns)
-        table = make_cross_table(result,
-                                 onrows=onrows,
-                                 oncolumns=oncolumns,
-                                 aggregates_on=aggregates_on)
-
-        d = {
-            "columns": table.columns,
-            "rows": table.rows,
-            "data": table.data
-        }
-        output = self.encoder.encode(d)
+        table = pivot_cross_table(result,
+                                  onrows=onrows,
+                                  oncolumns=oncolumns,
+                                  aggregates_on=aggregates_on,
+                                  order_headers=order_headers,
+                                  subtotals=subtotals,
+                                  header_limit=header_limit)
 
-        return output
+        if self.encoder.indent is not None:
+            d = {
+                "columns": table.columns,
+                "rows": table.rows,
+                "data": list(table.data)
+            }
+            yield self.encoder.encode(d)
+            return
+
+        encode = self.encoder.encode
+
+        yield u'{{"columns": {}, "rows": {}, "data": ['.format(
+                    encode(table.columns), encode(table.rows))
+
+        separator = u""
+        for row in table.data:
+            yield separator + encode(row)
+            separator = u", "
+
+        yield u"]}"
 
 
 class HTMLCrossTableFormatter(CrossTableFormatter):
@@ -375,19 +1368,23 @@ class HTMLCrossTableFormatter(CrossTableFormatter):
         self.template = self.env.get_template("cross_table.html")
         self.table_style = table_style
 
-    def format(self, cube, result, onrows=None, oncolumns=None, aggregates=None,
-               aggregates_on=None):
+    def generate(self, cube, result, onrows=None, oncolumns=None,
+                 aggregates=None, aggregates_on=None, order_headers=False,
+                 subtotals=False, header_limit=None):
         onrows, oncolumns = coalesce_table_labels(result.attributes,
                                                   onrows,
                                                   oncolumns)
-        table = make_cross_table(result,
-                                 onrows=onrows,
-                                 oncolumns=oncolumns,
-                                 aggregates_on=aggregates_on)
-
-        output = self.template.render(table=table,
+        table = pivot_cross_table(result,
+                                  onrows=onrows,
+                                  oncolumns=oncolumns,
+                                  aggregates_on=aggregates_on,
+                                  order_headers=order_headers,
+                                  subtotals=subtotals,
+                                  header_limit=header_limit)
+
+        return self.template.generate(table=table,
+                                      table_rows=zip(table.rows, table.data),
                                       table_style=self.table_style)
-        return output
 
 
 class CSVFormatter(Formatter):
@@ -418,7 +1415,6 @@ class CSVFormatter(Formatter):
 
 
 class XLSXFormatter(Formatter):
-    # TODO(serbernar): write formatter
     def format(self, cube, result, onrows=None, oncolumns=None, aggregates=None,
                aggregates_on=None):
         if any([onrows, oncolumns]):
@@ -433,10 +1429,8 @@ class XLSXFormatter(Formatter):
                            for attr in cube.get_attributes([l], aggregated=True)]
 
         fields = result.labels
-        generator = csv_generator(result,
-                                  fields,
-                                  include_header=bool(header),
-                                  header=header)
-        rows = [compat.to_str(row) for row in generator]
-        output = "".join(rows)
-        return output
+        generator = xlsx_generator(result,
+                                   fields,
+                                   include_header=bool(header),
+                                   header=header)
+        return b"".join(generator)
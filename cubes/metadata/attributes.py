@@ -4,7 +4,10 @@ from __future__ import absolute_import
 
 import copy
 
-from expressions import inspect_variables
+from collections import deque
+
+from expressions import Compiler, Variable, Function
+from expressions import UnaryOperator, BinaryOperator
 
 from .base import ModelObject
 from .. import compat
@@ -22,6 +25,9 @@ __all__ = [
     "collect_attributes",
     "depsort_attributes",
     "collect_dependencies",
+    "DependencyGraph",
+    "parse_expression",
+    "expression_variables",
     "expand_attribute_metadata",
 ]
 
@@ -64,6 +70,10 @@ class AttributeBase(ModelObject):
     specified.
     """
 
+    # Note: `dimension` is a property of `Attribute`
+    __slots__ = ("format", "missing_value", "expression", "ref", "order",
+                 "_parsed_expression")
+
     ASC = 'asc'
     DESC = 'desc'
 
@@ -97,6 +107,8 @@ class AttributeBase(ModelObject):
         self.dimension = None
 
         self.expression = expression
+        self._parsed_expression = None
+        self.name = compat.intern_string(self.name)
         self.ref = self.name
 
         if order:
@@ -198,11 +210,30 @@ class AttributeBase(ModelObject):
         if not self.expression:
             return set()
 
-        return inspect_variables(self.expression)
+        return expression_variables(self.expression_ast)
+
+    @property
+    def expression_ast(self):
+        """Parsed `expression` (see `parse_expression()`) or `None` if the
+        attribute has no expression. The expression is parsed once and kept
+        with the attribute until the expression is changed."""
+
+        if not self.expression:
+            return None
+
+        parsed = self._parsed_expression
+
+        if parsed is None or parsed[0] != self.expression:
+            parsed = (self.expression, parse_expression(self.expression))
+            self._parsed_expression = parsed
+
+        return parsed[1]
 
 
 class Attribute(AttributeBase):
 
+    __slots__ = ("_dimension", "locales")
+
     def __init__(self, name, label=None, description=None, order=None,
                  info=None, format=None, dimension=None, locales=None,
                  missing_value=None, expression=None, **kwargs):
@@ -249,9 +280,10 @@ class Attribute(AttributeBase):
     @dimension.setter
     def dimension(self, dimension):
         if dimension:
-            self.ref = dimension.name + '.' + str(self.name)
+            ref = dimension.name + '.' + str(self.name)
         else:
-            self.ref = str(self.name)
+            ref = str(self.name)
+        self.ref = compat.intern_string(ref)
         self._dimension = dimension
 
     def __deepcopy__(self, memo):
@@ -293,6 +325,9 @@ class Measure(AttributeBase):
     """Cube measure attribute – a numerical attribute that can be
     aggregated."""
 
+    __slots__ = ("dimension", "formula", "aggregates", "window_size",
+                 "nonadditive")
+
     def __init__(self, name, label=None, description=None, order=None,
                  info=None, format=None, missing_value=None, aggregates=None,
                  formula=None, expression=None, nonadditive=None,
@@ -405,10 +440,14 @@ class Measure(AttributeBase):
 
 class MeasureAggregate(AttributeBase):
 
+    __slots__ = ("dimension", "function", "formula", "measure",
+                 "nonadditive", "window_size", "period", "percentile")
+
     def __init__(self, name, label=None, description=None, order=None,
                  info=None, format=None, missing_value=None, measure=None,
                  function=None, formula=None, expression=None,
-                 nonadditive=None, window_size=None, **kwargs):
+                 nonadditive=None, window_size=None, period=None,
+                 percentile=None, **kwargs):
         """Masure aggregate
 
         Attributes:
@@ -420,6 +459,11 @@ class MeasureAggregate(AttributeBase):
         * `expression` – arithmetic expression (only if backend supported)
         * `nonadditive` – additive behavior for the aggregate (inherited from
           the measure in most of the times)
+        * `period` – calendar unit of the period shift for the
+          period-over-period functions, such as ``year`` for year-over-year
+          comparison (optional)
+        * `percentile` – percentile (0.0 to 1.0) for the percentile
+          functions, default is median 0.5 (optional)
         """
 
         super(MeasureAggregate, self).__init__(name=name, label=label,
@@ -434,6 +478,8 @@ class MeasureAggregate(AttributeBase):
         self.measure = measure
         self.nonadditive = nonadditive
         self.window_size = window_size
+        self.period = period
+        self.percentile = percentile
 
     def __deepcopy__(self, memo):
         return MeasureAggregate(self.name,
@@ -448,7 +494,9 @@ class MeasureAggregate(AttributeBase):
                                 formula=self.formula,
                                 expression=self.expression,
                                 nonadditive=self.nonadditive,
-                                window_size=self.window_size)
+                                window_size=self.window_size,
+                                period=self.period,
+                                percentile=self.percentile)
 
     def __eq__(self, other):
         if not super(MeasureAggregate, self).__eq__(other):
@@ -458,7 +506,9 @@ class MeasureAggregate(AttributeBase):
             and self.measure == other.measure \
             and self.formula == other.formula \
             and self.nonadditive == other.nonadditive \
-            and self.window_size == other.window_size
+            and self.window_size == other.window_size \
+            and self.period == other.period \
+            and self.percentile == other.percentile
 
     def __hash__(self):
         return hash(self.ref)
@@ -474,6 +524,8 @@ class MeasureAggregate(AttributeBase):
         d["measure"] = self.measure
         d["nonadditive"] = self.nonadditive
         d["window_size"] = self.window_size
+        d["period"] = self.period
+        d["percentile"] = self.percentile
 
         return d
 
@@ -496,7 +548,37 @@ class MeasureAggregate(AttributeBase):
         if not self.expression:
             return set()
 
-        return inspect_variables(self.expression)
+        return expression_variables(self.expression_ast)
+
+
+def parse_expression(text):
+    """Parses expression `text` into a tree of nodes of the `expressions`
+    package: `Variable`, `Function`, `UnaryOperator` and `BinaryOperator`.
+    Literals are numbers or strings."""
+
+    return Compiler().compile(text)
+
+
+def expression_variables(node):
+    """Returns set of names of variables in expression tree `node` (see
+    `parse_expression()`). Function names are not considered variables."""
+
+    variables = set()
+    pending = [node]
+
+    while pending:
+        node = pending.pop()
+
+        if isinstance(node, Variable):
+            variables.add(node.name)
+        elif isinstance(node, BinaryOperator):
+            pending += [node.left, node.right]
+        elif isinstance(node, UnaryOperator):
+            pending.append(node.operand)
+        elif isinstance(node, Function):
+            pending += node.args
+
+    return variables
 
 
 def create_list_of(class_, objects):
@@ -557,48 +639,61 @@ def depsort_attributes(attributes, all_dependencies):
 
     Raises an exception when a circular dependecy is detected."""
 
-    bases = set()
+    return _depsort(attributes, all_dependencies)
+
 
-    # Gather only relevant dependencies
-    required = set(attributes)
+def _depsort(attributes, all_dependencies, dependants=None):
+    """Topological sort of `attributes` and their dependencies. `dependants`
+    is reverse index of `all_dependencies` – dictionary of attributes that
+    depend on the key attribute. It is created from the relevant
+    dependencies if not provided."""
 
-    # Collect base attributes and relevant dependencies
+    # Gather only relevant dependencies, in order of their discovery
+    required = []
     seen = set()
-    while required:
-        attr = required.pop()
-        seen.add(attr)
+    pending = list(attributes)
+
+    while pending:
+        attr = pending.pop()
+        if attr in seen:
+            continue
 
         try:
             attr_deps = all_dependencies[attr]
-        except KeyError as e:
-            raise ExpressionError("Unknown attribute '{}'".format(e))
+        except KeyError:
+            raise ExpressionError("Unknown attribute '{}'".format(attr))
 
-        if not attr_deps:
-            bases.add(attr)
+        seen.add(attr)
+        required.append(attr)
+        pending += attr_deps
 
-        required |= set(attr_deps) - seen
+    # Number of not yet sorted dependencies of each attribute
+    remaining = {attr:len(all_dependencies[attr]) for attr in required}
 
-    # Remaining dependencies to be processed (not base attributes)
-    remaining = {attr:all_dependencies[attr] for attr in seen
-                 if attr not in bases}
+    if dependants is None:
+        dependants = {}
+        for attr in required:
+            for dep in all_dependencies[attr]:
+                dependants.setdefault(dep, []).append(attr)
 
+    # depsorted contains attribute names in order of dependencies starting
+    # with base attributes (those that don't depend on anything, directly
+    # represented by columns) and ending with derived attributes
+    bases = deque(attr for attr in required if not remaining[attr])
     sorted_deps = []
 
     while bases:
-        base = bases.pop()
+        base = bases.popleft()
         sorted_deps.append(base)
+        del remaining[base]
 
-        dependants = [attr for attr, deps in remaining.items()
-                      if base in deps]
-
-        for attr in dependants:
-            # Remove the current dependency
-            remaining[attr].remove(base)
-            # If there are no more dependencies, consider the attribute to be
-            # base
-            if not remaining[attr]:
-                bases.add(attr)
-                del remaining[attr]
+        for attr in dependants.get(base, ()):
+            if attr in remaining:
+                remaining[attr] -= 1
+                # If there are no more dependencies, consider the attribute
+                # to be base
+                if not remaining[attr]:
+                    bases.append(attr)
 
     if remaining:
         remaining_str = ", ".join(sorted(remaining))
@@ -607,3 +702,38 @@ def depsort_attributes(attributes, all_dependencies):
 
     return sorted_deps
 
+
+class DependencyGraph(object):
+    def __init__(self, dependencies):
+        """Graph of dependencies between attributes. `dependencies` is a
+        dictionary where keys are attribute references and values are
+        references of direct dependencies of the attribute. The graph keeps
+        also the reverse index – attributes depending on an attribute – so
+        the dependencies of a list of attributes are sorted in time
+        proportional to the number of the collected attributes."""
+
+        self.dependencies = {}
+        self.dependants = {}
+
+        for attr, deps in dependencies.items():
+            self.dependencies[attr] = frozenset(deps)
+            for dep in deps:
+                self.dependants.setdefault(dep, []).append(attr)
+
+    def depsort(self, attributes):
+        """Returns list of `attributes` and all their dependencies sorted
+        by their dependencies. See `depsort_attributes()` for more
+        information."""
+
+        return _depsort(attributes, self.dependencies, self.dependants)
+
+    def check_cycles(self):
+        """Raises `ExpressionError` when there is a circular reference
+        between attributes of the graph. References of unknown attributes
+        are ignored, they are reported when such attribute is sorted."""
+
+        attributes = set(self.dependencies)
+        known = {attr:deps & attributes
+                 for attr, deps in self.dependencies.items()}
+
+        _depsort(list(known), known, self.dependants)
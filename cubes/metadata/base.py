@@ -4,19 +4,30 @@
 
 from __future__ import absolute_import
 
+import hashlib
 import json
+import marshal
 import os
 import re
 import shutil
+import sys
 
 from collections import OrderedDict
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 from ..common import IgnoringDictionary, to_label
 from ..errors import ModelError, ArgumentError, CubesError
+from ..logging import get_logger
 from .. import compat
 
 __all__ = (
     "ModelObject",
+    "LazyMetadata",
+    "read_metadata_file",
     "read_model_metadata",
     "read_model_metadata_bundle",
     "write_model_metadata_bundle",
@@ -25,7 +36,12 @@ __all__ = (
 
 
 class ModelObject(object):
-    """Base classs for all model objects."""
+    """Base classs for all model objects.
+
+    Classes of the most numerous model objects (attributes, levels and
+    hierarchies) have `__slots__` instead of instance dictionary."""
+
+    __slots__ = ("name", "label", "description", "info")
 
     localizable_attributes = []
     localizable_lists = []
@@ -64,12 +80,19 @@ class ModelObject(object):
         """Returns a copy of the cube translated with `translation`"""
 
         acopy = self.__class__.__new__(self.__class__)
-        acopy.__dict__ = self.__dict__.copy()
 
-        d = acopy.__dict__
+        for slot in _object_slots(self.__class__):
+            try:
+                setattr(acopy, slot, getattr(self, slot))
+            except AttributeError:
+                # Slot without value
+                pass
+
+        if hasattr(self, "__dict__"):
+            acopy.__dict__.update(self.__dict__)
 
         for attr in self.localizable_attributes:
-            d[attr] = context.get(attr, getattr(self, attr))
+            setattr(acopy, attr, context.get(attr, getattr(self, attr)))
 
         for attr in self.localizable_lists:
             list_copy = []
@@ -83,6 +106,20 @@ class ModelObject(object):
         return acopy
 
 
+def _object_slots(class_):
+    """Returns names of all slots of `class_` and its base classes."""
+
+    slots = []
+    for base in class_.__mro__:
+        names = base.__dict__.get("__slots__", ())
+        if isinstance(names, compat.string_type):
+            names = [names]
+        slots += [name for name in names
+                  if name not in ("__dict__", "__weakref__")]
+
+    return slots
+
+
 def object_dict(objects, by_ref=False, error_message=None, error_dict=None):
     """Make an ordered dictionary from model objects `objects` where keys are
     object names. If `for_ref` is `True` then object's `ref` (reference) is
@@ -139,26 +176,153 @@ def _json_from_url(url):
     return desc
 
 
-def read_model_metadata(source):
+# Version of the format of the model metadata cache files
+METADATA_CACHE_VERSION = 1
+
+
+def _metadata_cache_path(path, cache_dir):
+    key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, "%s.marshal" % key)
+
+
+def _write_metadata_cache(path, content):
+    """Writes `content` into the cache file `path`. The file is replaced
+    atomically. Failure is logged and ignored – the cache is optional."""
+
+    temp_path = "%s.%d.tmp" % (path, os.getpid())
+    replace = getattr(os, "replace", os.rename)
+
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        with open(temp_path, "wb") as f:
+            f.write(marshal.dumps(content))
+        replace(temp_path, path)
+    except (IOError, OSError, ValueError) as e:
+        get_logger().warn("Unable to write model metadata cache '%s': %s"
+                          % (path, e))
+
+
+def read_metadata_file(path, cache_dir=None, expand=None):
+    """Reads metadata from a JSON file `path`. `expand` is an optional
+    function that expands the metadata, such as `expand_cube_metadata()`.
+
+    If `cache_dir` is specified, then the expanded metadata are kept in a
+    binary (`marshal`) file in that directory together with modification
+    time and size of the file `path`. Following reads of unchanged file load
+    the cached metadata without JSON parsing and expansion. The cache files
+    are specific to the Python version."""
+
+    if not cache_dir:
+        metadata = _json_from_url(path)
+        return expand(metadata) if expand else metadata
+
+    stat = os.stat(path)
+    key = (METADATA_CACHE_VERSION, tuple(sys.version_info[:2]),
+           stat.st_mtime, stat.st_size)
+    cache_path = _metadata_cache_path(path, cache_dir)
+
+    try:
+        with open(cache_path, "rb") as f:
+            (cached_key, metadata) = marshal.loads(f.read())
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        cached_key = None
+
+    if cached_key == key:
+        return metadata
+
+    metadata = _json_from_url(path)
+    if expand:
+        metadata = expand(metadata)
+
+    _write_metadata_cache(cache_path, (key, metadata))
+
+    return metadata
+
+
+class LazyMetadata(Mapping):
+    """Read-only metadata dictionary of a model object – a cube or a
+    dimension – stored in a file. Only the object's `name`, which is known
+    from the file name, is available until other metadata are requested.
+    Then the file is read with `read_metadata_file()`."""
+
+    def __init__(self, path, name, cache_dir=None, expand=None):
+        self.path = path
+        self.name = name
+        self.cache_dir = cache_dir
+        self.expand = expand
+        self._metadata = None
+
+    @property
+    def is_loaded(self):
+        """`True` if the metadata were read from the file."""
+        return self._metadata is not None
+
+    def load(self):
+        """Reads the metadata from the file, if they were not read yet, and
+        returns them as a dictionary. Raises `ModelError` if the object in
+        the file has different name than expected."""
+
+        if self._metadata is None:
+            metadata = read_metadata_file(self.path, self.cache_dir,
+                                          self.expand)
+
+            if metadata.get("name") != self.name:
+                raise ModelError("Object in '%s' should be named '%s' "
+                                 "(according to the file name), not '%s'"
+                                 % (self.path, self.name,
+                                    metadata.get("name")))
+
+            self._metadata = metadata
+
+        return self._metadata
+
+    def __getitem__(self, key):
+        if key == "name":
+            return self.name
+        return self.load()[key]
+
+    def __contains__(self, key):
+        return key == "name" or key in self.load()
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+    def __repr__(self):
+        return "<LazyMetadata %s from '%s'%s>" \
+                % (self.name, self.path, "" if self.is_loaded else " (lazy)")
+
+
+def read_model_metadata(source, lazy=False, cache_dir=None):
     """Reads a model description from `source` which can be a filename, URL,
     file-like object or a path to a directory. Returns a model description
-    dictionary."""
+    dictionary.
+
+    `lazy` and `cache_dir` apply to model files and bundles, see
+    `read_model_metadata_bundle()` and `read_metadata_file()`."""
 
     if isinstance(source, compat.string_type):
         parts = compat.urlparse(source)
         if parts.scheme in ('', 'file') and os.path.isdir(parts.path):
             source = parts.path
-            return read_model_metadata_bundle(source)
+            return read_model_metadata_bundle(source, lazy, cache_dir)
         elif len(parts.scheme) == 1 and os.path.isdir(source):
             # TODO: same hack as in _json_from_url
-            return read_model_metadata_bundle(source)
+            return read_model_metadata_bundle(source, lazy, cache_dir)
+        elif parts.scheme in ('', 'file') or len(parts.scheme) == 1:
+            return read_metadata_file(source, cache_dir)
         else:
             return _json_from_url(source)
     else:
         return json.load(source)
 
 
-def read_model_metadata_bundle(path):
+def read_model_metadata_bundle(path, lazy=False, cache_dir=None):
     """Load logical model a directory specified by `path`.  Returns a model
     description dictionary. Model directory bundle has structure:
 
@@ -169,8 +333,21 @@ def read_model_metadata_bundle(path):
 
     The dimensions and cubes lists in the ``model.json`` are concatenated with
     dimensions and cubes from the separate files.
+
+    If `lazy` is `True` then the cube and dimension files are not read –
+    they are represented by `LazyMetadata` which reads the file when the
+    object is created. Names of the objects are taken from the file names,
+    such as ``cube_sales.json`` for cube ``sales``.
+
+    Metadata of the cubes and dimensions are expanded. If `cache_dir` is
+    specified, then the expanded metadata are cached in that directory. See
+    `read_metadata_file()` for more information.
     """
 
+    # Model objects import this module
+    from .cube import expand_cube_metadata
+    from .dimension import expand_dimension_metadata
+
     if not os.path.isdir(path):
         raise ArgumentError("Path '%s' is not a directory.")
 
@@ -179,7 +356,7 @@ def read_model_metadata_bundle(path):
     if not os.path.exists(info_path):
         raise ModelError('main model info %s does not exist' % info_path)
 
-    model = _json_from_url(info_path)
+    model = read_metadata_file(info_path, cache_dir)
 
     # Find model object files and load them
 
@@ -189,6 +366,11 @@ def read_model_metadata_bundle(path):
     if not "cubes" in model:
         model["cubes"] = []
 
+    dimension_names = set(dim if isinstance(dim, compat.string_type)
+                          else dim["name"]
+                          for dim in model["dimensions"])
+    cube_names = set(cube["name"] for cube in model["cubes"])
+
     for dirname, dirnames, filenames in os.walk(path):
         for filename in filenames:
             if os.path.splitext(filename)[1] != '.json':
@@ -199,32 +381,52 @@ def read_model_metadata_bundle(path):
             obj_path = os.path.join(dirname, filename)
 
             if prefix in ('dim', 'dimension'):
-                desc = _json_from_url(obj_path)
+                if lazy:
+                    name = _bundle_object_name(filename, prefix)
+                    desc = LazyMetadata(obj_path, name, cache_dir,
+                                        expand_dimension_metadata)
+                else:
+                    desc = read_metadata_file(obj_path, cache_dir,
+                                              expand_dimension_metadata)
                 try:
                     name = desc["name"]
                 except KeyError:
                     raise ModelError("Dimension file '%s' has no name key" %
                                                                      obj_path)
-                if name in model["dimensions"]:
-                    raise ModelError("Dimension '%s' defined multiple times " %
-                                        "(in '%s')" % (name, obj_path) )
+                if name in dimension_names:
+                    raise ModelError("Dimension '%s' defined multiple times "
+                                     "(in '%s')" % (name, obj_path))
+                dimension_names.add(name)
                 model["dimensions"].append(desc)
 
             elif prefix == 'cube':
-                desc = _json_from_url(obj_path)
+                if lazy:
+                    name = _bundle_object_name(filename, prefix)
+                    desc = LazyMetadata(obj_path, name, cache_dir,
+                                        expand_cube_metadata)
+                else:
+                    desc = read_metadata_file(obj_path, cache_dir,
+                                              expand_cube_metadata)
                 try:
                     name = desc["name"]
                 except KeyError:
                     raise ModelError("Cube file '%s' has no name key" %
                                                                      obj_path)
-                if name in model["cubes"]:
+                if name in cube_names:
                     raise ModelError("Cube '%s' defined multiple times "
                                         "(in '%s')" % (name, obj_path) )
+                cube_names.add(name)
                 model["cubes"].append(desc)
 
     return model
 
 
+def _bundle_object_name(filename, prefix):
+    """Returns name of an object from its bundle `filename` such as
+    ``cube_sales.json``."""
+    return os.path.splitext(filename)[0][len(prefix) + 1:]
+
+
 def write_model_metadata_bundle(path, metadata, replace=False):
     """Writes a model metadata bundle into new directory `target` from
     `metadata`. Directory should not exist."""
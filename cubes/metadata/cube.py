@@ -6,13 +6,12 @@ from __future__ import absolute_import
 from collections import OrderedDict, defaultdict
 
 from ..common import assert_all_instances, get_localizable_attributes
-# TODO: This should belong here
-from ..query.statutils import aggregate_calculator_labels
+from ..common import LRUCache
 from ..errors import ModelError, ArgumentError, NoSuchAttributeError
 from ..errors import NoSuchDimensionError
 from .base import ModelObject, object_dict
 from .attributes import Attribute, Measure, MeasureAggregate
-from .attributes import create_list_of, collect_dependencies
+from .attributes import create_list_of, DependencyGraph
 from .attributes import expand_attribute_metadata
 from .dimension import Dimension
 
@@ -39,8 +38,11 @@ IMPLICIT_AGGREGATE_LABELS = {
     "avg": u"Average of {measure}",
 }
 
+_CALCULATOR_LABELS_ADDED = False
 
-IMPLICIT_AGGREGATE_LABELS.update(aggregate_calculator_labels())
+# Number of attribute lists with dependencies collected by
+# `Cube.collect_dependencies()` kept by a frozen cube
+DEPENDENCY_CACHE_SIZE = 256
 
 
 class Cube(ModelObject):
@@ -99,6 +101,10 @@ class Cube(ModelObject):
     * `default_hierarchy_name` – which hierarchy will be used as default
       in the linked dimension
 
+    The cube is frozen with :meth:`Cube.freeze()` once the dimensions are
+    linked. Frozen cube keeps its attribute lists, attribute lookup
+    dictionaries and attribute dependencies instead of collecting them from
+    the dimensions on every call.
     """
 
     localizable_attributes = ["label", "description"]
@@ -235,6 +241,7 @@ class Cube(ModelObject):
         self.basename = self.name
 
         self._dimensions = OrderedDict()
+        self._index = None
 
         if dimensions:
             if not all([isinstance(dim, Dimension) for dim in dimensions]):
@@ -342,11 +349,7 @@ class Cube(ModelObject):
         levels..
         """
 
-        attributes = []
-        for dim in self.dimensions:
-            attributes += dim.key_attributes
-
-        return attributes
+        return list(self._attribute_index().dimension_keys)
 
     @property
     def all_attributes(self):
@@ -363,15 +366,7 @@ class Cube(ModelObject):
 
         """
 
-        attributes = []
-        for dim in self.dimensions:
-            attributes += dim.attributes
-
-        attributes += self.details
-        attributes += self.measures
-        attributes += self.aggregates
-
-        return attributes
+        return list(self._attribute_index().all_attributes)
 
     @property
     def base_attributes(self):
@@ -395,15 +390,8 @@ class Cube(ModelObject):
 
         .. versionadded:: 1.1
         """
-        attributes = []
-        for dim in self.dimensions:
-            attributes += dim.attributes
-
-        attributes += self.details
-
-        attributes += self.measures
 
-        return attributes
+        return list(self._attribute_index().fact_attributes)
 
     @property
     def attribute_dependencies(self):
@@ -416,47 +404,26 @@ class Cube(ModelObject):
         .. versionadded:: 1.1
         """
 
-        attributes = self.all_attributes + self.all_aggregate_attributes
-        return {attr.ref:attr.dependencies for attr in attributes}
+        return dict(self._attribute_index().graph.dependencies)
 
     @property
     def all_aggregate_attributes(self):
         """All cube's attributes for aggregation: attributes of dimensions and
         aggregates.  """
 
-        attributes = []
-        for dim in self.dimensions:
-            attributes += dim.attributes
-
-        attributes += self.aggregates
-
-        return attributes
+        return list(self._attribute_index().aggregate_attributes)
 
     def attribute(self, attribute):
         """Returns an attribute object (dimension attribute, measure or
         detail)."""
 
-        # TODO: This should be a dictionary once the Cube object becomes
-        # immutable
-
         name = str(attribute)
 
-        for dim in self.dimensions:
-            try:
-                return dim.attribute(name, by_ref=True)
-            except KeyError:
-                continue
-
-        for detail in self.details:
-            if detail.name == name:
-                return detail
-
-        for measure in self.measures:
-            if measure.name == name:
-                return measure
-
-        raise NoSuchAttributeError("Cube '%s' has no attribute '%s'"
-                                   % (self.name, attribute))
+        try:
+            return self._attribute_index().lookup[name]
+        except KeyError:
+            raise NoSuchAttributeError("Cube '%s' has no attribute '%s'"
+                                       % (self.name, attribute))
 
     def get_attributes(self, attributes=None, aggregated=False):
         """Returns a list of cube's attributes. If `aggregated` is `True` then
@@ -473,16 +440,13 @@ class Cube(ModelObject):
         references in `attrubutes` are considered simplified, otherwise they
         are considered as full (dim.attribute)."""
 
-        # TODO: this should be a dictionary created in __init__ once this
-        # class becomes immutable
-
         if not attributes:
             if aggregated:
                 return self.all_aggregate_attributes
             else:
                 return self.all_fact_attributes
 
-        everything = object_dict(self.all_attributes, True)
+        everything = self._attribute_index().by_ref
 
         names = (str(attr) for attr in attributes or [])
 
@@ -509,23 +473,67 @@ class Cube(ModelObject):
         logical references and their physical object representations from
         expressions in the order of items in the returned list.
 
+        Frozen cube keeps the result for the most recently used sets of
+        `attributes`.
+
         .. versionadded:: 1.1
         """
 
-        depsorted = collect_dependencies(attributes, self.all_attributes)
+        index = self._attribute_index()
+        refs = [attr.ref for attr in attributes]
+
+        if index.collected is not None:
+            key = frozenset(refs)
+            collected = index.collected.get(key)
+            if collected is not None:
+                return list(collected)
+
+        depsorted = index.graph.depsort(refs)
+        collected = self.get_attributes(depsorted)
+
+        if index.collected is not None:
+            index.collected.set(key, tuple(collected))
+
+        return collected
+
+    def freeze(self):
+        """Freezes the cube after its dimensions are linked: attribute lists,
+        attribute lookup dictionaries and attribute dependencies are kept
+        once they are created. Dimensions can not be added to a frozen cube
+        and the cube's details, measures and aggregates should not be
+        changed. Returns the cube.
+
+        Raises `ExpressionError` when there is a circular reference between
+        the cube's attributes."""
+
+        if self._index is None:
+            index = _AttributeIndex(self, DEPENDENCY_CACHE_SIZE)
+            index.graph.check_cycles()
+            self._index = index
 
-        return self.get_attributes(depsorted)
+        return self
+
+    @property
+    def is_frozen(self):
+        """`True` if the cube is frozen. See :meth:`Cube.freeze()`."""
+        return self._index is not None
+
+    def _attribute_index(self):
+        """Returns the attribute index of a frozen cube or a new index which
+        is used only for the current call."""
+        return self._index or _AttributeIndex(self)
 
     def link_dimension(self, dimension):
         """Links `dimension` object or a clone of it to the cube according to
         the specification of cube's dimension link. See
         :meth:`Dimension.clone` for more information about cloning a
-        dimension."""
+        dimension. Cubes with the same link of a dimension share the
+        clone."""
 
         link = self.dimension_links.get(dimension.name)
 
         if link:
-            dimension = dimension.clone(**link)
+            dimension = dimension.shared_clone(**link)
 
         self._add_dimension(dimension)
 
@@ -538,6 +546,9 @@ class Cube(ModelObject):
         if not dimension:
             raise ArgumentError("Trying to add None dimension to cube '%s'."
                                 % self.name)
+        elif self._index is not None:
+            raise ModelError("Can not add dimension '%s' to frozen cube '%s'"
+                             % (dimension.name, self.name))
         elif not isinstance(dimension, Dimension):
             raise ArgumentError("Dimension added to cube '%s' is not a "
                                 "Dimension instance. It is '%s'"
@@ -700,6 +711,12 @@ class Cube(ModelObject):
 
         return results
 
+    def localized(self, context):
+        acopy = super(Cube, self).localized(context)
+        # Attributes of the copy are different objects
+        acopy._index = None
+        return acopy
+
     def localize(self, trans):
         super(Cube, self).localized(trans)
 
@@ -740,9 +757,118 @@ class Cube(ModelObject):
         return self.name
 
 
+class _AttributeIndex(object):
+    def __init__(self, cube, cache_size=None):
+        """Attribute lists and lookup dictionaries of `cube`. Each of them is
+        created on first use. Lists of attributes with collected
+        dependencies are kept if `cache_size` is specified."""
+
+        self.cube = cube
+        self._cached = {}
+
+        if cache_size:
+            self.collected = LRUCache(cache_size)
+        else:
+            self.collected = None
+
+    def _get(self, name, create):
+        try:
+            return self._cached[name]
+        except KeyError:
+            value = self._cached[name] = create()
+            return value
+
+    def _dimension_attributes(self):
+        attributes = []
+        for dim in self.cube.dimensions:
+            attributes += dim.attributes
+        return tuple(attributes)
+
+    @property
+    def dimension_attributes(self):
+        return self._get("dimension_attributes", self._dimension_attributes)
+
+    @property
+    def dimension_keys(self):
+        def create():
+            keys = []
+            for dim in self.cube.dimensions:
+                keys += dim.key_attributes
+            return tuple(keys)
+
+        return self._get("dimension_keys", create)
+
+    @property
+    def all_attributes(self):
+        return self._get("all_attributes",
+                         lambda: self.dimension_attributes
+                                 + tuple(self.cube.details)
+                                 + tuple(self.cube.measures)
+                                 + tuple(self.cube.aggregates))
+
+    @property
+    def fact_attributes(self):
+        return self._get("fact_attributes",
+                         lambda: self.dimension_attributes
+                                 + tuple(self.cube.details)
+                                 + tuple(self.cube.measures))
+
+    @property
+    def aggregate_attributes(self):
+        return self._get("aggregate_attributes",
+                         lambda: self.dimension_attributes
+                                 + tuple(self.cube.aggregates))
+
+    @property
+    def by_ref(self):
+        """Dictionary of all attributes by reference. Raises `ModelError`
+        for duplicate references."""
+        return self._get("by_ref",
+                         lambda: object_dict(self.all_attributes, True))
+
+    @property
+    def lookup(self):
+        """Dictionary of dimension attributes by reference, details and
+        measures by name – for `Cube.attribute()`."""
+
+        def create():
+            lookup = {}
+            for attr in self.dimension_attributes:
+                lookup.setdefault(attr.ref, attr)
+            for attr in self.cube.details + self.cube.measures:
+                lookup.setdefault(attr.name, attr)
+            return lookup
+
+        return self._get("lookup", create)
+
+    @property
+    def graph(self):
+        """Dependency graph of all attributes."""
+        return self._get("graph",
+                         lambda: DependencyGraph({attr.ref:attr.dependencies
+                                                  for attr
+                                                  in self.all_attributes}))
+
+
+def _implicit_aggregate_labels():
+    """Returns the implicit aggregate labels including labels of the
+    post-aggregation calculators. The calculators are imported when the first
+    label is requested – importing them with this module would import the
+    whole query package."""
+    global _CALCULATOR_LABELS_ADDED
+
+    if not _CALCULATOR_LABELS_ADDED:
+        # TODO: This should belong here
+        from ..query.statutils import aggregate_calculator_labels
+        IMPLICIT_AGGREGATE_LABELS.update(aggregate_calculator_labels())
+        _CALCULATOR_LABELS_ADDED = True
+
+    return IMPLICIT_AGGREGATE_LABELS
+
+
 def _measure_aggregate_label(aggregate, measure):
     function = aggregate.function
-    template = IMPLICIT_AGGREGATE_LABELS.get(function, "{measure}")
+    template = _implicit_aggregate_labels().get(function, "{measure}")
 
     if aggregate.label is None and template:
 
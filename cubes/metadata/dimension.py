@@ -3,6 +3,7 @@
 from __future__ import absolute_import
 
 import copy
+import json
 import re
 
 from collections import OrderedDict
@@ -36,6 +37,8 @@ _DEFAULT_LEVEL_ROLES = {
 
 # TODO: Serves just as reminder for future direction. No real use yet.
 class Conceptual(ModelObject):
+    __slots__ = ()
+
     def levels(self):
         """Return list of levels of the conceptual object. Dimension returns
         just list of itself, hierarchy returns list of it's dimensions."""
@@ -331,6 +334,9 @@ class Dimension(Conceptual):
 
         self._flat_hierarchy = None
 
+        # Clones created by `shared_clone()`
+        self._shared_clones = {}
+
         # Set default hierarchy specified by ``default_hierarchy_name``, if
         # the variable is not set then get a hierarchy with name *default* or
         # the first hierarchy in the hierarchy list.
@@ -470,6 +476,29 @@ class Dimension(Conceptual):
 
         return list(self._attributes.values())
 
+    def shared_clone(self, **options):
+        """Returns a clone of the receiver with modifications specified in
+        `options` – see :meth:`Dimension.clone`. The clone is kept and
+        returned for all following calls with the same `options`, therefore
+        it should not be modified."""
+
+        key = json.dumps(options, sort_keys=True, default=str)
+
+        try:
+            return self._shared_clones[key]
+        except KeyError:
+            pass
+
+        dimension = self.clone(**options)
+        self._shared_clones[key] = dimension
+
+        return dimension
+
+    def localized(self, context):
+        acopy = super(Dimension, self).localized(context)
+        acopy._shared_clones = {}
+        return acopy
+
     def clone(self, hierarchies=None, exclude_hierarchies=None,
               nonadditive=None, default_hierarchy_name=None, cardinality=None,
               alias=None, **extra):
@@ -502,7 +531,8 @@ class Dimension(Conceptual):
         else:
             linked = self._hierarchies.values()
 
-        hierarchies = [copy.deepcopy(hier) for hier in linked]
+        # Hierarchies share the copied levels
+        hierarchies = copy.deepcopy(list(linked))
 
         if not hierarchies:
             raise ModelError("No hierarchies to clone. %s")
@@ -744,6 +774,8 @@ def _create_hierarchies(metadata, levels, template):
 
 class Hierarchy(Conceptual):
 
+    __slots__ = ("_levels", )
+
     localizable_attributes = ["label", "description"]
 
     def __init__(self, name, levels, label=None, info=None, description=None):
@@ -784,7 +816,7 @@ class Hierarchy(Conceptual):
                          label=self.label,
                          description=self.description,
                          info=copy.deepcopy(self.info, memo),
-                         levels=copy.deepcopy(self._levels.values(), memo))
+                         levels=copy.deepcopy(list(self._levels.values()), memo))
 
     @property
     def levels(self):
@@ -1026,6 +1058,9 @@ class Level(ModelObject):
 
     """
 
+    __slots__ = ("cardinality", "role", "attributes", "nonadditive", "key",
+                 "label_attribute", "order_attribute", "order")
+
     localizable_attributes = ["label", "description"]
     localizable_lists = ["attributes"]
 
@@ -1279,7 +1314,7 @@ def expand_dimension_metadata(metadata, expand_levels=False):
         raise ModelInconsistencyError("Both 'hierarchy' and 'hierarchies'"
                                       " specified. Use only one")
 
-    hierarchy = metadata.get("hierarchy")
+    hierarchy = metadata.pop("hierarchy", None)
     if hierarchy:
         hierarchies = [{"name": "default", "levels": hierarchy}]
     else:
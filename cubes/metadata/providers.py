@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 """Logical model model providers."""
-import copy
-
+from ..common import LRUCache
 from ..errors import ModelError, TemplateRequired, CubesError, BackendError
 from ..errors import NoSuchDimensionError, NoSuchCubeError
 from .localization import LocalizationContext
@@ -16,6 +15,11 @@ __all__ = [
 ]
 
 
+# Number of merged cube metadata and of linked dimensions kept by a model
+# provider
+METADATA_CACHE_SIZE = 1024
+
+
 # Proposed Provider API:
 #     Provider.cube() – in abstract class
 #     Provider.provide_cube() – in concrete class, providers Cube object that
@@ -45,13 +49,26 @@ def link_cube(cube, locale, provider=None, namespace=None,
             raise ModelError("Dimension '{}' linked twice"
                              .format(dim_name))
 
-        try:
-            dim = find_dimension(dim_name, locale,
-                                 provider=provider,
-                                 namespace=namespace)
+        # Dimensions found (and localized) for the provider's cubes are kept
+        # by the provider
+        key = (dim_name, locale, namespace)
+        if provider is not None:
+            dim = provider.linked_dimensions.get(key)
+        else:
+            dim = None
 
-        except TemplateRequired as e:
-            raise ModelError("Dimension template '%s' missing" % dim_name)
+        if dim is None:
+            try:
+                dim = find_dimension(dim_name, locale,
+                                     provider=provider,
+                                     namespace=namespace)
+
+            except TemplateRequired as e:
+                raise ModelError("Dimension template '%s' missing"
+                                 % dim_name)
+
+            if dim and provider is not None:
+                provider.linked_dimensions.set(key, dim)
 
         if not dim and not ignore_missing:
             raise CubesError("Dimension '{}' not found.".format(dim_name))
@@ -194,6 +211,24 @@ class ModelProvider(object):
         self.options = self.metadata.get("options", {})
         self.options.update(self.metadata.get("browser_options", {}))
 
+        # Dimensions created by `dimension()` – they are shared by all cubes
+        # linking them
+        self._dimensions = {}
+
+        # Merged cube metadata by (cube, locale) and dimensions linked to the
+        # cubes by (dimension, locale, namespace)
+        self._cube_metadata = LRUCache(METADATA_CACHE_SIZE)
+        self.linked_dimensions = LRUCache(METADATA_CACHE_SIZE)
+
+    def clear_cache(self):
+        """Removes the merged cube metadata, created and linked dimensions
+        kept by the provider. Should be called when the model metadata or
+        translations change."""
+
+        self._dimensions.clear()
+        self._cube_metadata.clear()
+        self.linked_dimensions.clear()
+
     def _merge_metadata(self, metadata, other):
         """See `default_metadata()` for more information."""
 
@@ -293,19 +328,36 @@ class ModelProvider(object):
         Subclasses should override this method and call the super if they
         would like to merge metadata provided in a model file.
 
+        The merged metadata are kept per cube `name` and `locale`. Returned
+        dictionary is a shallow copy of the kept metadata – nested structures
+        are shared and should not be modified.
+
         .. note:
 
             If provider is caching a cube metadata, it should store a cache
             for localized version of the cube metadata.
         """
 
+        key = (name, locale)
+        metadata = self._cube_metadata.get(key)
+
+        if metadata is None:
+            metadata = self._merge_cube_metadata(name)
+            self._cube_metadata.set(key, metadata)
+
+        return dict(metadata)
+
+    def _merge_cube_metadata(self, name):
+        """Returns metadata of cube `name` merged with model's global
+        metadata. See `cube_metadata()`."""
+
         if name in self.cubes_metadata:
             metadata = dict(self.cubes_metadata[name])
         else:
             raise NoSuchCubeError("No such cube '%s'" % name, name)
 
         # merge browser_options
-        browser_options = self.metadata.get('browser_options', {})
+        browser_options = dict(self.metadata.get('browser_options', {}))
         if metadata.get('browser_options'):
             browser_options.update(metadata.get('browser_options'))
         metadata['browser_options'] = browser_options
@@ -316,7 +368,7 @@ class ModelProvider(object):
         cube_mappings = metadata.pop("mappings", {})
 
         if model_mappings:
-            mappings = copy.deepcopy(model_mappings)
+            mappings = dict(model_mappings)
             mappings.update(cube_mappings)
         else:
             mappings = cube_mappings
@@ -343,7 +395,7 @@ class ModelProvider(object):
                     raise ModelError("Duplicate model-level join 'name': %s" %
                                      jname)
 
-                model_join_map[jname] = copy.deepcopy(join)
+                model_join_map[jname] = join
 
             # Merge cube's joins with model joins by their names.
             merged_joins = []
@@ -390,6 +442,14 @@ class ModelProvider(object):
 
         return name in self.cubes_metadata
 
+    def cube_names(self):
+        """Returns a list of names of cubes for which `has_cube()` is `True`
+        or `None` if the names can not be listed. The names are used by the
+        namespace cube index. Subclasses that override `has_cube()` should
+        override this method as well."""
+
+        return list(self.cubes_metadata.keys())
+
     def cube(self, name, locale=None, namespace=None):
         """Returns a cube with `name` provided by the receiver. If receiver
         does not have the cube `NoSuchCube` exception is raised.
@@ -423,9 +483,24 @@ class ModelProvider(object):
 
         If the receiver does not provide the dimension `NoSuchDimension`
         exception is raised.
+
+        The created dimension is kept and returned for every following
+        request for the same `name` and `locale` – conformed dimensions are
+        shared by the cubes instead of being copied. The returned dimension
+        should not be modified.
         """
+
+        key = (name, locale)
+        try:
+            return self._dimensions[key]
+        except KeyError:
+            pass
+
         metadata = self.dimension_metadata(name, locale)
-        return Dimension.from_metadata(metadata, templates=templates)
+        dimension = Dimension.from_metadata(metadata, templates=templates)
+        self._dimensions[key] = dimension
+
+        return dimension
 
 
 # TODO: make this FileModelProvider
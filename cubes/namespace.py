@@ -22,6 +22,31 @@ class Namespace(object):
         self.providers = []
         self.translations = {}
 
+        # Version of the namespace content – increased when a provider,
+        # translation or nested namespace is added to the namespace or to
+        # any of its nested namespaces. Cube index and lists of cubes are
+        # kept with the version they were created for.
+        self.version = 0
+        self._cube_index = None
+        self._cube_lists = {}
+
+    def _changed(self):
+        """Increases the version of the namespace and of its parents."""
+        namespace = self
+        while namespace is not None:
+            namespace.version += 1
+            namespace = namespace.parent
+
+    def invalidate(self):
+        """Discards the cube index and lists of cubes of the namespace and
+        of its nested namespaces. Should be called when the cubes of a
+        provider change."""
+
+        for namespace in self.namespaces.values():
+            namespace.invalidate()
+
+        self._changed()
+
     def namespace(self, path, create=False):
         """Returns a tuple (`namespace`, `remainder`) where `namespace` is
         the deepest namespace in the namespace hierarchy and `remainder` is
@@ -67,6 +92,7 @@ class Namespace(object):
 
         namespace = Namespace(nsname, parent=self)
         self.namespaces[name] = namespace
+        self._changed()
 
         return namespace
 
@@ -82,6 +108,14 @@ class Namespace(object):
         """
 
         cube_ref = str(cube_ref)
+
+        try:
+            return self.cube_index()[cube_ref]
+        except KeyError:
+            # Not indexed: unknown cube, cube of an external namespace or of
+            # a provider that does not list its cubes
+            pass
+
         split = cube_ref.split(".")
         if len(split) > 1:
             path = split[0:-1]
@@ -112,11 +146,75 @@ class Namespace(object):
 
         return (namespace, provider, basename)
 
+    def cube_index(self):
+        """Returns a dictionary of cube references (relative to the
+        receiver) and tuples (`namespace`, `provider`, `basename`) as
+        returned by `find_cube()` for cubes of this namespace and of all the
+        nested namespaces. The index is created again when the namespace
+        version changes.
+
+        Cubes with dots in their names and cubes of providers that do not
+        list their cube names (and of providers following them) are not in
+        the index."""
+
+        index = self._cube_index
+
+        if index is None or index[0] != self.version:
+            version = self.version
+            index = (version, self._create_cube_index())
+            self._cube_index = index
+
+        return index[1]
+
+    def _create_cube_index(self):
+        index = {}
+        namespaces = [((), self)]
+
+        while namespaces:
+            (path, namespace) = namespaces.pop()
+
+            for name, nested in namespace.namespaces.items():
+                namespaces.append((path + (name, ), nested))
+
+            for provider in namespace.providers:
+                if hasattr(provider, "cube_names"):
+                    names = provider.cube_names()
+                else:
+                    names = None
+
+                # Cubes of the following providers might be hidden by this
+                # provider
+                if names is None:
+                    break
+
+                for name in names:
+                    if "." in name:
+                        continue
+
+                    ref = ".".join(path + (name, ))
+                    # First provider with the cube provides it
+                    if ref not in index:
+                        index[ref] = (namespace, provider, name)
+
+        return index
 
     def list_cubes(self, recursive=False):
         """Retursn a list of cube info dictionaries with keys: `name`,
-        `label`, `description`, `category` and `info`."""
+        `label`, `description`, `category` and `info`.
+
+        The list is kept until the namespace version changes, see
+        `invalidate()`."""
+
+        cube_list = self._cube_lists.get(recursive)
 
+        if cube_list is None or cube_list[0] != self.version:
+            version = self.version
+            cube_list = (version, self._list_cubes(recursive))
+            self._cube_lists[recursive] = cube_list
+
+        return [dict(cube) for cube in cube_list[1]]
+
+    def _list_cubes(self, recursive):
         all_cubes = []
         cube_names = set()
         for provider in self.providers:
@@ -163,6 +261,12 @@ class Namespace(object):
 
     def add_provider(self, provider):
         self.providers.append(provider)
+        self._changed()
+
+    def replace_provider(self, old, new):
+        """Replaces provider `old` with provider `new`."""
+        self.providers[self.providers.index(old)] = new
+        self._changed()
 
     def add_translation(self, lang, translation):
         """Registers and merges `translation` for language `lang`"""
@@ -177,6 +281,7 @@ class Namespace(object):
             translation = read_json_file(translation)
 
         trans.update(translation)
+        self._changed()
 
     def translation_lookup(self, lang):
         """Returns translation in language `lang` for model object `obj`
@@ -2,3 +2,4 @@ from .browser import *
 from .cells import *
 from .computation import *
 from .statutils import *
+from .sketches import *
@@ -2,15 +2,28 @@
 
 from __future__ import absolute_import
 
-from collections import namedtuple
+import base64
+import binascii
+import datetime
+import decimal
+import itertools
+import json
 
-from ..calendar import CalendarMemberConverter
+from collections import namedtuple, OrderedDict
+
+from dateutil.parser import parse as parse_datetime
+
+from ..calendar import Calendar, CalendarMemberConverter
 from ..logging import get_logger
-from ..common import IgnoringDictionary
+from ..common import IgnoringDictionary, record_rows
 from ..errors import ArgumentError, NoSuchAttributeError, HierarchyError
 from ..metadata import string_to_dimension_level
 
 from .statutils import calculators_for_aggregates, available_calculators
+from .statutils import RELATIVE_AGGREGATIONS, RelativeFunction
+from .statutils import APPROXIMATE_AGGREGATIONS, SketchFunction
+from .statutils import reference_specification, get_key
+from .statutils import restricted_reference_cell
 from .cells import Cell, PointCut, RangeCut, SetCut, cuts_from_string
 from ..metadata import Dimension
 
@@ -26,6 +39,11 @@ __all__ = [
     "Drilldown",
     "DrilldownItem",
     "levels_from_drilldown",
+    "TopN",
+    "Sample",
+    "PageCursor",
+    "encode_cursor",
+    "decode_cursor",
 
     "TableRow",
     "SPLIT_DIMENSION_NAME",
@@ -77,7 +95,8 @@ class AggregationBrowser(object):
         return {}
 
     def aggregate(self, cell=None, aggregates=None, drilldown=None, split=None,
-                  order=None, page=None, page_size=None, **options):
+                  order=None, page=None, page_size=None, top=None,
+                  sample=None, sample_rows=None, cursor=None, **options):
 
         """Return aggregate of a cell.
 
@@ -94,6 +113,12 @@ class AggregationBrowser(object):
         * `order` – attribute order specification (see below)
         * `page` – page index when requesting paginated results
         * `page_size` – number of result items per page
+        * `cursor` – position of the page for keyset pagination instead of
+          the `page` index (see below)
+        * `top` – return only top cells by an aggregate (see below)
+        * `sample` – aggregate only a sample of the facts, for example
+          ``"1%"`` or ``0.01``. `sample_rows` – aggregate a sample of
+          approximately `sample_rows` facts (see below)
 
         Drill down can be specified in two ways: as a list of dimensions or as
         a dictionary. If it is specified as list of dimensions, then cell is
@@ -118,6 +143,29 @@ class AggregationBrowser(object):
         the cell is within the split cell and `false` if the cell is outside
         of the split.
 
+        If `top` is specified, then only top cells ordered by an aggregate
+        (descending) are returned, optionally top cells within each member of
+        a partition dimension. `top` might be a number of cells, a string
+        ``count:aggregate:dimension`` (aggregate and dimension are optional),
+        a tuple with the same elements or a `TopN` object. Default aggregate
+        is the first aggregate. The remaining cells are aggregated into
+        `result.remainder`.
+
+        If `sample` or `sample_rows` is specified, then only a sample of the
+        facts is aggregated, if the backend supports it. Additive
+        aggregates (sums and counts) are scaled up to estimate the values of
+        all the facts. `result.sample` contains the sample description with
+        error bounds of the summary.
+
+        If `cursor` is specified, then the drilldown cells are paginated by
+        the ordering key instead of the page index: the cells following the
+        `cursor` are selected with a condition on the key, which is not
+        getting slower with deeper pages as the offset does. The cells are
+        ordered by `order`, by the natural order of the drilldown levels and
+        by the level keys. `cursor` is an empty string for the first page or
+        `result.next_cursor` of the previous page, which is ``None`` for the
+        last page. `page_size` is required.
+
         Note: subclasses should implement `provide_aggregate()` method.
         """
 
@@ -145,6 +193,15 @@ class AggregationBrowser(object):
 
         drilldon = Drilldown(drilldown, cell)
 
+        if top is not None:
+            options["top"] = self.prepare_top(top, aggregates, drilldon)
+
+        if sample is not None or sample_rows is not None:
+            options["sample"] = self.prepare_sample(sample, sample_rows)
+
+        if cursor is not None:
+            options["cursor"] = self.prepare_cursor(cursor, page, page_size)
+
         result = self.provide_aggregate(cell,
                                         aggregates=aggregates,
                                         drilldown=drilldon,
@@ -161,16 +218,66 @@ class AggregationBrowser(object):
                            if agg.function and \
                                 not self.is_builtin_function(agg.function)]
 
+        relative_aggs = [agg for agg in calculated_aggs
+                         if agg.function in RELATIVE_AGGREGATIONS]
+        approximate_aggs = [agg for agg in calculated_aggs
+                            if agg.function in APPROXIMATE_AGGREGATIONS]
+        calculated_aggs = [agg for agg in calculated_aggs
+                           if agg not in relative_aggs
+                           and agg not in approximate_aggs]
+
         result.calculators = calculators_for_aggregates(self.cube,
                                                         calculated_aggs,
-                                                        drilldown,
+                                                        drilldon,
                                                         split)
 
-        # Do calculated measures on summary if no drilldown or split
+        # Do calculated measures on summary if no drilldown or split. The
+        # summary has its own calculators, so the windows of the cells are
+        # not affected by the summary values.
         if result.summary:
-            for calc in result.calculators:
+            summary_calculators = calculators_for_aggregates(self.cube,
+                                                             calculated_aggs,
+                                                             drilldon,
+                                                             split)
+            for calc in summary_calculators:
                 calc(result.summary)
 
+        # Approximate aggregates that the backend can not compute are
+        # estimated from sketches of the facts
+        if approximate_aggs:
+            (calculators, summary_calculators) = \
+                    self.approximate_calculators(cell, approximate_aggs,
+                                                 drilldon, split)
+            result.calculators += calculators
+
+            if result.summary is not None:
+                for calc in summary_calculators:
+                    calc(result.summary)
+
+        # Relative aggregates are computed from one extra query per kind of
+        # reference cells. The reference cells of a page are restricted to
+        # the references of the page cells.
+        if relative_aggs:
+            if page_size and (page is not None or cursor is not None):
+                result.cells = page_records = list(result.cells)
+            else:
+                page_records = None
+
+            (calculators, summary_calculators) = \
+                    self.relative_calculators(cell, relative_aggs, drilldon,
+                                              split, result.summary,
+                                              sample=options.get("sample"),
+                                              records=page_records)
+            result.calculators += calculators
+
+            if result.summary:
+                for calc in summary_calculators:
+                    calc(result.summary)
+
+        # The calculators were added after the cells were set
+        if result.calculators and result.cells:
+            result.apply_calculators()
+
         return result
 
     def provide_aggregate(self, cell=None, measures=None, aggregates=None,
@@ -186,11 +293,247 @@ class AggregationBrowser(object):
         * `drilldown` – `Drilldown` instance
         * `split` – `Cell` instance
         * `order` – list of tuples: (`attribute`, `order`)
+        * `top` – an optional `TopN` object in `options`
+        * `sample` – an optional `Sample` object in `options`
 
         """
         raise NotImplementedError("{} does not provide aggregate functionality." \
                                   .format(str(type(self))))
 
+    def relative_calculators(self, cell, aggregates, drilldown, split=None,
+                             summary=None, sample=None, records=None):
+        """Returns a tuple (`calculators`, `summary_calculators`) for
+        relative `aggregates` – aggregates with functions from
+        `RELATIVE_AGGREGATIONS` such as previous period value or share of
+        parent.
+
+        Reference values of all aggregates with the same kind of reference
+        cells are retrieved by a single query through `provide_aggregate()`
+        and joined with the result cells in memory by the drilldown key.
+        `summary` is the already computed summary of the `cell` (if any),
+        which is used as the reference for the share of summary. The
+        reference cells are aggregated from the same `sample` as the cell,
+        if specified.
+
+        If `records` – cells of a page – are specified, then only the
+        reference cells of the records are aggregated (see
+        `restricted_reference_cell()`)."""
+
+        calendar = self.calendar or Calendar()
+
+        # Group aggregates by their references
+        groups = OrderedDict()
+        for agg in aggregates:
+            reference = RELATIVE_AGGREGATIONS[agg.function].reference
+            groups.setdefault((reference, agg.period), []).append(agg)
+
+        calculators = []
+        summary_calculators = []
+
+        for (reference, period), group in groups.items():
+            spec = reference_specification(reference, cell, drilldown,
+                                           split=split, period=period,
+                                           calendar=calendar)
+            if spec is None:
+                references = {}
+                reference_summary = None
+            else:
+                sources = [self.cube.aggregate(agg.measure) for agg in group]
+                (references, reference_summary) = \
+                        self._reference_records(spec, sources, split, cell,
+                                                summary, sample, records)
+
+            for agg in group:
+                function = RELATIVE_AGGREGATIONS[agg.function].function
+                source = self.cube.aggregate(agg.measure).ref
+
+                calc = RelativeFunction(function, agg.ref, source,
+                                        key=spec.key if spec else None,
+                                        references=references,
+                                        shift=spec.shift if spec else None)
+                calculators.append(calc)
+
+                # The summary is reference of itself, unless it is shifted
+                if spec and not spec.shift and reference_summary:
+                    summary_refs = {(): reference_summary}
+                else:
+                    summary_refs = {}
+
+                calc = RelativeFunction(function, agg.ref, source, key=None,
+                                        references=summary_refs)
+                summary_calculators.append(calc)
+
+        return (calculators, summary_calculators)
+
+    def approximate_calculators(self, cell, aggregates, drilldown,
+                                split=None):
+        """Returns a tuple (`calculators`, `summary_calculators`) for
+        approximate `aggregates` – aggregates with functions from
+        `APPROXIMATE_AGGREGATIONS` such as approximate distinct count or
+        percentile.
+
+        The sketches of the drilled-down cells are built by
+        `fact_sketches()`. The summary sketch is merge of the cell sketches.
+        Cells of a `split` are not distinguished, therefore the aggregates
+        are `None` if the `split` is used."""
+
+        key = [attr.ref for attr in drilldown.key_attributes]
+
+        if not split:
+            sketches = self.fact_sketches(cell, aggregates, drilldown)
+        else:
+            sketches = {}
+
+        # Roll-up the cell sketches into the summary sketches
+        summary = [APPROXIMATE_AGGREGATIONS[agg.function].sketch(agg)
+                   for agg in aggregates]
+        for row in sketches.values():
+            for sketch, cell_sketch in zip(summary, row):
+                sketch.merge(cell_sketch)
+
+        calculators = []
+        summary_calculators = []
+
+        for i, agg in enumerate(aggregates):
+            aggregation = APPROXIMATE_AGGREGATIONS[agg.function]
+            calc = SketchFunction(aggregation, agg, key,
+                                  sketches if not split else None, i)
+            calculators.append(calc)
+
+            calc = SketchFunction(aggregation, agg, None,
+                                  {(): summary} if not split else None, i)
+            summary_calculators.append(calc)
+
+        return (calculators, summary_calculators)
+
+    def fact_sketches(self, cell, aggregates, drilldown):
+        """Returns a dictionary of lists of sketches of approximate
+        `aggregates` by key of the `drilldown` cells. The measures are
+        fetched with `facts()` and added to mergeable sketches of the cells
+        (see `cubes.query.sketches`)."""
+
+        key = [attr.ref for attr in drilldown.key_attributes]
+        sketches = {}
+
+        measures = []
+        for agg in aggregates:
+            if agg.measure not in measures:
+                measures.append(agg.measure)
+
+        facts = self.facts(cell, fields=key + measures)
+
+        for fact in facts:
+            fact_key = get_key(fact, key)
+            try:
+                row = sketches[fact_key]
+            except KeyError:
+                row = [APPROXIMATE_AGGREGATIONS[agg.function].sketch(agg)
+                       for agg in aggregates]
+                sketches[fact_key] = row
+
+            _add_to_sketches(row, aggregates, fact)
+
+        return sketches
+
+    def iter_fact_sketches(self, cell, aggregates, drilldown):
+        """Yields tuples (`key`, `sketches`) with lists of sketches of
+        approximate `aggregates` of the `drilldown` cells, one cell at a
+        time. The facts are fetched ordered by the `drilldown` key, therefore
+        the cells are yielded in the order of their keys and only sketches of
+        one cell are kept in memory."""
+
+        key = [attr.ref for attr in drilldown.key_attributes]
+
+        measures = []
+        for agg in aggregates:
+            if agg.measure not in measures:
+                measures.append(agg.measure)
+
+        facts = self.facts(cell, fields=key + measures,
+                           order=self.prepare_order(key))
+
+        for fact_key, group in itertools.groupby(facts,
+                                                 lambda f: get_key(f, key)):
+            row = [APPROXIMATE_AGGREGATIONS[agg.function].sketch(agg)
+                   for agg in aggregates]
+
+            for fact in group:
+                _add_to_sketches(row, aggregates, fact)
+
+            yield (fact_key, row)
+
+    def _reference_records(self, spec, aggregates, split=None, cell=None,
+                           summary=None, sample=None, records=None):
+        """Aggregates reference cells of `spec` and returns a tuple
+        (`references`, `summary`) where `references` is a dictionary of
+        reference records by their keys. Already computed `summary` of
+        `cell` is reused if the reference is the cell itself. Only reference
+        cells of `records` are aggregated, if specified."""
+
+        if not spec.key:
+            if spec.cell is cell and summary is not None:
+                reference_summary = summary
+            else:
+                reference_summary = self._reference_summary(spec.cell,
+                                                            aggregates,
+                                                            sample)
+
+            return ({(): reference_summary}, reference_summary)
+
+        if records is not None:
+            reference_cell = restricted_reference_cell(spec, records, split)
+            include_summary = False
+
+            # The restricted reference cells are not the whole reference
+            # cell, its summary is aggregated separately
+            if summary is None or spec.shift is not None:
+                reference_summary = None
+            elif spec.cell is cell:
+                reference_summary = summary
+            else:
+                reference_summary = self._reference_summary(spec.cell,
+                                                            aggregates,
+                                                            sample)
+
+            if reference_cell is None:
+                return ({}, reference_summary)
+        else:
+            reference_cell = spec.cell
+            include_summary = summary is not None and spec.shift is None
+
+        result = self.provide_aggregate(reference_cell,
+                                        aggregates=aggregates,
+                                        drilldown=Drilldown(spec.drilldown,
+                                                            reference_cell),
+                                        split=split,
+                                        order=None,
+                                        page=None,
+                                        page_size=None,
+                                        include_summary=include_summary,
+                                        include_cell_count=False,
+                                        sample=sample)
+
+        references = dict((get_key(record, spec.key), record)
+                          for record in result.cells)
+
+        if records is None:
+            reference_summary = result.summary
+
+        return (references, reference_summary)
+
+    def _reference_summary(self, cell, aggregates, sample=None):
+        """Returns summary of the reference `cell`."""
+
+        result = self.provide_aggregate(cell,
+                                        aggregates=aggregates,
+                                        drilldown=Drilldown(),
+                                        split=None,
+                                        order=None,
+                                        page=None,
+                                        page_size=None,
+                                        sample=sample)
+        return result.summary
+
     def prepare_aggregates(self, aggregates=None, measures=None):
         """Prepares the aggregate list for aggregatios. `aggregates` might be a
         list of aggregate names or `MeasureAggregate` objects.
@@ -238,6 +581,7 @@ class AggregationBrowser(object):
         for agg in aggregates:
             if agg.measure and \
                     not self.is_builtin_function(agg.function) \
+                    and agg.function not in APPROXIMATE_AGGREGATIONS \
                     and agg.measure not in seen:
                 seen.add(agg.measure)
 
@@ -253,6 +597,117 @@ class AggregationBrowser(object):
         aggregates += dependencies
         return aggregates
 
+    def prepare_top(self, top, aggregates, drilldown):
+        """Prepares a `TopN` object from `top` which might be a number, a
+        string ``count:aggregate:dimension`` or a tuple (`count`,
+        `aggregate`, `dimension`). `aggregate` and `dimension` are optional.
+        Default aggregate is the first of `aggregates`. The partition
+        `dimension` has to be in the `drilldown`."""
+
+        if isinstance(top, TopN):
+            return top
+
+        if isinstance(top, compat.string_type):
+            top = top.split(":")
+        elif not isinstance(top, (list, tuple)):
+            top = [top]
+
+        if not top or len(top) > 3:
+            raise ArgumentError("Top should be a count with optional "
+                                "aggregate and dimension")
+
+        top = list(top) + [None] * (3 - len(top))
+        (count, aggregate, dimension) = top
+
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            raise ArgumentError("Top count should be a number, is '%s'"
+                                % (count, ))
+
+        if count < 1:
+            raise ArgumentError("Top count should be greater than 0")
+
+        if aggregate:
+            aggregate = self.cube.aggregate(aggregate)
+        elif aggregates:
+            aggregate = aggregates[0]
+        else:
+            raise ArgumentError("No aggregate to order top cells by")
+
+        if aggregate.function \
+                and not self.is_builtin_function(aggregate.function):
+            raise ArgumentError("Can not order top cells by post-aggregation "
+                                "aggregate '%s'" % aggregate.name)
+
+        if dimension:
+            dimension = self.cube.dimension(dimension)
+            if not drilldown.has_dimension(dimension):
+                raise ArgumentError("Top partition dimension '%s' should be "
+                                    "in the drilldown" % dimension.name)
+        else:
+            dimension = None
+
+        return TopN(count, aggregate, dimension)
+
+    def prepare_sample(self, sample=None, sample_rows=None):
+        """Prepares a `Sample` object from `sample` which might be a fraction
+        of facts (a number between 0 and 1) or a percentage string such as
+        ``"1%"``, or from approximate number of facts `sample_rows`."""
+
+        if isinstance(sample, Sample):
+            return sample
+
+        if sample is not None and sample_rows is not None:
+            raise ArgumentError("Only one of sample and sample_rows should "
+                                "be specified")
+
+        if sample_rows is not None:
+            try:
+                rows = int(sample_rows)
+            except (TypeError, ValueError):
+                raise ArgumentError("Sample rows should be a number, is '%s'"
+                                    % (sample_rows, ))
+
+            if rows < 1:
+                raise ArgumentError("Sample rows should be greater than 0")
+
+            return Sample(None, rows)
+
+        try:
+            if isinstance(sample, compat.string_type) \
+                    and sample.strip().endswith("%"):
+                fraction = float(sample.strip()[:-1]) / 100.0
+            else:
+                fraction = float(sample)
+        except (TypeError, ValueError):
+            raise ArgumentError("Sample should be a fraction or a percentage, "
+                                "is '%s'" % (sample, ))
+
+        if fraction <= 0 or fraction > 1:
+            raise ArgumentError("Sample should be greater than 0 and at most "
+                                "100%")
+
+        return Sample(fraction, None)
+
+    def prepare_cursor(self, cursor, page=None, page_size=None):
+        """Prepares a `PageCursor` object from `cursor` which might be a
+        cursor token returned as `next_cursor` of a previous page or an
+        empty string for the first page. Keyset pagination requires
+        `page_size` and can not be combined with `page`."""
+
+        if not page_size:
+            raise ArgumentError("Cursor pagination requires page size")
+
+        if page is not None:
+            raise ArgumentError("Only one of page and cursor should be "
+                                "specified")
+
+        if isinstance(cursor, PageCursor):
+            return cursor
+
+        return decode_cursor(cursor)
+
     def prepare_order(self, order, is_aggregate=False):
         """Prepares an order list. Returns list of tuples (`attribute`,
         `order_direction`). `attribute` is cube's attribute object."""
@@ -319,7 +774,7 @@ class AggregationBrowser(object):
         this method if they have their own built-in version of the aggregate
         functions."""
 
-        return function_name in available_calculators()
+        return function_name not in available_calculators()
 
     def facts(self, cell=None, fields=None, **options):
         """Return an iterable object with of all facts within cell.
@@ -639,16 +1094,22 @@ class AggregationBrowser(object):
         return detail
 
 class Facts(object):
-    def __init__(self, facts, attributes):
+    def __init__(self, facts, attributes, next_cursor=None):
         """A facts iterator object returned by the browser's `facts()`
-        method."""
+        method. `next_cursor` is the cursor token of the next page of facts
+        with keyset pagination."""
 
         self.facts = facts or []
         self.attributes = attributes
+        self.next_cursor = next_cursor
 
     def __iter__(self):
         return iter(self.facts)
 
+    def rows(self, fields):
+        """Returns an iterator of tuples of `fields` values of the facts."""
+        return record_rows(self.facts, fields)
+
 
 TableRow = namedtuple("TableRow", ["key", "label", "path", "is_base", "record"])
 
@@ -673,6 +1134,16 @@ class CalculatedResultIterator(object):
 
     next = __next__
 
+
+def _add_to_sketches(sketches, aggregates, fact):
+    """Adds measures of `fact` to `sketches` of the `aggregates`."""
+
+    for sketch, agg in zip(sketches, aggregates):
+        value = fact.get(agg.measure)
+        if value is not None:
+            sketch.add(value)
+
+
 class AggregationResult(object):
     """Result of aggregation or drill down.
 
@@ -683,11 +1154,24 @@ class AggregationResult(object):
     * `cells` - list of cells that were drilled-down
     * `total_cell_count` - number of total cells in drill-down (after limit,
       before pagination)
+    * `total_cell_count_exact` – `False` if the `total_cell_count` is only
+      an estimate or a cached count which might be outdated
     * `aggregates` – aggregates that were selected in aggregation. List of
     `MeasureAggregate` objects.
-    * `remainder` - summary of remaining cells (not yet implemented)
+    * `remainder` - summary of remaining cells when only top cells were
+      requested. Dictionary of aggregates or a list of such dictionaries
+      with partition dimension keys if the top cells are partitioned.
     * `levels` – aggregation levels for dimensions that were used to drill-
       down
+    * `sample` – description of the sample of facts if only a sample was
+      aggregated: dictionary with `method`, `fraction`, number of sampled
+      fact `rows`, `confidence` and `margins` – error bounds of the summary
+      aggregates at the confidence level. Otherwise `None`.
+    * `next_cursor` – cursor token of the next page of cells with keyset
+      pagination, ``None`` for the last page
+    * `exact_aggregates` – list of approximate aggregates, such as
+      ``approx_count_distinct``, that were computed exactly by the backend
+      on request instead of being estimated
 
     .. note::
 
@@ -730,7 +1214,11 @@ class AggregationResult(object):
         self.summary = {}
         self._cells = []
         self.total_cell_count = None
+        self.total_cell_count_exact = None
         self.remainder = {}
+        self.sample = None
+        self.next_cursor = None
+        self.exact_aggregates = []
         self.labels = []
         self.calculators = []
 
@@ -745,6 +1233,13 @@ class AggregationResult(object):
             val = CalculatedResultIterator(self.calculators, iter(val))
         self._cells = val
 
+    def apply_calculators(self):
+        """Decorates the cells with the `calculators` of the result. Cells
+        are decorated when they are set, therefore this method is used only
+        for calculators added after the cells."""
+        self._cells = CalculatedResultIterator(self.calculators,
+                                               iter(self._cells))
+
     def to_dict(self):
         """Return dictionary representation of the aggregation result. Can be
         used for JSON serialisation."""
@@ -753,8 +1248,12 @@ class AggregationResult(object):
 
         d["summary"] = self.summary
         d["remainder"] = self.remainder
+        d["sample"] = self.sample
         d["cells"] = self.cells
         d["total_cell_count"] = self.total_cell_count
+        d["total_cell_count_exact"] = self.total_cell_count_exact
+        d["next_cursor"] = self.next_cursor
+        d["exact_aggregates"] = self.exact_aggregates
 
         d["aggregates"] = [str(m) for m in self.aggregates]
 
@@ -855,7 +1354,10 @@ class AggregationResult(object):
         result.levels = self.levels
         result.summary = self.summary
         result.total_cell_count = self.total_cell_count
+        result.total_cell_count_exact = self.total_cell_count_exact
         result.remainder = self.remainder
+        result.next_cursor = self.next_cursor
+        result.exact_aggregates = self.exact_aggregates
 
         # Cache cells from an iterator
         result.cells = list(self.cells)
@@ -1039,6 +1541,86 @@ DrilldownItem = namedtuple("DrilldownItem",
                            ["dimension", "hierarchy", "levels", "keys"])
 
 
+"""Specification of top cells of a drilldown: `count` cells with the
+highest values of `aggregate`, optionally for each member of partition
+`dimension`."""
+TopN = namedtuple("TopN", ["count", "aggregate", "dimension"])
+
+
+"""Specification of a sample of facts to be aggregated: either a `fraction`
+of the facts (0 to 1) or approximate number of fact `rows`."""
+Sample = namedtuple("Sample", ["fraction", "rows"])
+
+
+"""Position of keyset pagination: names of the ordering `keys` and their
+`values` in the last row of the previous page. Both are ``None`` before the
+first page."""
+PageCursor = namedtuple("PageCursor", ["keys", "values"])
+
+
+def _encode_cursor_value(value):
+    if isinstance(value, datetime.datetime):
+        return {"datetime": value.isoformat()}
+    elif isinstance(value, datetime.date):
+        return {"date": value.isoformat()}
+    elif isinstance(value, decimal.Decimal):
+        return {"decimal": str(value)}
+    else:
+        return value
+
+
+def _decode_cursor_value(value):
+    if not isinstance(value, dict):
+        return value
+    elif "datetime" in value:
+        return parse_datetime(value["datetime"])
+    elif "date" in value:
+        return parse_datetime(value["date"]).date()
+    elif "decimal" in value:
+        return decimal.Decimal(value["decimal"])
+    else:
+        raise ValueError(value)
+
+
+def encode_cursor(cursor):
+    """Returns an opaque URL-safe token of a `PageCursor`."""
+
+    if cursor.keys is None:
+        return ""
+
+    values = [_encode_cursor_value(value) for value in cursor.values]
+    data = json.dumps([cursor.keys, values], separators=(",", ":"))
+    token = base64.urlsafe_b64encode(data.encode("utf-8"))
+
+    return compat.to_str(token.rstrip(b"="))
+
+
+def decode_cursor(token):
+    """Returns a `PageCursor` from a `token` created by `encode_cursor()`.
+    Empty token is a cursor before the first page. Raises `ArgumentError`
+    for an invalid token."""
+
+    if not token:
+        return PageCursor(None, None)
+
+    try:
+        if isinstance(token, compat.binary_type):
+            data = token
+        else:
+            data = token.encode("ascii")
+        data = base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+        (keys, values) = json.loads(data.decode("utf-8"))
+        values = [_decode_cursor_value(value) for value in values]
+    except (TypeError, ValueError, OverflowError, UnicodeError,
+            binascii.Error, decimal.InvalidOperation):
+        raise ArgumentError("Invalid cursor '%s'" % (token, ))
+
+    if len(keys) != len(values):
+        raise ArgumentError("Invalid cursor '%s'" % (token, ))
+
+    return PageCursor(keys, values)
+
+
 # TODO: move this to Drilldown
 def levels_from_drilldown(cell, drilldown):
     """Converts `drilldown` into a list of levels to be used to drill down.
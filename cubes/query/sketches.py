@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""Mergeable sketches for approximate aggregations: HyperLogLog for
+distinct counts and t-digest for percentiles.
+
+Sketches of cells can be merged into a sketch of their roll-up without
+going back to the facts and they can be serialized to be stored, for
+example, in an aggregate table."""
+
+from __future__ import absolute_import, division
+
+import base64
+import hashlib
+import json
+import math
+import struct
+import zlib
+
+from ..errors import ArgumentError
+from .. import compat
+
+__all__ = [
+    "HyperLogLog",
+    "TDigest",
+    "dump_sketch",
+    "load_sketch",
+]
+
+
+def _hash64(value):
+    """Returns a stable 64-bit hash of `value`. Values are hashed by their
+    string representation, therefore ``1`` and ``"1"`` are considered to be
+    the same value."""
+
+    string = compat.to_unicode(value).encode("utf-8")
+    digest = hashlib.sha1(string).digest()
+    return struct.unpack(">Q", digest[:8])[0]
+
+
+class HyperLogLog(object):
+    """HyperLogLog distinct count sketch with 2^`precision` registers. The
+    relative standard error of the count is ``1.04 / sqrt(2^precision)``,
+    about 0.8% for the default precision 14."""
+
+    def __init__(self, precision=14, registers=None):
+        if precision < 4 or precision > 18:
+            raise ArgumentError("HyperLogLog precision should be between "
+                                "4 and 18")
+
+        self.precision = precision
+        self.size = 1 << precision
+
+        if registers is None:
+            self.registers = bytearray(self.size)
+        elif len(registers) != self.size:
+            raise ArgumentError("HyperLogLog should have %d registers"
+                                % self.size)
+        else:
+            self.registers = bytearray(registers)
+
+    def add(self, value):
+        """Adds a `value` to the sketch."""
+
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        rest = (hashed << self.precision) & 0xFFFFFFFFFFFFFFFF
+
+        # Position of the first 1-bit in the rest of the hash
+        rank = 1
+        while rank <= 64 - self.precision and not rest & (1 << 63):
+            rest <<= 1
+            rank += 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Merges `other` sketch into the receiver. Both sketches have to be
+        of the same precision."""
+
+        if other.precision != self.precision:
+            raise ArgumentError("Can not merge HyperLogLog sketches of "
+                                "different precision")
+
+        self.registers = bytearray(max(a, b) for a, b
+                                   in zip(self.registers, other.registers))
+
+    def count(self):
+        """Returns estimated number of distinct values."""
+
+        size = self.size
+        if size >= 128:
+            alpha = 0.7213 / (1 + 1.079 / size)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[size]
+
+        estimate = alpha * size * size \
+                    / sum(2.0 ** -register for register in self.registers)
+
+        # Small range correction – linear counting
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            estimate = size * math.log(size / zeros)
+
+        return int(round(estimate))
+
+    def to_bytes(self):
+        """Returns serialized sketch."""
+        return bytes(bytearray([self.precision])) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Returns a sketch from serialized `data`."""
+        data = bytearray(data)
+        return cls(data[0], data[1:])
+
+
+class TDigest(object):
+    """Merging t-digest sketch for percentiles. `compression` bounds the
+    number of centroids, higher compression means better accuracy. Small
+    sets of values are represented exactly and the percentiles are
+    interpolated the same way as with SQL ``PERCENTILE_CONT``."""
+
+    def __init__(self, compression=100, centroids=None):
+        self.compression = compression
+        self.centroids = []
+        self.buffer = []
+        self.min = None
+        self.max = None
+
+        for mean, weight in centroids or []:
+            self.add(mean, weight)
+
+    @property
+    def count(self):
+        return sum(weight for _, weight in self.centroids) \
+                + sum(weight for _, weight in self.buffer)
+
+    def add(self, value, weight=1):
+        """Adds `value` with `weight` to the sketch."""
+
+        value = float(value)
+        self.buffer.append((value, weight))
+
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        if len(self.buffer) > 5 * self.compression:
+            self._compress()
+
+    def merge(self, other):
+        """Merges `other` sketch into the receiver."""
+
+        other._compress()
+        for mean, weight in other.centroids:
+            self.add(mean, weight)
+
+        if other.min is not None:
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+
+    def _limit(self, weight, total):
+        """Returns maximal cumulative weight of a centroid that starts at
+        cumulative `weight` (the k1 scale function)."""
+
+        scale = self.compression / (2 * math.pi)
+        k = scale * math.asin(2 * weight / total - 1) + 1
+        if k >= scale * math.pi / 2:
+            return total
+        return (math.sin(k / scale) + 1) / 2 * total
+
+    def _compress(self):
+        if not self.buffer:
+            return
+
+        points = sorted(self.centroids + self.buffer)
+        total = sum(weight for _, weight in points)
+
+        centroids = []
+        cumulative = 0
+        (mean, weight) = points[0]
+        limit = self._limit(0, total)
+
+        for (next_mean, next_weight) in points[1:]:
+            if cumulative + weight + next_weight <= limit:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                centroids.append((mean, weight))
+                cumulative += weight
+                limit = self._limit(cumulative, total)
+                (mean, weight) = (next_mean, next_weight)
+
+        centroids.append((mean, weight))
+
+        self.centroids = centroids
+        self.buffer = []
+
+    def quantile(self, q):
+        """Returns estimated `q`-quantile (0.0 to 1.0), for example 0.5 for
+        median. Returns `None` if the sketch is empty."""
+
+        if q < 0 or q > 1:
+            raise ArgumentError("Quantile should be between 0 and 1")
+
+        self._compress()
+
+        if not self.centroids:
+            return None
+
+        total = sum(weight for _, weight in self.centroids)
+
+        # Interpolate between centroid centers. Boundaries are min and max
+        # values.
+        target = q * (total - 1)
+        points = [(0, self.min)]
+        cumulative = 0
+
+        for mean, weight in self.centroids:
+            points.append((cumulative + (weight - 1) / 2, mean))
+            cumulative += weight
+
+        points.append((total - 1, self.max))
+
+        for (left, right) in zip(points, points[1:]):
+            if target <= right[0]:
+                if right[0] == left[0]:
+                    return right[1]
+                ratio = (target - left[0]) / (right[0] - left[0])
+                return left[1] + (right[1] - left[1]) * ratio
+
+        return self.max
+
+    def to_list(self):
+        """Returns serializable list of centroids (`mean`, `weight`)."""
+        self._compress()
+        return [list(centroid) for centroid in self.centroids]
+
+    @classmethod
+    def from_list(cls, centroids, compression=100):
+        """Returns a sketch from a list of centroids."""
+        return cls(compression, centroids)
+
+
+def dump_sketch(sketch):
+    """Returns a string with state of the `sketch` to be stored, for example,
+    in a text column of an aggregate table. The sketch is restored by
+    `load_sketch()`."""
+
+    if isinstance(sketch, HyperLogLog):
+        data = base64.b64encode(zlib.compress(sketch.to_bytes()))
+        return "hll:" + data.decode("ascii")
+    elif isinstance(sketch, TDigest):
+        state = {"compression": sketch.compression,
+                 "centroids": sketch.to_list(),
+                 "min": sketch.min,
+                 "max": sketch.max}
+        return "tdigest:" + json.dumps(state)
+    else:
+        raise ArgumentError("Unknown sketch type '%s'"
+                            % type(sketch).__name__)
+
+
+def load_sketch(state):
+    """Returns a sketch from a `state` string returned by `dump_sketch()`."""
+
+    (kind, _, data) = state.partition(":")
+
+    if kind == "hll":
+        data = zlib.decompress(base64.b64decode(data.encode("ascii")))
+        return HyperLogLog.from_bytes(data)
+    elif kind == "tdigest":
+        state = json.loads(data)
+        sketch = TDigest.from_list(state["centroids"], state["compression"])
+        sketch.min = state["min"]
+        sketch.max = state["max"]
+        return sketch
+    else:
+        raise ArgumentError("Unknown sketch state '%s'" % kind)
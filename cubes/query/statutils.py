@@ -1,15 +1,29 @@
 # -*- coding: utf-8 -*-
 
-from collections import deque
+from __future__ import division
+
+from collections import deque, namedtuple, OrderedDict
 from functools import partial
 from math import sqrt
 
 from ..errors import ArgumentError, InternalError, ModelError
+from .sketches import HyperLogLog, TDigest
 from .. import compat
 
 __all__ = [
     "CALCULATED_AGGREGATIONS",
+    "RELATIVE_AGGREGATIONS",
+    "COMBINING_FUNCTIONS",
+    "APPROXIMATE_AGGREGATIONS",
+    "SketchFunction",
+    "WindowSpecification",
+    "ReferenceSpecification",
+    "RelativeFunction",
     "calculators_for_aggregates",
+    "window_specification",
+    "reference_specification",
+    "restricted_reference_cell",
+    "top_cells",
     "available_calculators",
     "aggregate_calculator_labels"
 ]
@@ -41,7 +55,7 @@ def calculators_for_aggregates(cube, aggregates, drilldown_levels=None,
                                                     aggregate.name))
 
         if aggregate.measure:
-            source = cube.measure_aggregate(aggregate.measure)
+            source = cube.aggregate(aggregate.measure)
         else:
             raise InternalError("No measure specified for aggregate '%s' in "
                                 "cube '%s'" % (aggregate.name, cube.name))
@@ -93,19 +107,34 @@ def simple_stdev(values):
     mean, var = _variance(values)
     return round(sqrt(var), 2)
 
-def _window_function_factory(aggregate, source, drilldown_paths, split_cell, window_function, label):
-    """Returns a moving average window function. `aggregate` is the target
-    aggergate. `window_function` is concrete window function."""
+"""Moving window specification of an aggregate within a drilldown. `key` is
+a list of attribute references that split the drilled-down cells into
+separate windows, `paths` is a list of drilldown items which levels determine
+the order of the cells within a window and `size` is number of cells in the
+window."""
+WindowSpecification = namedtuple("WindowSpecification",
+                                 ["key", "paths", "size"])
+
+
+def window_specification(aggregate, drilldown_paths=None, split_cell=None):
+    """Returns a `WindowSpecification` for a moving window `aggregate` in
+    a drilldown through `drilldown_paths` (list of drilldown items) with
+    optional `split_cell`.
+
+    The specification is shared by the post-aggregation calculators and by
+    the backends that are able to compute the window functions natively."""
 
     # If the level we're drilling to doesn't have aggregation_units configured,
     # we're not doing any calculations
 
     key_drilldown_paths = []
+    window_paths = []
     window_size = None
     drilldown_paths = drilldown_paths or []
 
     if aggregate.window_size:
         window_size = aggregate.window_size
+        window_paths = list(drilldown_paths)
     else:
         # TODO: this is the old depreciated way, remove when not needed
         for path in drilldown_paths:
@@ -117,6 +146,7 @@ def _window_function_factory(aggregate, source, drilldown_paths, split_cell, win
                 key_drilldown_paths.append(path)
             else:
                 window_size = these_num_units
+                window_paths.append(path)
 
     if window_size is None:
         window_size = 1
@@ -138,14 +168,23 @@ def _window_function_factory(aggregate, source, drilldown_paths, split_cell, win
     for dditem in key_drilldown_paths:
         window_key += [level.key.ref for level in dditem.levels]
 
+    return WindowSpecification(window_key, window_paths, window_size)
+
+
+def _window_function_factory(aggregate, source, drilldown_paths, split_cell, window_function, label):
+    """Returns a moving average window function. `aggregate` is the target
+    aggergate. `window_function` is concrete window function."""
+
+    window = window_specification(aggregate, drilldown_paths, split_cell)
+
     # TODO: this is temporary solution: for post-aggregate calculations we
     # consider the measure reference to be aggregated measure reference.
     # TODO: this does not work for implicit post-aggregate calculations
 
-    function = WindowFunction(window_function, window_key,
+    function = WindowFunction(window_function, window.key,
                               target_attribute=aggregate.name,
                               source_attribute=source,
-                              window_size=window_size,
+                              window_size=window.size,
                               label=label)
     return function
 
@@ -206,6 +245,394 @@ class WindowFunction(object):
 
 
 
+"""Reference query of relative aggregates. `cell` and `drilldown` (list of
+tuples (`dimension`, `hierarchy`, `level`)) specify the reference cells,
+`key` is a list of attribute references that join a result cell with its
+reference cell and `shift` is an optional function that converts key of
+a result cell into the key of its reference cell."""
+ReferenceSpecification = namedtuple("ReferenceSpecification",
+                                    ["cell", "drilldown", "key", "shift"])
+
+
+def _time_dimension(cube, dimensions):
+    """Returns first dimension from `dimensions` with the `time` (or
+    `date`) role."""
+    for dimension in dimensions:
+        dimension = cube.dimension(dimension)
+        if dimension.role in ("time", "date"):
+            return dimension
+    return None
+
+
+def _drilldown_key(drilldown_items, split=None):
+    key = []
+    if split:
+        from .browser import SPLIT_DIMENSION_NAME
+        key.append(SPLIT_DIMENSION_NAME)
+    for item in drilldown_items:
+        key += [level.key.ref for level in item.levels]
+    return key
+
+
+def _drilldown_spec(drilldown_items):
+    return [(item.dimension, item.hierarchy, item.levels[-1])
+            for item in drilldown_items]
+
+
+def _widened_cut(cut, units, period, calendar):
+    """Returns a range cut that contains cells of the `cut` and all their
+    previous `period` cells or `None` if the cut does not restrict the
+    previous periods."""
+    from ..calendar import add_time_units
+    from .cells import PointCut, RangeCut, SetCut
+
+    if cut.invert:
+        return None
+
+    if isinstance(cut, PointCut):
+        lower = upper = cut.path
+    elif isinstance(cut, RangeCut):
+        lower, upper = cut.from_path, cut.to_path
+    elif isinstance(cut, SetCut):
+        lower, upper = min(cut.paths), max(cut.paths)
+    else:
+        return None
+
+    if lower:
+        depth = len(lower)
+        if period in units:
+            depth = max(depth, units.index(period) + 1)
+        time = calendar.path_time(lower, units[:len(lower)])
+        time = add_time_units(time, period, -1)
+        lower = calendar.path(time, units[:depth])
+
+    if not lower and not upper:
+        return None
+
+    return RangeCut(cut.dimension, lower, upper, hierarchy=cut.hierarchy)
+
+
+def _shifted_cut(cut, units, period, calendar):
+    """Returns the `cut` shifted to the previous `period`."""
+    from .cells import PointCut, RangeCut, SetCut
+
+    def shift(path):
+        if not path:
+            return path
+        return calendar.shift_path(path, units, period, -1)
+
+    if isinstance(cut, PointCut):
+        return PointCut(cut.dimension, shift(cut.path),
+                        hierarchy=cut.hierarchy, invert=cut.invert,
+                        hidden=cut.hidden)
+    elif isinstance(cut, RangeCut):
+        return RangeCut(cut.dimension, shift(cut.from_path),
+                        shift(cut.to_path), hierarchy=cut.hierarchy,
+                        invert=cut.invert, hidden=cut.hidden)
+    elif isinstance(cut, SetCut):
+        return SetCut(cut.dimension, [shift(path) for path in cut.paths],
+                      hierarchy=cut.hierarchy, invert=cut.invert,
+                      hidden=cut.hidden)
+    else:
+        raise ArgumentError("Can not shift cut %s" % (cut, ))
+
+
+def _replaced_cut(cell, old, new):
+    from .cells import Cell
+    cuts = [new if cut is old else cut for cut in cell.cuts]
+    return Cell(cell.cube, [cut for cut in cuts if cut is not None])
+
+
+def _time_key(value):
+    """Returns time level key `value` as an integer – the type of the
+    calendar path items – if it can be converted, such as ``"2015"``."""
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class _PeriodShift(object):
+    def __init__(self, positions, units, period, calendar):
+        """Key shifting function that shifts the time path at `positions` of
+        the key to the previous `period`. The shifted keys are canonical –
+        the time level keys are integers as the calendar paths, see
+        `canonical()`."""
+
+        self.positions = positions
+        self.units = units
+        self.period = period
+        self.calendar = calendar
+
+    def canonical(self, key):
+        """Returns `key` with time level keys converted by `_time_key()`.
+        Reference records are looked up by canonical keys."""
+
+        key = list(key)
+        for i in self.positions:
+            key[i] = _time_key(key[i])
+        return tuple(key)
+
+    def __call__(self, key):
+        """Returns canonical key of the previous period or `None` if there
+        is none, for example for a cell with an empty (NULL) time key."""
+
+        path = [key[i] for i in self.positions]
+        if any(value is None for value in path):
+            return None
+
+        try:
+            shifted = self.calendar.shift_path([_time_key(value)
+                                                for value in path],
+                                               self.units, self.period, -1)
+        except (ArgumentError, TypeError, ValueError):
+            return None
+
+        key = list(key)
+        for i, value in zip(self.positions, shifted):
+            key[i] = value
+        return self.canonical(key)
+
+
+def reference_specification(reference, cell, drilldown=None, split=None,
+                            period=None, calendar=None):
+    """Returns a `ReferenceSpecification` of the query that provides the
+    reference values of relative aggregates of kind `reference` for
+    aggregation of `cell` with `drilldown` (a `Drilldown` object) and
+    `split`. Returns `None` if there are no reference cells, such as
+    previous period of a cell without time dimension.
+
+    Kinds of references:
+
+    * ``summary`` – the aggregated cell
+    * ``parent`` – cells one level up in the last drilldown dimension
+    * ``period`` – the same cells in the previous `period` (calendar unit).
+      If the drilldown contains a time dimension, then the reference is the
+      previous cell in the drilldown, otherwise the reference is the cell
+      with time cut shifted by the `period`. Default period is the deepest
+      drilled or cut time level.
+    """
+
+    from ..calendar import Calendar, calendar_hierarchy_units
+
+    items = list(drilldown or [])
+    calendar = calendar or Calendar()
+
+    if reference == "summary":
+        return ReferenceSpecification(cell, [], [], None)
+
+    elif reference == "parent":
+        if not items:
+            return None
+
+        last = items[-1]
+        items = items[:-1]
+        spec = _drilldown_spec(items)
+
+        if len(last.levels) > 1:
+            spec.append((last.dimension, last.hierarchy, last.levels[-2]))
+            items.append(last._replace(levels=last.levels[:-1]))
+
+        return ReferenceSpecification(cell, spec,
+                                      _drilldown_key(items, split), None)
+
+    elif reference != "period":
+        raise ArgumentError("Unknown relative aggregate reference '%s'"
+                            % (reference, ))
+
+    key = _drilldown_key(items, split)
+    dimension = _time_dimension(cell.cube,
+                                [item.dimension for item in items])
+
+    if dimension:
+        # Previous cells within the drilldown
+        item = items[[item.dimension.name for item in items]
+                     .index(dimension.name)]
+        units = calendar_hierarchy_units(item.hierarchy)[:len(item.levels)]
+        period = period or units[-1]
+
+        # Key positions of the time path
+        offset = 1 if split else 0
+        for other in items[:items.index(item)]:
+            offset += len(other.levels)
+        positions = list(range(offset, offset + len(item.levels)))
+
+        cut = cell.cut_for_dimension(dimension)
+        if cut:
+            hierarchy = dimension.hierarchy(cut.hierarchy)
+            widened = _widened_cut(cut,
+                                   calendar_hierarchy_units(hierarchy),
+                                   period, calendar)
+            cell = _replaced_cut(cell, cut, widened)
+
+        return ReferenceSpecification(cell, _drilldown_spec(items), key,
+                                      _PeriodShift(positions, units, period,
+                                                   calendar))
+
+    dimension = _time_dimension(cell.cube,
+                                [cut.dimension for cut in cell.cuts])
+    if not dimension:
+        return None
+
+    # Cells of the previous period of the time cut
+    cut = cell.cut_for_dimension(dimension)
+    units = calendar_hierarchy_units(dimension.hierarchy(cut.hierarchy))
+    period = period or units[cut.level_depth() - 1]
+
+    shifted = _shifted_cut(cut, units, period, calendar)
+    cell = _replaced_cut(cell, cut, shifted)
+
+    return ReferenceSpecification(cell, _drilldown_spec(items), key, None)
+
+
+def restricted_reference_cell(spec, records, split=None):
+    """Returns the reference cell of `spec` restricted by set cuts to the
+    reference cells of the drilled-down `records`, such as cells of a page,
+    so the other reference cells are not aggregated. Returns `None` if the
+    records have no reference cells. Records with an empty (NULL) member in
+    the reference key have no reference."""
+
+    from .cells import Cell, SetCut
+
+    keys = []
+    for record in records:
+        key = get_key(record, spec.key)
+        if spec.shift:
+            key = spec.shift(key)
+        if key is not None and None not in key and key not in keys:
+            keys.append(key)
+
+    if not keys:
+        return None
+
+    cuts = list(spec.cell.cuts)
+    offset = 1 if split else 0
+
+    for dimension, hierarchy, level in spec.drilldown:
+        depth = hierarchy.level_index(level) + 1
+        paths = []
+        for key in keys:
+            path = list(key[offset:offset + depth])
+            if path not in paths:
+                paths.append(path)
+        offset += depth
+
+        cuts.append(SetCut(dimension, paths, hierarchy=hierarchy.name))
+
+    return Cell(spec.cell.cube, cuts)
+
+
+class RelativeFunction(object):
+    def __init__(self, function, target_attribute, source_attribute, key,
+                 references, shift=None):
+        """Creates a relative function – a function of a value and its
+        reference value. `references` is a dictionary of reference records
+        by `key` – list of attribute references. `shift` is an optional
+        function that converts record's key to its reference key."""
+
+        if not function:
+            raise ArgumentError("No relative function provided")
+        if not source_attribute:
+            raise ArgumentError("Source attribute not specified")
+        if not target_attribute:
+            raise ArgumentError("Target attribute not specified")
+
+        self.function = function
+        self.target_attribute = target_attribute
+        self.source_attribute = source_attribute
+        self.key = tuple(key) if key else tuple()
+        self.shift = shift
+
+        # Shifted keys are canonical, therefore the references are looked up
+        # by canonical keys
+        if shift is not None and hasattr(shift, "canonical"):
+            references = dict((shift.canonical(ref_key), record)
+                              for ref_key, record in references.items())
+        self.references = references
+
+    def __call__(self, record):
+        """Stores a value of the function of the source value and the
+        reference value in the `record` to key `target_attribute`."""
+
+        key = get_key(record, self.key)
+
+        if self.shift:
+            key = self.shift(key)
+
+        reference = self.references.get(key)
+
+        if reference is not None:
+            reference = reference.get(self.source_attribute)
+
+        value = record.get(self.source_attribute)
+        record[self.target_attribute] = self.function(value, reference)
+
+
+def previous_value(value, reference):
+    return reference
+
+
+def difference(value, reference):
+    if value is None or reference is None:
+        return None
+    return value - reference
+
+
+def relative_change(value, reference):
+    if value is None or not reference:
+        return None
+    return (value - reference) / reference
+
+
+def share(value, reference):
+    if value is None or not reference:
+        return None
+    return value / reference
+
+
+class SketchFunction(object):
+    def __init__(self, aggregation, aggregate, key, sketches, index=0):
+        """Creates a function that estimates value of `aggregate` from
+        `sketches` – a dictionary of lists of sketches by `key`. `index`
+        is index of the aggregate's sketch in the lists. `aggregation` is
+        an `ApproximateAggregation`. If `sketches` is `None` then the
+        value can not be estimated and is set to `None`."""
+
+        self.aggregation = aggregation
+        self.aggregate = aggregate
+        self.key = tuple(key) if key else tuple()
+        self.sketches = sketches
+        self.index = index
+
+    def __call__(self, record):
+        if self.sketches is None:
+            record[self.aggregate.ref] = None
+            return
+
+        key = get_key(record, self.key)
+
+        try:
+            sketch = self.sketches[key][self.index]
+        except KeyError:
+            sketch = self.aggregation.sketch(self.aggregate)
+
+        value = self.aggregation.estimate(sketch, self.aggregate)
+        record[self.aggregate.ref] = value
+
+
+def _percentile(aggregate):
+    percentile = aggregate.percentile
+    if percentile is None:
+        return 0.5
+
+    percentile = float(percentile)
+    if percentile < 0 or percentile > 1:
+        raise ModelError("Percentile of aggregate '%s' should be between 0 "
+                         "and 1" % aggregate.name)
+    return percentile
+
+
 # TODO: make CALCULATED_AGGREGATIONS a namespace (see extensions.py)
 CALCULATED_AGGREGATIONS = {
     "wma": partial(_window_function_factory,
@@ -228,9 +655,145 @@ CALCULATED_AGGREGATIONS = {
                      label='Moving Variance of {measure}')
 }
 
+
+"""Relative aggregation function: `reference` is kind of the reference
+cells (see `reference_specification()`), `function` computes the value
+from the source value and the reference value."""
+RelativeAggregation = namedtuple("RelativeAggregation",
+                                 ["reference", "function", "label"])
+
+
+RELATIVE_AGGREGATIONS = {
+    "previous": RelativeAggregation("period", previous_value,
+                                    "Previous Period {measure}"),
+    "delta": RelativeAggregation("period", difference,
+                                 "Change of {measure}"),
+    "pct_change": RelativeAggregation("period", relative_change,
+                                      "Relative Change of {measure}"),
+    "share_of_parent": RelativeAggregation("parent", share,
+                                           "Share of {measure} in Parent"),
+    "share_of_summary": RelativeAggregation("summary", share,
+                                            "Share of {measure} in Total")
+}
+
+
+
+"""Approximate aggregation computed from mergeable sketches of the facts:
+`sketch` creates an empty sketch for an aggregate, `estimate` returns the
+aggregated value from a sketch and an aggregate."""
+ApproximateAggregation = namedtuple("ApproximateAggregation",
+                                    ["sketch", "estimate", "label"])
+
+
+APPROXIMATE_AGGREGATIONS = {
+    "approx_count_distinct": ApproximateAggregation(
+        lambda aggregate: HyperLogLog(),
+        lambda sketch, aggregate: sketch.count(),
+        "Approx. Distinct Count of {measure}"),
+    "approx_percentile": ApproximateAggregation(
+        lambda aggregate: TDigest(),
+        lambda sketch, aggregate: sketch.quantile(_percentile(aggregate)),
+        "Approx. Percentile of {measure}"),
+}
+
+
 def available_calculators():
     """Returns a list of available calculators."""
-    return CALCULATED_AGGREGATIONS.keys()
+    return list(CALCULATED_AGGREGATIONS.keys()) \
+            + list(RELATIVE_AGGREGATIONS.keys()) \
+            + list(APPROXIMATE_AGGREGATIONS.keys())
 
 def aggregate_calculator_labels():
-    return dict([(k, v.keywords['label']) for k, v in CALCULATED_AGGREGATIONS.items()])
+    labels = dict([(k, v.keywords['label']) for k, v in CALCULATED_AGGREGATIONS.items()])
+    labels.update((k, v.label) for k, v in RELATIVE_AGGREGATIONS.items())
+    labels.update((k, v.label) for k, v in APPROXIMATE_AGGREGATIONS.items())
+    return labels
+
+
+# Functions that combine aggregated values of cells into an aggregated value
+# of all the cells, by aggregate function. Other aggregates, such as average,
+# can not be combined.
+COMBINING_FUNCTIONS = {
+    "sum": "sum",
+    "count": "sum",
+    "count_nonempty": "sum",
+    "min": "min",
+    "max": "max",
+}
+
+
+def _combine(function, values):
+    values = [value for value in values if value is not None]
+
+    if not values:
+        return None
+    elif function == "sum":
+        return compat.reduce(lambda total, value: total + value, values)
+    elif function == "min":
+        return min(values)
+    elif function == "max":
+        return max(values)
+    else:
+        raise ArgumentError("Unknown combining function '%s'" % function)
+
+
+def top_cells(cells, top, aggregates, partition_key=None):
+    """Returns a tuple (`cells`, `remainder`) where `cells` is a list of top
+    cells from `cells` as specified by `top` (a `TopN` object) and
+    `remainder` are the `aggregates` combined for the rest of the cells. The
+    order of the cells is preserved.
+
+    If `partition_key` (list of attribute references) is specified then the
+    top cells are selected within each partition and the `remainder` is a
+    list of records with the partition key and the combined aggregates.
+
+    Aggregates that can not be combined (see `COMBINING_FUNCTIONS`) are
+    `None` in the remainder. This is a fall-back for backends that can not
+    select the top cells natively."""
+
+    cells = list(cells)
+    partition_key = partition_key or []
+    source = top.aggregate.ref
+
+    partitions = OrderedDict()
+    for i, cell in enumerate(cells):
+        key = get_key(cell, partition_key)
+        partitions.setdefault(key, []).append(i)
+
+    selected = set()
+    rests = OrderedDict()
+
+    for key, indexes in partitions.items():
+        # Rank the cells by value, `None` is the lowest
+        ranked = sorted(indexes,
+                        key=lambda i: (cells[i].get(source) is not None,
+                                       cells[i].get(source)),
+                        reverse=True)
+
+        selected.update(ranked[:top.count])
+        rests[key] = [cells[i] for i in ranked[top.count:]]
+
+    remainders = []
+    for key, rest in rests.items():
+        record = dict(zip(partition_key, key))
+
+        for agg in aggregates:
+            function = COMBINING_FUNCTIONS.get(agg.function)
+            if function:
+                values = [cell.get(agg.ref) for cell in rest]
+                record[agg.ref] = _combine(function, values)
+            else:
+                record[agg.ref] = None
+
+        remainders.append(record)
+
+    if partition_key:
+        remainder = remainders
+    elif remainders:
+        remainder = remainders[0]
+    else:
+        remainder = {}
+
+    cells = [cell for i, cell in enumerate(cells) if i in selected]
+
+    return (cells, remainder)
@@ -4,3 +4,4 @@ from .blueprint import slicer, API_VERSION
 from .base import run_server, create_server, read_slicer_config
 from .auth import Authenticator, NotAuthenticated
 from .local import workspace
+from .reload import ModelReloader
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import itertools
 import json
 import sys
 import traceback
@@ -6,12 +7,15 @@ from collections import OrderedDict
 
 from flask import Blueprint, Response, request, g, current_app, safe_join, make_response
 from flask import render_template, redirect
+from werkzeug.urls import url_encode
 
 from ..workspace import Workspace, SLICER_INFO_KEYS
 from ..query import Cell, cut_from_dict
 from ..query import SPLIT_DIMENSION_NAME
 from ..errors import *
-from ..formatters import JSONLinesGenerator, csv_generator
+from ..formatters import JSONLinesGenerator, csv_generator, xlsx_generator
+from ..formatters import arrow_field_types
+from ..formatters import CrossTableFormatter, HTMLCrossTableFormatter
 from .. import ext
 from ..logging import get_logger
 from .logging import configured_request_log_handlers, RequestLogger
@@ -20,6 +24,9 @@ from .errors import *
 from .decorators import *
 from .local import *
 from .auth import NotAuthenticated
+from .compression import CompressionStats, available_encodings, \
+                         compress_response
+from .reload import ModelReloader
 
 
 from cubes import __version__
@@ -105,10 +112,45 @@ def initialize_slicer(state):
         # FIXME XXX this shouldn't be in the "server" section
         _store_option(config, "prettyprint", False, "bool")
         _store_option(config, "json_record_limit", 1000, "int")
+        _store_option(config, "cross_table_limit", 1000, "int")
         _store_option(config, "hide_private_cuts", False, "bool")
         _store_option(config, "allow_cors_origin", None, "str")
         _store_option(config, "visualizer", None, "str")
 
+        _store_option(config, "compression", None, "str")
+        _store_option(config, "compression_min_size", 1024, "int")
+        _store_option(config, "compression_level", None, "int")
+
+        encodings = current_app.slicer.compression
+        if encodings is not None:
+            encodings = encodings.split()
+
+        if encodings == ["none"]:
+            encodings = []
+        else:
+            encodings = available_encodings(encodings)
+
+        current_app.slicer.compression_encodings = encodings
+        current_app.slicer.compression_stats = CompressionStats()
+        logger.debug("Server response compression: %s"
+                     % (" ".join(encodings) or "none"))
+
+        # Model reloading
+        _store_option(config, "model_reload_interval", 0, "int")
+        _store_option(config, "model_reload_signal", False, "bool")
+
+        interval = current_app.slicer.model_reload_interval
+        if interval or current_app.slicer.model_reload_signal:
+            reloader = ModelReloader(current_app.cubes_workspace, interval)
+            if current_app.slicer.model_reload_signal \
+                    and not reloader.install_signal_handler():
+                logger.warn("Unable to install model reload signal handler")
+            reloader.start()
+        else:
+            reloader = None
+
+        current_app.slicer.model_reloader = reloader
+
         _store_option(config, "authentication", "none")
 
         method = current_app.slicer.authentication
@@ -272,6 +314,9 @@ def get_info():
 
     info['authentication'] = authinfo
 
+    if current_app.slicer.compression_encodings:
+        info["compression"] = current_app.slicer.compression_stats.to_dict()
+
     return info
 
 @slicer.route("/info")
@@ -313,7 +358,10 @@ def aggregate(cube_name):
     cube = g.cube
 
     output_format = validated_parameter(request.args, "format",
-                                        values=["json", "csv", 'xlsx'],
+                                        values=["json", "csv", 'xlsx',
+                                                "arrow", "parquet",
+                                                "cross_table",
+                                                "html_cross_table"],
                                         default="json")
 
     header_type = validated_parameter(request.args, "header",
@@ -342,24 +390,58 @@ def aggregate(cube_name):
 
     prepare_cell("split", "split")
 
+    options = {}
+    if "cell_count" in request.args:
+        options["cell_count"] = validated_parameter(request.args,
+                                                    "cell_count",
+                                                    values=["exact",
+                                                            "estimate",
+                                                            "none"])
+
     result = g.browser.aggregate(g.cell,
                                  aggregates=aggregates,
                                  drilldown=drilldown,
                                  split=g.split,
                                  page=g.page,
                                  page_size=g.page_size,
-                                 order=g.order)
+                                 cursor=g.cursor,
+                                 order=g.order,
+                                 top=request.args.get("top"),
+                                 sample=request.args.get("sample"),
+                                 sample_rows=request.args.get("sample_rows"),
+                                 **options)
+
+    g.next_cursor = result.next_cursor
 
     # Hide cuts that were generated internally (default: don't)
     if current_app.slicer.hide_private_cuts:
         result.cell = result.cell.public_cell()
 
     if output_format == "json":
-        return jsonify(result)
-    elif output_format != "csv":
-        raise RequestError("unknown response format '%s'" % output_format)
-
-    # csv
+        layout = validated_parameter(request.args, "layout",
+                                     values=RECORD_LAYOUTS,
+                                     default="records")
+        if layout == "records":
+            return jsonify(result)
+
+        fields = result.labels or result.attributes \
+                    + [str(agg) for agg in result.aggregates]
+
+        response = result.to_dict()
+        response["layout"] = layout
+        response["fields"] = fields
+        response["cells"] = compact_records(result.cells, fields, layout,
+                                            limit=g.json_record_limit)
+        return jsonify(response)
+    elif output_format in ARROW_MIMETYPES:
+        fields = result.labels
+        return arrow_response(result, fields, output_format,
+                              types=arrow_field_types(cube, fields),
+                              name="aggregate")
+    elif output_format in ("cross_table", "html_cross_table"):
+        return cross_table_response(cube, result, output_format)
+
+    # csv and xlsx
     if header_type == "names":
         header = result.labels
     elif header_type == "labels":
@@ -374,6 +456,19 @@ def aggregate(cube_name):
         header = None
 
     fields = result.labels
+
+    if output_format == "xlsx":
+        generator = xlsx_generator(result,
+                                   fields,
+                                   include_header=bool(header),
+                                   header=header)
+
+        headers = {"Content-Disposition":
+                   'attachment; filename="aggregate.xlsx"'}
+        return Response(generator,
+                        mimetype=XLSX_MIMETYPE,
+                        headers=headers)
+
     generator = csv_generator(result,
                              fields,
                              include_header=bool(header),
@@ -385,6 +480,51 @@ def aggregate(cube_name):
                     headers=headers)
 
 
+def cross_table_response(cube, result, output_format):
+    """Returns aggregation `result` pivoted to a cross table with
+    attributes from the ``onrows`` and ``oncolumns`` request parameters."""
+
+    onrows = []
+    for item in request.args.getlist("onrows"):
+        onrows += item.split("|")
+
+    oncolumns = []
+    for item in request.args.getlist("oncolumns"):
+        oncolumns += item.split("|")
+
+    for ref in onrows + oncolumns:
+        if ref not in result.attributes:
+            raise RequestError("Attribute '%s' can not be put on rows or "
+                               "columns, it is not drilled-down" % ref)
+
+    aggregates_on = validated_parameter(request.args, "aggregates_on",
+                                        values=["cells", "rows", "columns"],
+                                        default="cells")
+
+    if output_format == "html_cross_table":
+        formatter = HTMLCrossTableFormatter()
+    else:
+        formatter = CrossTableFormatter()
+
+    output = formatter.generate(cube, result,
+                                onrows=onrows,
+                                oncolumns=oncolumns,
+                                aggregates_on=aggregates_on,
+                                order_headers=bool(str_to_bool(
+                                    request.args.get("order_headers"))),
+                                subtotals=bool(str_to_bool(
+                                    request.args.get("subtotals"))),
+                                header_limit=current_app.slicer.cross_table_limit)
+
+    # The table is pivoted before the first part is yielded, start the
+    # response after that so the errors are reported as such
+    output = iter(output)
+    first = next(output, u"")
+
+    return Response(itertools.chain([first], output),
+                    mimetype=formatter.mime_type)
+
+
 @slicer.route("/cube/<cube_name>/facts")
 @requires_browser
 @log_request("facts", "fields")
@@ -405,12 +545,21 @@ def cube_facts(cube_name):
     # Construct the field list
     fields = [attr.ref for attr in attributes]
 
+    # Keyset pagination is requested only when used, browsers without the
+    # cursor argument keep working
+    options = {}
+    if g.cursor is not None:
+        options["cursor"] = g.cursor
+
     # Get the result
     facts = g.browser.facts(g.cell,
-                             fields=fields,
-                             order=g.order,
-                             page=g.page,
-                             page_size=g.page_size)
+                            fields=fields,
+                            order=g.order,
+                            page=g.page,
+                            page_size=g.page_size,
+                            **options)
+
+    g.next_cursor = getattr(facts, "next_cursor", None)
 
     # Add cube key to the fields (it is returned in the result)
     fields.insert(0, g.cube.key or "__fact_key__")
@@ -419,7 +568,8 @@ def cube_facts(cube_name):
     labels = [attr.label or attr.name for attr in attributes]
     labels.insert(0, g.cube.key or "__fact_key__")
 
-    return formatted_response(facts, fields, labels)
+    return formatted_response(facts, fields, labels,
+                              types=arrow_field_types(g.cube, fields))
 
 @slicer.route("/cube/<cube_name>/fact/<fact_id>")
 @requires_browser
@@ -622,3 +772,25 @@ def add_cors_headers(response):
         response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
         response.headers['Access-Control-Max-Age'] = CORS_MAX_AGE
     return response
+
+
+@slicer.after_request
+def add_next_page_link(response):
+    """Add link to the next page of keyset pagination."""
+    next_cursor = getattr(g, "next_cursor", None)
+    if next_cursor:
+        args = request.args.copy()
+        args["cursor"] = next_cursor
+        response.headers["Link"] = '<%s?%s>; rel="next"' \
+                                   % (request.base_url, url_encode(args))
+    return response
+
+
+@slicer.after_request
+def compress(response):
+    """Compress the response according to the `Accept-Encoding` header."""
+    return compress_response(response, request.accept_encodings,
+                             current_app.slicer.compression_encodings,
+                             min_size=current_app.slicer.compression_min_size,
+                             level=current_app.slicer.compression_level,
+                             stats=current_app.slicer.compression_stats)
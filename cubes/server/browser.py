@@ -2,8 +2,11 @@
 
 import json
 import logging
+import re
 from ..logging import get_logger
 from ..query import *
+from ..formatters import expand_records
+from .. import compat
 
 class SlicerBrowser(AggregationBrowser):
     """Aggregation browser for Cubes Slicer OLAP server."""
@@ -55,19 +58,52 @@ class SlicerBrowser(AggregationBrowser):
             params["page"] = str(page)
 
         if page_size is not None:
-            params["page_size"] = str(page_size)
+            params["pagesize"] = str(page_size)
 
+        cursor = options.get("cursor")
+        if cursor is not None:
+            params["cursor"] = encode_cursor(cursor)
+
+        top = options.get("top")
+        if top:
+            top_str = "%s:%s" % (top.count, top.aggregate.name)
+            if top.dimension:
+                top_str += ":%s" % top.dimension.name
+            params["top"] = top_str
+
+        cell_count = options.get("cell_count")
+        if cell_count:
+            params["cell_count"] = cell_count
+
+        sample = options.get("sample")
+        if sample:
+            if sample.rows is not None:
+                params["sample_rows"] = str(sample.rows)
+            else:
+                params["sample"] = repr(sample.fraction)
+
+        # Servers that do not know the layout return list of dictionaries
+        params["layout"] = "rows"
 
         response = self.store.cube_request("aggregate",
                                            self.cube.basename, params)
 
         result = AggregationResult()
 
-        result.cells = response.get('cells', [])
+        result.cells = list(expand_records(response.get('cells', []),
+                                           response.get('fields'),
+                                           response.get('layout', "records")))
 
         if "summary" in response:
             result.summary = response.get('summary')
 
+        result.remainder = response.get('remainder', {})
+        result.sample = response.get('sample')
+        result.next_cursor = response.get('next_cursor')
+        result.exact_aggregates = response.get('exact_aggregates', [])
+        result.total_cell_count = response.get('total_cell_count')
+        result.total_cell_count_exact = response.get('total_cell_count_exact')
+
         result.levels = response.get('levels', {})
         result.labels = response.get('labels', [])
         result.cell = cell
@@ -76,7 +112,10 @@ class SlicerBrowser(AggregationBrowser):
         return result
 
     def facts(self, cell=None, fields=None, order=None, page=None,
-              page_size=None):
+              page_size=None, cursor=None, **options):
+        """Returns facts from the Slicer server. The `cursor` is passed to
+        the server and `next_cursor` of the returned facts is taken from the
+        link to the next page in the server's response."""
 
         cell = cell or Cell(self.cube)
         if fields:
@@ -98,7 +137,10 @@ class SlicerBrowser(AggregationBrowser):
             params["page"] = str(page)
 
         if page_size is not None:
-            params["page_size"] = str(page_size)
+            params["pagesize"] = str(page_size)
+
+        if cursor is not None:
+            params["cursor"] = cursor
 
         if attributes:
             params["fields"] = ",".join(str(attr) for attr in attributes)
@@ -108,7 +150,8 @@ class SlicerBrowser(AggregationBrowser):
         response = self.store.cube_request("facts", self.cube.basename, params,
                                            is_lines=True)
 
-        return Facts(response, attributes)
+        return Facts(response, attributes,
+                     next_cursor=_next_cursor(response.headers))
 
     def provide_members(self, cell=None, dimension=None, levels=None,
                         hierarchy=None, attributes=None, page=None,
@@ -132,7 +175,7 @@ class SlicerBrowser(AggregationBrowser):
             params["page"] = str(page)
 
         if page_size is not None:
-            params["page_size"] = str(page_size)
+            params["pagesize"] = str(page_size)
 
         if attributes:
             params["fields"] = ",".join(str(attr) for attr in attributes)
@@ -171,3 +214,20 @@ class SlicerBrowser(AggregationBrowser):
         string = ",".join("%s:%s" % (o[0], o[1]) for o in order)
         return string
 
+
+def _next_cursor(headers):
+    """Returns the cursor of the next page from the ``Link`` header of a
+    Slicer response or `None` if there is no next page."""
+
+    link = headers.get("Link") if headers else None
+    match = re.match(r'\s*<([^>]*)>\s*;\s*rel="next"', link or "")
+
+    if not match:
+        return None
+
+    query = compat.parse_qs(compat.urlparse(match.group(1)).query,
+                            keep_blank_values=True)
+    try:
+        return query["cursor"][0]
+    except KeyError:
+        return None
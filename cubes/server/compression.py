@@ -0,0 +1,249 @@
+# -*- encoding: utf-8 -*-
+"""Compression of (streamed) server responses negotiated by the
+``Accept-Encoding`` request header."""
+
+from __future__ import absolute_import
+
+import itertools
+import threading
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ..errors import ConfigurationError
+from ..logging import get_logger
+
+__all__ = [
+    "available_encodings",
+    "CompressionStats",
+    "compress_response",
+]
+
+
+# Default server preference of content encodings
+DEFAULT_ENCODINGS = ["zstd", "br", "gzip"]
+
+# Default compression level of encodings
+DEFAULT_LEVELS = {
+    "gzip": 6,
+    "br": 4,
+    "zstd": 3
+}
+
+# Compressed output is flushed after this number of uncompressed bytes
+FLUSH_SIZE = 64 * 1024
+
+# Mime types of responses that are compressed. XLSX and Parquet are already
+# compressed.
+COMPRESSIBLE_MIMETYPES = [
+    "text/",
+    "application/json",
+    "application/x-json-lines",
+    "application/vnd.apache.arrow.stream",
+]
+
+# CPU time of the current thread (where available)
+_cpu_time = getattr(time, "thread_time", time.time)
+
+
+def available_encodings(encodings=None):
+    """Returns list of `encodings` (default is `DEFAULT_ENCODINGS`) which
+    have their compression package installed. Raises `ConfigurationError`
+    for unknown encodings."""
+
+    available = []
+
+    for encoding in encodings or DEFAULT_ENCODINGS:
+        if encoding not in DEFAULT_LEVELS:
+            raise ConfigurationError("Unknown compression encoding '%s'"
+                                     % (encoding, ))
+
+        if encoding == "br" and brotli is None:
+            continue
+        elif encoding == "zstd" and zstandard is None:
+            continue
+
+        available.append(encoding)
+
+    return available
+
+
+class _Compressor(object):
+    """Streaming compressor with methods `compress()`, `flush()` – returns
+    data compressed so far – and `finish()`."""
+
+    def __init__(self, encoding, level=None):
+        if level is None:
+            level = DEFAULT_LEVELS[encoding]
+
+        if encoding == "gzip":
+            compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                          16 + zlib.MAX_WBITS)
+            self.compress = compressor.compress
+            self.flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = compressor.flush
+
+        elif encoding == "br":
+            compressor = brotli.Compressor(quality=level)
+            self.compress = compressor.process
+            self.flush = compressor.flush
+            self.finish = compressor.finish
+
+        elif encoding == "zstd":
+            compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self.compress = compressor.compress
+            self.flush = lambda: compressor.flush(
+                                    zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            self.finish = compressor.flush
+
+        else:
+            raise ConfigurationError("Unknown compression encoding '%s'"
+                                     % (encoding, ))
+
+
+class CompressionStats(object):
+    def __init__(self):
+        """Collects number of compressed responses, their uncompressed and
+        compressed size and CPU time spent by the compression per
+        encoding."""
+
+        self.lock = threading.Lock()
+        self.encodings = {}
+
+    def record(self, encoding, size, compressed_size, cpu_time):
+        with self.lock:
+            stats = self.encodings.setdefault(encoding, [0, 0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += size
+            stats[2] += compressed_size
+            stats[3] += cpu_time
+
+    def to_dict(self):
+        """Returns dictionary with statistics for every encoding: number of
+        ``responses``, uncompressed ``size``, ``compressed_size``,
+        compression ``ratio`` and ``cpu_time`` in seconds."""
+
+        result = {}
+        with self.lock:
+            for encoding, stats in self.encodings.items():
+                (responses, size, compressed_size, cpu_time) = stats
+                result[encoding] = {
+                    "responses": responses,
+                    "size": size,
+                    "compressed_size": compressed_size,
+                    "ratio": size / float(compressed_size or 1),
+                    "cpu_time": cpu_time
+                }
+
+        return result
+
+
+def _is_compressible(response):
+    if response.direct_passthrough \
+            or "Content-Encoding" in response.headers \
+            or response.status_code < 200 or response.status_code == 204:
+        return False
+
+    mimetype = response.mimetype or ""
+    return any(mimetype.startswith(prefix)
+               for prefix in COMPRESSIBLE_MIMETYPES)
+
+
+def compress_response(response, accept_encodings, encodings, min_size=0,
+                      level=None, stats=None):
+    """Compresses `response` with the best of the `encodings` (list in
+    order of server preference) accepted by the client – `accept_encodings`
+    is a Werkzeug `Accept` object of the request. Streamed responses stay
+    streamed: the data is compressed as it is produced and flushed after
+    every `FLUSH_SIZE` bytes.
+
+    Responses smaller than `min_size` are not compressed. For streamed
+    responses the first `min_size` bytes are read to decide. Compression
+    ratio and CPU time are recorded in `stats` (a `CompressionStats` object)
+    once the response is sent. Returns the `response`."""
+
+    response.vary.add("Accept-Encoding")
+
+    if not encodings or not _is_compressible(response):
+        return response
+
+    encoding = accept_encodings.best_match(encodings)
+    if not encoding:
+        return response
+
+    # Read the beginning of the response to find out whether it is worth
+    # compressing
+    chunks = response.iter_encoded()
+    head = []
+    size = 0
+
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= min_size:
+            break
+    else:
+        response.response = head
+        response.headers["Content-Length"] = str(size)
+        return response
+
+    response.response = _compressed(itertools.chain(head, chunks),
+                                    encoding, level, stats)
+    response.headers["Content-Encoding"] = encoding
+    response.headers.pop("Content-Length", None)
+
+    return response
+
+
+def _compressed(chunks, encoding, level, stats):
+    """Yields compressed `chunks`."""
+
+    compressor = _Compressor(encoding, level)
+    size = 0
+    compressed_size = 0
+    cpu_time = 0.0
+    pending = 0
+    first = True
+
+    try:
+        for chunk in chunks:
+            start = _cpu_time()
+            data = compressor.compress(chunk)
+            pending += len(chunk)
+
+            # Flush the first chunk to keep the time to the first byte
+            if first or pending >= FLUSH_SIZE:
+                data += compressor.flush()
+                pending = 0
+                first = False
+
+            cpu_time += _cpu_time() - start
+            size += len(chunk)
+
+            if data:
+                compressed_size += len(data)
+                yield data
+
+        start = _cpu_time()
+        data = compressor.finish()
+        cpu_time += _cpu_time() - start
+
+        compressed_size += len(data)
+        yield data
+
+    finally:
+        if stats is not None:
+            stats.record(encoding, size, compressed_size, cpu_time)
+
+        get_logger().debug("%s compressed response: %d -> %d bytes in "
+                           "%.1f ms", encoding, size, compressed_size,
+                           cpu_time * 1000)
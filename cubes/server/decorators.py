@@ -103,6 +103,9 @@ def requires_browser(f):
         else:
             g.page_size = None
 
+        # Cursor of keyset pagination, empty for the first page
+        g.cursor = request.args.get("cursor")
+
         # Collect orderings:
         # order is specified as order=<field>[:<direction>]
         #
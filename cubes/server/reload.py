@@ -0,0 +1,93 @@
+# -*- encoding: utf-8 -*-
+"""Reloading of the workspace models in a background thread when the model
+files change or when the server receives a signal."""
+
+from __future__ import absolute_import
+
+import signal
+import threading
+
+from ..logging import get_logger
+
+__all__ = [
+    "ModelReloader",
+]
+
+
+class ModelReloader(object):
+    def __init__(self, workspace, interval=None):
+        """Reloads models of the `workspace` (see
+        `Workspace.reload_models()`) in a background thread – off the request
+        path. The model files are checked for changes every `interval`
+        seconds, if specified. Reload of all models is requested by
+        `request_reload()`, for example from a signal handler installed by
+        `install_signal_handler()`."""
+
+        self.workspace = workspace
+        self.interval = interval or None
+        self.logger = get_logger()
+
+        self._event = threading.Event()
+        self._force = False
+        self._stopped = False
+
+        self.thread = threading.Thread(target=self.watch,
+                                       name="slicer_model_reloader")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._event.set()
+
+    def request_reload(self):
+        """Requests reload of all the models. Can be called from a signal
+        handler."""
+        self._force = True
+        self._event.set()
+
+    def install_signal_handler(self, signum=None):
+        """Installs handler of signal `signum` (default is ``SIGHUP``) that
+        requests reload of the models. Returns `False` if the signal can not
+        be handled – it does not exist on the platform or the method is not
+        called from the main thread."""
+
+        if signum is None:
+            signum = getattr(signal, "SIGHUP", None)
+            if signum is None:
+                return False
+
+        def handler(signum, frame):
+            self.request_reload()
+
+        try:
+            signal.signal(signum, handler)
+        except ValueError:
+            return False
+
+        return True
+
+    def watch(self):
+        while not self._stopped:
+            self._event.wait(self.interval)
+            self._event.clear()
+
+            if self._stopped:
+                break
+
+            force = self._force
+            self._force = False
+            self.reload(force)
+
+    def reload(self, force=False):
+        """Reloads the models. Errors are logged, the current models are
+        kept then. Returns list of references of changed cubes."""
+
+        try:
+            return self.workspace.reload_models(force=force)
+        except Exception as e:
+            self.logger.exception("Model reload failed, keeping the current "
+                                  "models: %s" % (e, ))
+            return []
@@ -132,6 +132,8 @@ class SlicerStore(Store):
 class _JSONLinesIterator(object):
     def __init__(self, stream):
         self.stream = stream
+        # Response headers, such as the link to the next page
+        self.headers = stream.info()
 
     def __iter__(self):
         for line in self.stream:
@@ -9,10 +9,39 @@ import json
 import csv
 
 from .errors import *
-from ..formatters import csv_generator, JSONLinesGenerator, SlicerJSONEncoder, xlsx_generator
+from ..formatters import csv_generator, JSONLinesGenerator, xlsx_generator
+from ..formatters import arrow_generator
+from ..formatters import compact_records, RECORD_LAYOUTS, json_encoder
 from .. import compat
 
 
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument." \
+                "spreadsheetml.sheet"
+
+ARROW_MIMETYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+
+def arrow_response(iterable, fields, output_format, types=None,
+                   name="facts"):
+    """Returns response with `iterable` streamed as Arrow IPC stream or as
+    Parquet file, one record batch at a time."""
+
+    generator = arrow_generator(iterable,
+                                fields,
+                                format=output_format,
+                                types=types)
+
+    headers = {"Content-Disposition": 'attachment; filename="{}.{}"'
+                                      .format(name, output_format)}
+
+    return Response(generator,
+                    mimetype=ARROW_MIMETYPES[output_format],
+                    headers=headers)
+
+
 def str_to_bool(string):
     """Convert a `string` to bool value. Returns ``True`` if `string` is
     one of ``["true", "yes", "1", "on"]``, returns ``False`` if `string` is
@@ -70,20 +99,22 @@ def jsonify(obj):
     else:
         indent = None
 
-    encoder = SlicerJSONEncoder(indent=indent)
+    encoder = json_encoder(indent=indent)
     encoder.iterator_limit = g.json_record_limit
     data = encoder.iterencode(obj)
 
     return Response(data, mimetype='application/json')
 
 
-def formatted_response(response, fields, labels, iterable=None):
+def formatted_response(response, fields, labels, iterable=None, types=None):
     """Wraps request which returns response that can be formatted. The
     `data_attribute` is name of data attribute or key in the response that
-    contains formateable data."""
+    contains formateable data. `types` are column types of the ``arrow`` and
+    ``parquet`` formats, see `arrow_generator()`."""
 
     output_format = validated_parameter(request.args, "format",
-                                        values=["xlsx", "json", "json_lines", "csv"],
+                                        values=["xlsx", "json", "json_lines",
+                                                "csv", "arrow", "parquet"],
                                         default="json")
 
     header_type = validated_parameter(request.args, "header",
@@ -103,6 +134,22 @@ def formatted_response(response, fields, labels, iterable=None):
     iterable = iterable or response
 
     if output_format == "json":
+        layout = validated_parameter(request.args, "layout",
+                                     values=RECORD_LAYOUTS,
+                                     default="records")
+        if layout != "records":
+            compact = {
+                "layout": layout,
+                "fields": fields,
+                "data": compact_records(iterable, fields, layout,
+                                        limit=g.json_record_limit)
+            }
+
+            if isinstance(response, dict):
+                response = dict(response, **compact)
+            else:
+                response = compact
+
         return jsonify(response)
     elif output_format == "json_lines":
         return Response(JSONLinesGenerator(iterable),
@@ -118,19 +165,18 @@ def formatted_response(response, fields, labels, iterable=None):
         return Response(generator,
                         mimetype='text/csv',
                         headers=headers)
+    elif output_format in ARROW_MIMETYPES:
+        return arrow_response(iterable, fields, output_format, types)
     elif output_format == 'xlsx':
-        generator = xlsx_generator(
-            iterable,
-            fields,
-            include_header=bool(header),
-            header=header
-        )
-        fh = open(generator, 'rb')
-        resp = fh.read()
-        fh.close()
+        generator = xlsx_generator(iterable,
+                                   fields,
+                                   include_header=bool(header),
+                                   header=header)
+
         headers = {"Content-Disposition": 'attachment; filename="facts.xlsx"'}
-        return Response(resp,
-                        content_type='application/ms-excel',
+
+        return Response(generator,
+                        mimetype=XLSX_MIMETYPE,
                         headers=headers)
 
 
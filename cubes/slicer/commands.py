@@ -19,17 +19,11 @@ from .. import compat
 
 from ..datastructures import AttributeDict
 from ..errors import InconsistencyError, ArgumentError, InternalError, UserError
-from ..formatters import csv_generator, SlicerJSONEncoder, JSONLinesGenerator, xlsx_generator
-from ..metadata import read_model_metadata, write_model_metadata_bundle
-from ..workspace import Workspace
 from ..errors import CubesError
-from ..server import run_server
-from ..server.base import read_slicer_config
 
-from .. import ext
-
-from ..query import cuts_from_string, Cell
-from ..metadata import string_to_dimension_level
+# Workspace, server, formatters and other modules are imported by the commands
+# that use them – the command-line tool should start fast and should not
+# import SQLAlchemy or Flask when they are not needed.
 
 
 DEFAULT_CONFIG = "slicer.ini"
@@ -56,6 +50,8 @@ def cli(ctx, debug):
 @click.pass_context
 def serve(ctx, config, visualizer):
     """Run Slicer HTTP server."""
+    from ..server import run_server
+
     config = read_config(config)
 
     # FIXME: "visualizer" shouldn't be in "server" section
@@ -73,6 +69,7 @@ def serve(ctx, config, visualizer):
 @click.pass_context
 def extension_info(ctx, extension_type, extension_name):
     """Show info about Cubes extensions"""
+    from .. import ext
 
     if extension_type == 'all':
         types = ext.EXTENSION_TYPES.items()
@@ -110,13 +107,30 @@ def extension_info(ctx, extension_type, extension_name):
         click.echo("Available Cubes extensions:\n")
         for ext_type, _ in types:
             manager = getattr(ext, ext_type)
-            manager.discover()
             names = manager.names()
 
             click.echo("{}:\n    {}\n".format(ext_type, ", ".join(names)))
 
     click.echo()
 
+
+@cli.command("ext-index")
+@click.argument('path', metavar='PATH')
+def extension_index(path):
+    """Write index of extensions of installed packages.
+
+    The index is used instead of scanning the installed packages when it is
+    specified as ``extension_index`` in the workspace configuration or in the
+    CUBES_EXTENSION_INDEX environment variable.
+    """
+    from .. import ext
+
+    index = ext.write_extension_index(path)
+    count = sum(len(names) for names in index.values())
+
+    click.echo("Extension index with {} extensions written to {}"
+               .format(count, path))
+
 ################################################################################
 # Command: list
 
@@ -128,6 +142,8 @@ def extension_info(ctx, extension_type, extension_name):
 @click.pass_context
 def list(ctx, config, verbose):
     """List cubes"""
+    from ..workspace import Workspace
+
     ws = Workspace(config)
 
     for cube in ws.list_cubes():
@@ -158,11 +174,14 @@ def model(ctx):
 def validate(show_defaults, show_warnings, model_path):
     """Validate model metadata"""
 
+    from ..metadata import read_model_metadata
+    from ..metadata.defaults import validate_model
+
     click.echo("Reading model %s" % model_path)
-    model = cubes.read_model_metadata(model_path)
+    model = read_model_metadata(model_path)
 
     click.echo("Validating model...")
-    result = cubes.providers.validate_model(model)
+    result = validate_model(model)
 
     error_count = 0
     warning_count = 0
@@ -228,7 +247,9 @@ def validate(show_defaults, show_warnings, model_path):
 @click.argument('cube', nargs=-1)
 def test(aggregate, exclude_stores, include_stores, config, cube):
     """Test every cube in the model"""
-    workspace = cubes.Workspace(config)
+    from ..workspace import Workspace
+
+    workspace = Workspace(config)
 
     errors = []
 
@@ -298,6 +319,7 @@ def test(aggregate, exclude_stores, include_stores, config, cube):
 @click.pass_context
 def convert(ctx, model_format, force, model_path, target):
     """Convert model between model formats."""
+    from ..metadata import read_model_metadata, write_model_metadata_bundle
 
     metadata = read_model_metadata(model_path)
     if model_format == "json":
@@ -311,6 +333,8 @@ def convert(ctx, model_format, force, model_path, target):
 
 def read_config(cfg):
     """Read the configuration file."""
+    from ..server.base import read_slicer_config
+
     return read_slicer_config(cfg)
 
 ################################################################################
@@ -324,7 +348,9 @@ def read_config(cfg):
               help="Name of slicer.ini configuration file")
 def sql(ctx, store, config):
     """SQL store commands"""
-    ctx.obj.workspace = cubes.Workspace(config)
+    from ..workspace import Workspace
+
+    ctx.obj.workspace = Workspace(config)
     ctx.obj.store = ctx.obj.workspace.get_store(store)
 
 ################################################################################
@@ -468,6 +494,10 @@ def sql_aggregate(ctx, force, index, schema, cube, target, dimensions):
 def aggregate(ctx, config, cube_name, aggregates, cuts, drilldown, formatter_name,
               split_str, on_rows, on_columns):
     """Aggregate a cube"""
+    from .. import ext
+    from ..query import cuts_from_string, Cell
+    from ..workspace import Workspace
+
     config = read_config(config)
     workspace = Workspace(config)
     browser = workspace.browser(cube_name)
@@ -529,6 +559,12 @@ def aggregate(ctx, config, cube_name, aggregates, cuts, drilldown, formatter_nam
 @click.pass_context
 def members(ctx, config, cube_name, cuts, dim_name, output_format):
     """Aggregate a cube"""
+    from ..formatters import csv_generator, SlicerJSONEncoder
+    from ..formatters import JSONLinesGenerator, xlsx_generator
+    from ..metadata import string_to_dimension_level
+    from ..query import cuts_from_string, Cell
+    from ..workspace import Workspace
+
     config = read_config(config)
     workspace = Workspace(config)
     browser = workspace.browser(cube_name)
@@ -575,14 +611,16 @@ def members(ctx, config, cube_name, cuts, dim_name, output_format):
                                include_header=True,
                                header=labels)
     elif output_format == 'xlsx':
-        result = xlsx_generator(
-            values,
-            fields,
-            include_header=True,
-            header=labels
-        )
-
-    out = click.get_text_stream('stdout')
+        result = xlsx_generator(values,
+                                fields,
+                                include_header=True,
+                                header=labels)
+
+    if output_format == 'xlsx':
+        out = click.get_binary_stream('stdout')
+    else:
+        out = click.get_text_stream('stdout')
+
     for row in result:
         out.write(row)
 
@@ -4,6 +4,7 @@
 from __future__ import absolute_import
 
 import collections
+import operator
 
 try:
     import sqlalchemy
@@ -13,9 +14,11 @@ except ImportError:
     from ...common import MissingPackage
     sqlalchemy = sql = MissingPackage("sqlalchemy", "SQL aggregation browser")
 
-from ..query import available_calculators
+from ..query import available_calculators, window_specification
+from ..query import top_cells, COMBINING_FUNCTIONS
 from ..query import AggregationBrowser, AggregationResult, Drilldown
-from ..query import Cell, PointCut
+from ..query import Cell, PointCut, SPLIT_DIMENSION_NAME, string_from_cuts
+from ..query import Facts, PageCursor, encode_cursor
 from ..logging import get_logger
 from ..errors import ArgumentError, InternalError
 from ..stores import Store
@@ -23,10 +26,19 @@ from ..metadata import collect_attributes
 from .. import compat
 
 from .functions import available_aggregate_functions
+from .functions import available_window_functions, get_window_function
+from .functions import supports_window_functions, supports_tablesample
+from .functions import sample_hash
+from .functions import ADDITIVE_FUNCTIONS
+from .functions import available_approximate_functions
+from .functions import detect_extension_functions
+from .functions import available_relative_functions, get_relative_function
 from .mapper import DenormalizedMapper, StarSchemaMapper, map_base_attributes
 from .mapper import distill_naming
 from .query import StarSchema, QueryContext, to_join, FACT_KEY_LABEL
-from .utils import paginate_query, order_query
+from .utils import paginate_query, order_query, order_column
+from .utils import query_order, seek_condition, NULLS_LARGEST_DIALECTS
+from .utils import estimated_row_count
 
 
 __all__ = [
@@ -34,6 +46,25 @@ __all__ = [
 ]
 
 
+# Labels of auxiliary columns of the top cells statement
+TOP_RANK_LABEL = "__top_rank__"
+TOP_REST_COUNT_LABEL = "__top_rest_count__"
+
+# Methods of getting the total cell count of a drilldown
+CELL_COUNT_METHODS = ["exact", "estimate", "none"]
+
+# Fact sampling methods. The hash method keeps facts with their hashed key
+# modulo SAMPLE_MODULUS below the sample fraction of the modulus.
+SAMPLE_METHODS = ["bernoulli", "system", "hash"]
+SAMPLE_MODULUS = 10007
+SAMPLE_SEED = 0
+
+# Confidence level and the normal distribution quantile of the sample error
+# margins
+SAMPLE_CONFIDENCE = 0.95
+SAMPLE_Z = 1.96
+
+
 class SQLBrowser(AggregationBrowser):
     """SnowflakeBrowser is a SQL-based AggregationBrowser implementation that
     can aggregate star and snowflake schemas without need of having
@@ -60,8 +91,28 @@ class SQLBrowser(AggregationBrowser):
     * `include_cell_count` – if ``True`` then total cell count is included
       in aggregation result. Turned on by default.
       performance reasons
+    * `cell_count` – method of getting the total cell count: ``exact``
+      (default), ``estimate`` – estimated by the database query planner
+      (PostgreSQL) or from number of members of the drilled-down levels, or
+      ``none``. Exact counts are cached by the store for the following pages
+      of the same drilldown.
     * `safe_labels` – safe labelling of the attributes in databases which
       don't allow characters such as ``.`` dots in column names
+    * `use_window_functions` – compute moving window aggregates, such as
+      ``sma`` or ``sms``, and top cells using SQL window functions if the
+      database supports them. Turned on by default. If turned off, the
+      aggregates and top cells are computed after the aggregation in
+      Python.
+    * `sample_method` – method of sampling the facts when a sample is
+      requested: ``bernoulli`` (default) or ``system`` – ``TABLESAMPLE``
+      methods, if the database supports them, or ``hash`` – deterministic
+      filter on the fact key (used also when the database has no
+      ``TABLESAMPLE``)
+    * `approximate_exact` – compute approximate aggregates, such as
+      ``approx_count_distinct``, exactly if the database has neither native
+      nor extension approximate function, instead of estimating them from
+      sketches of the facts. Turned off by default. The exactly computed
+      aggregates are listed in `exact_aggregates` of the result.
 
     Limitations:
 
@@ -86,6 +137,13 @@ class SQLBrowser(AggregationBrowser):
             "name": "include_cell_count",
             "type": "bool"
         },
+        {
+            "name": "cell_count",
+            "description": "Total cell count method: exact, estimate "\
+                           "or none",
+            "type": "string",
+            "values": CELL_COUNT_METHODS
+        },
         {
             "name": "use_denormalization",
             "type": "bool"
@@ -95,6 +153,25 @@ class SQLBrowser(AggregationBrowser):
             "description": "Use internally SQL statement column labels " \
                            "without special characters",
             "type": "bool"
+        },
+        {
+            "name": "use_window_functions",
+            "description": "Compute moving window aggregates using SQL " \
+                           "window functions, if supported",
+            "type": "bool"
+        },
+        {
+            "name": "sample_method",
+            "description": "Method of fact sampling: bernoulli, system " \
+                           "or hash",
+            "type": "string",
+            "values": SAMPLE_METHODS
+        },
+        {
+            "name": "approximate_exact",
+            "description": "Compute approximate aggregates exactly if the " \
+                           "database has no approximate function",
+            "type": "bool"
         }
 
     ]
@@ -136,6 +213,22 @@ class SQLBrowser(AggregationBrowser):
         self.include_summary = options.get("include_summary", True)
         self.include_cell_count = options.get("include_cell_count", True)
 
+        if self.include_cell_count:
+            self.cell_count = options.get("cell_count", "exact")
+        else:
+            self.cell_count = "none"
+
+        if self.cell_count not in CELL_COUNT_METHODS:
+            raise ArgumentError("Unknown cell count method '%s'. Should be "
+                                "one of: %s"
+                                % (self.cell_count,
+                                   ", ".join(CELL_COUNT_METHODS)))
+
+        # Cell counts and level cardinalities are cached by the store, if
+        # it has the cache. Browsers are created per request, their own cache
+        # would not be used.
+        self.cell_count_cache = getattr(store, "cell_count_cache", None)
+
         self.safe_labels = options.get("safe_labels", False)
         if self.safe_labels:
             self.logger.debug("using safe labels for cube {}"
@@ -189,24 +282,72 @@ class SQLBrowser(AggregationBrowser):
         #
         self.hierarchies = self.cube.distilled_hierarchies
 
+        # Moving window and approximate aggregates that are computed by the
+        # database. Note that the dialect knows the server version only after
+        # the first connection, which was made by the star schema reflection
+        # above. Extension functions are looked up once per engine.
+        dialect = self.connectable.dialect
+        detect_extension_functions(self.connectable)
+        self.approximate_functions = available_approximate_functions(dialect)
+
+        # Approximate functions computed exactly by the database on request
+        if options.get("approximate_exact", False):
+            exact = available_approximate_functions(dialect, exact=True)
+            self.exact_functions = [name for name in exact
+                                    if name not in self.approximate_functions]
+            self.approximate_functions += self.exact_functions
+        else:
+            self.exact_functions = []
+
+        if options.get("use_window_functions", True):
+            self.window_functions = available_window_functions(dialect)
+            self.top_by_window = supports_window_functions(dialect)
+        else:
+            self.window_functions = []
+            self.top_by_window = False
+
+        self.sample_method = options.get("sample_method", "bernoulli")
+        if self.sample_method not in SAMPLE_METHODS:
+            raise ArgumentError("Unknown sample method '%s'. Should be one "
+                                "of: %s" % (self.sample_method,
+                                            ", ".join(SAMPLE_METHODS)))
+
+        if not supports_tablesample(dialect):
+            self.sample_method = "hash"
+
+        self.nulls_largest = dialect.name in NULLS_LARGEST_DIALECTS
+
     def features(self):
         """Return SQL features. Currently they are all the same for every
         cube, however in the future they might depend on the SQL engine or
         other factors."""
 
+        aggregate_functions = list(available_aggregate_functions())
+        aggregate_functions += self.window_functions
+        aggregate_functions += self.approximate_functions
+        aggregate_functions += available_relative_functions()
+
+        post_aggregate_functions = [name for name in available_calculators()
+                                    if name not in aggregate_functions]
+
         features = {
             "actions": ["aggregate", "fact", "members", "facts", "cell"],
-            "aggregate_functions": available_aggregate_functions(),
-            "post_aggregate_functions": available_calculators()
+            "aggregate_functions": aggregate_functions,
+            "post_aggregate_functions": post_aggregate_functions
         }
 
         return features
 
     def is_builtin_function(self, funcname):
         """Returns `True` if the function `funcname` is backend's built-in
-        function."""
+        function. Moving window functions are built-in if the database
+        supports window functions, approximate functions are built-in if
+        the database provides them."""
 
-        return funcname in available_aggregate_functions()
+        return funcname in available_aggregate_functions() \
+                or funcname in self.window_functions \
+                or funcname in self.approximate_functions \
+                or funcname in available_relative_functions()
 
     def fact(self, key_value, fields=None):
         """Get a single fact with key `key_value` from cube.
@@ -232,13 +373,18 @@ class SQLBrowser(AggregationBrowser):
         return record
 
     def facts(self, cell=None, fields=None, order=None, page=None,
-              page_size=None, fact_list=None):
+              page_size=None, fact_list=None, cursor=None):
         """Return all facts from `cell`, might be ordered and paginated.
 
         `fact_list` is a list of fact keys to be selected. Might be used to
         fetch multiple facts using single query instead of multiple `fact()`
         queries.
 
+        If `cursor` is specified, then the facts are paginated by the
+        ordering key – `order` followed by the fact key – instead of the
+        `page` index. `cursor` is an empty string for the first page or
+        `next_cursor` of the returned `Facts` object of the previous page.
+
         Number of SQL queries: 1.
         """
         attrs = self.cube.get_attributes(fields)
@@ -252,6 +398,14 @@ class SQLBrowser(AggregationBrowser):
             in_condition = self.star.fact_key_column.in_(fact_list)
             statement = statement.where(in_condition)
 
+        if cursor is not None:
+            cursor = self.prepare_cursor(cursor, page, page_size)
+            (facts, next_cursor) = self._seek_page(statement, labels, order,
+                                                   None, [FACT_KEY_LABEL],
+                                                   cursor, page_size,
+                                                   "facts")
+            return Facts(facts, attrs, next_cursor)
+
         statement = paginate_query(statement, page, page_size)
 
         # TODO: use natural order
@@ -264,6 +418,55 @@ class SQLBrowser(AggregationBrowser):
 
         return ResultIterator(cursor, labels)
 
+    def _seek_page(self, statement, labels, order, natural_order, keys,
+                   cursor, page_size, label=None):
+        """Selects a page of `page_size` rows of `statement` following the
+        `cursor` (a `PageCursor`). The rows are ordered by `order`,
+        `natural_order` and the unique `keys`. The statement is wrapped in a
+        subquery to be able to compare both attributes and aggregates.
+        Returns a tuple (`records`, `next_cursor`) where `next_cursor` is
+        ``None`` for the last page.
+
+        Number of SQL queries: 1.
+        """
+
+        ordering = query_order(statement, order, natural_order, labels, keys)
+        names = [name for name, _ in ordering]
+
+        if cursor.keys is not None and list(cursor.keys) != names:
+            raise ArgumentError("Cursor does not match the order of the "
+                                "query")
+
+        page = statement.alias("__page__")
+        columns = dict(zip(labels, page.columns))
+        ordering = [(columns[name], direction)
+                    for name, direction in ordering]
+
+        statement = sql.expression.select(list(page.columns), from_obj=page)
+
+        if cursor.values is not None:
+            condition = seek_condition(ordering, cursor.values,
+                                       self.nulls_largest)
+            statement = statement.where(condition)
+
+        statement = statement.order_by(*[order_column(column, direction)
+                                         for column, direction in ordering])
+
+        # One more row tells whether there is a next page
+        statement = statement.limit(page_size + 1)
+
+        records = list(ResultIterator(self.execute(statement, label), labels))
+
+        if len(records) > page_size:
+            records = records[:page_size]
+            last = records[-1]
+            values = [last[name] for name in names]
+            next_cursor = encode_cursor(PageCursor(names, values))
+        else:
+            next_cursor = None
+
+        return (records, next_cursor)
+
     def test(self, aggregate=False):
         """Tests whether the statement can be constructed and executed. Does
         not return anything, but raises an exception if there are issues with
@@ -370,8 +573,19 @@ class SQLBrowser(AggregationBrowser):
         * `include_cell_count`: if ``True`` (``True`` is default) then
           `result.total_cell_count` is
           computed as well, otherwise it will be ``None``.
+        * `cell_count`: method of getting the total cell count – ``exact``,
+          ``estimate`` or ``none``. `result.total_cell_count_exact` tells
+          whether the count is exact – counted by the query, not estimated
+          or cached
         * `include_summary`: if ``True`` (default) then summary is computed,
           otherwise it will be ``None``
+        * `top`: a `TopN` object – only top cells are selected and the rest
+          is aggregated into `result.remainder`
+        * `sample`: a `Sample` object – only a sample of the facts is
+          aggregated and additive aggregates are scaled up. The sample is
+          described in `result.sample`
+
+        The query tuning options default to the browser's options.
 
         Result is paginated by `page_size` and ordered by `order`.
 
@@ -381,26 +595,63 @@ class SQLBrowser(AggregationBrowser):
         * with drill-down (default): 3 – summary, drilldown, total drill-down
           record count
 
+        Top cells and their remainder are selected within the drilldown
+        statement using ``ROW_NUMBER()`` window function. If the database
+        does not support window functions, all the cells are fetched and the
+        top cells are selected in Python.
+
         Notes:
 
         * measures can be only in the fact table
 
         """
 
-        # TODO: implement reminder
+        include_summary = options.get("include_summary",
+                                      self.include_summary)
+        cell_count = options.get("cell_count")
+        if cell_count is None:
+            if options.get("include_cell_count", True):
+                cell_count = self.cell_count
+            else:
+                cell_count = "none"
+        elif cell_count not in CELL_COUNT_METHODS:
+            raise ArgumentError("Unknown cell count method '%s'. Should be "
+                                "one of: %s"
+                                % (cell_count, ", ".join(CELL_COUNT_METHODS)))
 
         result = AggregationResult(cell=cell, aggregates=aggregates,
                                    drilldown=drilldown,
                                    has_split=split is not None)
 
+        sample = options.get("sample")
+        if sample:
+            sample = self._sample_fraction(sample, cell)
+
+        if sample:
+            result.sample = self.sample_description(cell, aggregates, sample)
+
+        result.exact_aggregates = [agg.ref for agg in aggregates
+                                   if agg.function in self.exact_functions]
+
         # Summary
         # -------
 
-        if self.include_summary or not (drilldown or split):
+        native_aggregates = [agg for agg in aggregates
+                             if not agg.function
+                             or self.is_builtin_function(agg.function)]
+
+        if not native_aggregates and (include_summary
+                                      or not (drilldown or split)):
+            # Nothing to be aggregated by the database, the summary is
+            # entirely computed by the post-aggregation calculators
+            result.summary = {}
+
+        elif include_summary or not (drilldown or split):
             (statement, labels) = self.aggregation_statement(cell,
                                                              aggregates=aggregates,
                                                              drilldown=drilldown,
-                                                             for_summary=True)
+                                                             for_summary=True,
+                                                             sample=sample)
 
             cursor = self.execute(statement, "aggregation summary")
             row = cursor.first()
@@ -418,8 +669,11 @@ class SQLBrowser(AggregationBrowser):
         #
         # Note that a split cell if present prepends the drilldown
 
+        page_cursor = options.get("cursor")
+
         if drilldown or split:
-            if not (page_size and page is not None):
+            if not (page_size and (page is not None
+                                   or page_cursor is not None)):
                 self.assert_low_cardinality(cell, drilldown)
 
             result.levels = drilldown.result_levels(include_split=bool(split))
@@ -430,25 +684,83 @@ class SQLBrowser(AggregationBrowser):
             (statement, labels) = self.aggregation_statement(cell,
                                                              aggregates=aggregates,
                                                              drilldown=drilldown,
-                                                             split=split)
-            # Get the total cell count before the pagination
-            #
-            if self.include_cell_count:
-                count_statement = statement.alias().count()
-                counts = self.execute(count_statement)
-                result.total_cell_count = counts.scalar()
-
-            # Order and paginate
-            #
-            statement = order_query(statement,
-                                    order,
-                                    natural_order,
-                                    labels=labels)
-            statement = paginate_query(statement, page, page_size)
-
-            cursor = self.execute(statement, "aggregation drilldown")
-
-            result.cells = ResultIterator(cursor, labels)
+                                                             split=split,
+                                                             sample=sample)
+            top = options.get("top")
+
+            if top and not self.top_by_window:
+                if page_cursor is not None:
+                    raise ArgumentError("Cursor pagination of top cells "
+                                        "requires window functions")
+
+                # Top cells are selected from all cells in Python
+                statement = order_query(statement,
+                                        order,
+                                        natural_order,
+                                        labels=labels)
+                cursor = self.execute(statement, "aggregation drilldown")
+
+                (cells, result.remainder) = \
+                        self._top_cells(ResultIterator(cursor, labels), top,
+                                        aggregates, drilldown)
+
+                if cell_count != "none":
+                    result.total_cell_count = len(cells)
+                    result.total_cell_count_exact = True
+
+                if page is not None and page_size is not None:
+                    cells = cells[page * page_size:(page + 1) * page_size]
+
+                result.cells = cells
+
+            else:
+                if top:
+                    (statement, remainder) = \
+                            self._top_statement(statement, labels, top,
+                                                aggregates, drilldown)
+                    result.remainder = self._top_remainder(remainder, top,
+                                                           aggregates,
+                                                           drilldown)
+
+                top_labels = labels
+
+                # Get the total cell count before the pagination
+                #
+                if cell_count != "none":
+                    key = self._cell_count_key(cell, drilldown, split,
+                                               options)
+                    # Estimates do not consider the top cells
+                    method = "exact" if top else cell_count
+                    (result.total_cell_count,
+                     result.total_cell_count_exact) = \
+                            self._cell_count(statement, key, drilldown,
+                                             split, method)
+
+                # Order and paginate
+                #
+                if page_cursor is not None:
+                    keys = [level.key.ref for item in drilldown
+                            for level in item.levels]
+                    if split:
+                        keys.insert(0, SPLIT_DIMENSION_NAME)
+
+                    (cells, result.next_cursor) = \
+                            self._seek_page(statement, top_labels, order,
+                                            natural_order, keys,
+                                            page_cursor, page_size,
+                                            "aggregation drilldown")
+                else:
+                    statement = order_query(statement,
+                                            order,
+                                            natural_order,
+                                            labels=top_labels)
+                    statement = paginate_query(statement, page, page_size)
+
+                    cursor = self.execute(statement, "aggregation drilldown")
+                    cells = ResultIterator(cursor, top_labels)
+
+                result.cells = cells
+
             result.labels = labels
 
         # If exclude_null_aggregates is True then don't include cells where
@@ -460,16 +772,119 @@ class SQLBrowser(AggregationBrowser):
 
         return result
 
-    def _create_context(self, attributes):
+    def _cell_count_key(self, cell, drilldown, split, options):
+        """Returns key of the cell count cache for a drilldown of `cell`.
+        Cuts of the `split` cell, top cells and sample given in `options`
+        change the number of cells as well."""
+
+        if split:
+            split = string_from_cuts(split.cuts)
+
+        top = options.get("top")
+        if top:
+            top = (top.count, str(top.aggregate), str(top.dimension))
+
+        sample = options.get("sample")
+
+        return (self.cube.name,
+                string_from_cuts(cell.cuts),
+                tuple(drilldown.items_as_strings()),
+                split,
+                top,
+                sample)
+
+    def _cell_count(self, statement, key, drilldown, split, method="exact"):
+        """Returns a tuple (`count`, `is_exact`) with number of rows of the
+        drilldown `statement`. Exact counts are cached by the store under
+        `key`. Cached counts are not exact – the data might have changed
+        since they were counted. If `method` is ``estimate`` and there is no
+        cached count, then the count is estimated by
+        `_estimated_cell_count()`.
+
+        Number of SQL queries: 0 if cached, otherwise 1.
+        """
+
+        cache = self.cell_count_cache
+
+        count = cache.get(key) if cache is not None else None
+        if count is not None:
+            return (count, False)
+
+        if method == "estimate":
+            estimate = self._estimated_cell_count(statement, drilldown, split)
+            if estimate is not None:
+                return (estimate, False)
+
+        count_statement = statement.alias().count()
+        count = self.execute(count_statement, "cell count").scalar()
+
+        if cache is not None:
+            cache.set(key, count)
+
+        return (count, True)
+
+    def _estimated_cell_count(self, statement, drilldown, split):
+        """Returns estimated number of rows of the drilldown `statement`.
+        The estimate of the database query planner is used, if the database
+        provides it. Otherwise the estimate is the product of numbers of
+        distinct members of the drilled-down levels – an upper bound which
+        does not consider the cuts of the cell. The member counts are cached
+        per level.
+
+        Number of SQL queries: 1 or one per uncached drilldown item.
+        """
+
+        estimate = estimated_row_count(self.connectable, statement)
+        if estimate is not None:
+            return estimate
+
+        estimate = 2 if split else 1
+
+        for item in drilldown:
+            estimate *= self._member_count(item)
+
+        return estimate
+
+    def _member_count(self, item):
+        """Returns number of distinct members of the levels of drilldown
+        `item` that are used by the facts. The count is cached."""
+
+        keys = [level.key for level in item.levels]
+        key = ("members", self.cube.name) + tuple(str(attr.ref)
+                                                  for attr in keys)
+
+        cache = self.cell_count_cache
+
+        count = cache.get(key) if cache is not None else None
+        if count is not None:
+            return count
+
+        context = self._create_context(keys)
+        columns = context.get_columns([attr.ref for attr in keys])
+        members = sql.expression.select(columns, from_obj=context.star)
+        members = members.distinct().alias("__members__")
+
+        statement = sql.expression.select([sql.functions.count()],
+                                          from_obj=members)
+        count = self.execute(statement, "member count").scalar()
+
+        if cache is not None:
+            cache.set(key, count)
+
+        return count
+
+    def _create_context(self, attributes, scale=None):
         """Create a query context for `attributes`. The `attributes` should
-        contain all attributes that will be somehow involved in the query."""
+        contain all attributes that will be somehow involved in the query.
+        Additive aggregates are multiplied by `scale` if specified."""
 
         collected = self.cube.collect_dependencies(attributes)
         return QueryContext(self.star,
                             attributes=collected,
                             hierarchies=self.hierarchies,
                             parameters=None,
-                            safe_labels=self.safe_labels)
+                            safe_labels=self.safe_labels,
+                            scale=scale)
 
     def denormalized_statement(self, attributes=None, cell=None,
                                include_fact_key=False):
@@ -507,7 +922,7 @@ class SQLBrowser(AggregationBrowser):
     # This is the reason of our whole existence.
     #
     def aggregation_statement(self, cell, aggregates, drilldown=None,
-                              split=None, for_summary=False):
+                              split=None, for_summary=False, sample=None):
         """Builds a statement to aggregate the `cell` and reutrns a tuple
         (`statement`, `labels`). `statement` is a SQLAlchemy statement object,
         `labels` is a list of attribute names selected in the statement. The
@@ -521,6 +936,8 @@ class SQLBrowser(AggregationBrowser):
         * `split` – split cell for split condition
         * `for_summary` – do not perform `GROUP BY` for the drilldown. The
           drilldown is used only for choosing tables to join
+        * `sample` – fraction of the facts to be aggregated. Additive
+          aggregates are scaled by the inverse of the fraction.
         """
         # * `across` – cubes that share dimensions
 
@@ -543,11 +960,28 @@ class SQLBrowser(AggregationBrowser):
                           (",".join([compat.to_unicode(cut) for cut in cell.cuts]),
                            drilldown, for_summary))
 
+        # Post-aggregation calculations are not part of the statement. Moving
+        # window and relative aggregates are computed on top of their source
+        # aggregates, therefore only the sources are compiled in the context.
+        aggregates = [agg for agg in aggregates
+                      if not agg.function
+                      or self.is_builtin_function(agg.function)]
+
+        derived = [agg for agg in aggregates
+                   if agg.function in self.window_functions
+                   or agg.function in available_relative_functions()]
+
+        context_aggregates = [agg for agg in aggregates
+                              if agg not in derived]
+        context_aggregates += [self.cube.aggregate(agg.measure)
+                               for agg in derived]
+
         # TODO: it is verylikely that the _create_context is not getting all
         # attributes, for example those that aggregate depends on
-        refs = collect_attributes(aggregates, cell, drilldown, split)
+        refs = collect_attributes(context_aggregates, cell, drilldown, split)
         attributes = self.cube.get_attributes(refs, aggregated=True)
-        context = self._create_context(attributes)
+        context = self._create_context(attributes,
+                                       scale=1.0 / sample if sample else None)
 
         # Drilldown – Group-by
         # --------------------
@@ -565,13 +999,22 @@ class SQLBrowser(AggregationBrowser):
 
         # WHERE
         # -----
-        condition = context.condition_for_cell(cell)
+        condition = self._sample_condition(context.condition_for_cell(cell),
+                                           sample)
 
         group_by = selection[:] if not for_summary else None
 
         # TODO: coalesce if there are outer joins
-        # TODO: ignore post-aggregations
-        aggregate_cols = context.get_columns([agg.ref for agg in aggregates])
+        aggregate_cols = []
+        for agg in aggregates:
+            if agg.function in self.window_functions:
+                column = self._window_column(context, agg, drilldown, split,
+                                             for_summary)
+            elif agg in derived:
+                column = self._relative_column(context, agg, condition)
+            else:
+                column = context.column(agg.ref)
+            aggregate_cols.append(column)
 
         if for_summary:
             # Don't include the group-by part (see issue #157 for more
@@ -585,9 +1028,310 @@ class SQLBrowser(AggregationBrowser):
                                           use_labels=True,
                                           whereclause=condition,
                                           group_by=group_by)
+        statement = self._sampled_statement(statement, sample)
 
         return (statement, context.get_labels(statement.columns))
 
+    def _sample_condition(self, condition, sample):
+        """Returns `condition` restricted to the hash `sample` of the facts:
+        facts with the fact key hash modulo `SAMPLE_MODULUS` below the
+        sampled fraction of the modulus. The sample is deterministic. See
+        `sample_hash()` for requirements on the fact key."""
+
+        if not sample or self.sample_method != "hash":
+            return condition
+
+        key = self.star.fact_table.columns[self.star.fact_key]
+        threshold = max(1, int(round(sample * SAMPLE_MODULUS)))
+
+        hashed = sample_hash(self.connectable.dialect, key) % SAMPLE_MODULUS
+        sample_condition = hashed < threshold
+
+        if condition is None:
+            return sample_condition
+        else:
+            return sql.expression.and_(condition, sample_condition)
+
+    def _sampled_statement(self, statement, sample):
+        """Returns `statement` with the fact table replaced by its
+        ``TABLESAMPLE`` of `sample` fraction. The sample is repeatable,
+        therefore paginated results are consistent."""
+
+        if not sample or self.sample_method == "hash":
+            return statement
+
+        fact = self.star.fact_table
+        method = getattr(sql.func, self.sample_method)
+        seed = sql.expression.literal(SAMPLE_SEED)
+        sampled = sql.expression.tablesample(fact,
+                                             method(sample * 100),
+                                             name=fact.name,
+                                             seed=seed)
+
+        return statement.replace_selectable(fact, sampled)
+
+    def _sample_fraction(self, sample, cell):
+        """Returns fraction of facts of `cell` to be aggregated for `Sample`
+        object `sample` or `None` if all facts are to be aggregated. The
+        fraction of `sample.rows` is computed from the number of facts in
+        the cell. Hash sample fraction is rounded to the resolution of the
+        hash."""
+
+        if sample.rows is not None:
+            fact_count = self._cell_fact_count(cell)
+
+            if not fact_count:
+                return None
+
+            fraction = sample.rows / float(fact_count)
+        else:
+            fraction = sample.fraction
+
+        if fraction >= 1:
+            return None
+
+        if self.sample_method == "hash":
+            threshold = max(1, int(round(fraction * SAMPLE_MODULUS)))
+            fraction = threshold / float(SAMPLE_MODULUS)
+
+        return fraction
+
+    def _cell_fact_count(self, cell):
+        """Returns number of facts in `cell`. The count is cached by the
+        store per cell."""
+
+        key = (self.cube.name, "facts", string_from_cuts(cell.cuts))
+        if self.cell_count_cache is not None:
+            count = self.cell_count_cache.get(key)
+            if count is not None:
+                return count
+
+        refs = collect_attributes([], cell)
+        context = self._create_context(self.cube.get_attributes(refs))
+        condition = context.condition_for_cell(cell)
+        statement = sql.expression.select([sql.functions.count()],
+                                          from_obj=context.star,
+                                          whereclause=condition)
+        count = self.execute(statement, "cell fact count").scalar()
+
+        if self.cell_count_cache is not None:
+            self.cell_count_cache.set(key, count)
+
+        return count
+
+    def sample_description(self, cell, aggregates, fraction):
+        """Returns a dictionary describing the sample of facts of `cell`
+        aggregated as a `fraction` of the facts: sampling `method`,
+        `fraction`, number of sampled fact `rows`, `confidence` level and
+        `margins` – error bounds of the estimated sums and counts of the
+        cell at the confidence level. Other aggregates have no margin.
+
+        The margins are computed from the Horvitz-Thompson estimator
+        variance: ``(1 - p) / p^2 * sum(x^2)`` of the sampled values."""
+
+        aggregates = [agg for agg in aggregates
+                      if agg.function in ADDITIVE_FUNCTIONS]
+
+        refs = collect_attributes([], cell)
+        refs += [agg.measure for agg in aggregates
+                 if agg.measure and agg.function != "count"]
+        context = self._create_context(self.cube.get_attributes(refs))
+
+        selection = [sql.functions.count()]
+        for agg in aggregates:
+            if agg.function == "sum":
+                measure = context.column(agg.measure)
+                column = sql.functions.sum(measure * measure)
+            elif agg.function == "count_nonempty":
+                column = sql.functions.count(context.column(agg.measure))
+            else:
+                column = sql.functions.count()
+            selection.append(column)
+
+        condition = self._sample_condition(context.condition_for_cell(cell),
+                                           fraction)
+        statement = sql.expression.select(selection,
+                                          from_obj=context.star,
+                                          whereclause=condition)
+        statement = self._sampled_statement(statement, fraction)
+
+        row = self.execute(statement, "sample statistics").first()
+
+        margins = {}
+        for agg, value in zip(aggregates, row[1:]):
+            variance = (1 - fraction) * float(value or 0) / fraction ** 2
+            margins[agg.ref] = SAMPLE_Z * variance ** 0.5
+
+        return {
+            "method": self.sample_method,
+            "fraction": fraction,
+            "rows": row[0],
+            "confidence": SAMPLE_CONFIDENCE,
+            "margins": margins
+        }
+
+    def _window_column(self, context, aggregate, drilldown, split,
+                       for_summary=False):
+        """Returns a column for moving window `aggregate` computed by a SQL
+        window function over the aggregate's source column. The window is
+        partitioned by the window key and ordered by the natural order of
+        the window drilldown levels. Summary is just one row, therefore it
+        has neither partition nor order."""
+
+        function = get_window_function(aggregate.function)
+        source = context.column(aggregate.measure)
+
+        window = window_specification(aggregate, drilldown, split)
+
+        partition_by = []
+        order_by = []
+
+        if not for_summary:
+            for ref in window.key:
+                if ref == SPLIT_DIMENSION_NAME:
+                    partition_by.append(context.column_for_split(split))
+                else:
+                    partition_by.append(context.column(ref))
+
+            for item in window.paths:
+                for level in item.levels:
+                    attribute = level.order_attribute or level.key
+                    column = context.column(attribute.ref)
+                    order_by.append(order_column(column,
+                                                 level.order or "asc"))
+
+        return function(aggregate, source,
+                        partition_by=partition_by,
+                        order_by=order_by,
+                        window_size=window.size)
+
+    def _relative_column(self, context, aggregate, condition):
+        """Returns a column for relative `aggregate` computed from the
+        aggregate's source column and the source column aggregated over the
+        whole cell with `condition` as a scalar subquery."""
+
+        function = get_relative_function(aggregate.function)
+        source = context.column(aggregate.measure)
+
+        summary = sql.expression.select([source],
+                                        from_obj=context.star,
+                                        whereclause=condition)
+        summary = summary.correlate(None).as_scalar()
+
+        return function(aggregate, source, summary)
+
+    def _top_partition_key(self, top, drilldown):
+        """Returns list of attribute references of the partition dimension
+        levels of `top`."""
+
+        if not top.dimension:
+            return []
+
+        key = []
+        for item in drilldown.drilldown_for_dimension(top.dimension):
+            key += [level.key.ref for level in item.levels]
+        return key
+
+    def _top_cells(self, cells, top, aggregates, drilldown):
+        """Selects top cells from all `cells` in Python."""
+
+        key = self._top_partition_key(top, drilldown)
+        return top_cells(cells, top, aggregates, key)
+
+    def _top_statement(self, statement, labels, top, aggregates, drilldown):
+        """Wraps an aggregation `statement` to select only `top` cells by
+        their rank computed with the ``ROW_NUMBER()`` window function.
+
+        Returns a tuple (`statement`, `remainder`) where `statement` selects
+        the top cells with the same `labels` and `remainder` is a statement
+        that selects the remainder aggregates of every partition – combined
+        aggregates of the cells ranked out of the top. The remainder does not
+        depend on pagination of the top cells."""
+
+        aggregated = statement.alias("__aggregated")
+        columns = collections.OrderedDict(zip(labels, aggregated.columns))
+
+        # Rank the cells
+        #
+        partition_key = self._top_partition_key(top, drilldown)
+        partition_by = [columns[ref] for ref in partition_key]
+
+        order_by = [columns[top.aggregate.ref].desc()]
+        order_by += [columns[attr.ref] for attr in drilldown.key_attributes]
+
+        rank = sql.functions.func.row_number()
+        rank = rank.over(partition_by=partition_by or None,
+                         order_by=order_by)
+        rank = rank.label(TOP_RANK_LABEL)
+
+        ranked = sql.expression.select(list(aggregated.columns) + [rank])
+        ranked = ranked.alias("__ranked")
+
+        rank = ranked.columns[TOP_RANK_LABEL]
+        columns = collections.OrderedDict(zip(labels, ranked.columns))
+
+        # Select top cells
+        #
+        selection = [columns[label] for label in labels]
+        condition = rank <= top.count
+        top_statement = sql.expression.select(selection,
+                                              whereclause=condition)
+
+        # Remainder of every partition
+        #
+        group_by = [columns[ref] for ref in partition_key]
+        selection = [column.label(ref)
+                     for ref, column in zip(partition_key, group_by)]
+
+        for agg in aggregates:
+            function = COMBINING_FUNCTIONS.get(agg.function)
+            if not function or agg.ref not in columns:
+                continue
+
+            value = sql.expression.case([(rank > top.count, columns[agg.ref])])
+            value = getattr(sql.functions.func, function)(value)
+            selection.append(value.label(agg.ref))
+
+        # Number of the cells in the partitions – there is no remainder
+        # without cells
+        selection.append(sql.functions.count().label(TOP_REST_COUNT_LABEL))
+
+        remainder = sql.expression.select(selection, from_obj=ranked,
+                                          group_by=group_by or None)
+        if group_by:
+            remainder = remainder.order_by(*group_by)
+
+        return (top_statement, remainder)
+
+    def _top_remainder(self, statement, top, aggregates, drilldown):
+        """Returns the remainder of the top cells – a record or a list of
+        records with partition keys – selected by the remainder `statement`
+        from `_top_statement()`."""
+
+        key = self._top_partition_key(top, drilldown)
+        cursor = self.execute(statement, "top cells remainder")
+
+        records = []
+        for row in cursor:
+            record = dict(row.items())
+            if not record.pop(TOP_REST_COUNT_LABEL):
+                continue
+
+            # Aggregates that can not be combined have no remainder
+            for agg in aggregates:
+                record.setdefault(agg.ref, None)
+
+            records.append(record)
+
+        cursor.close()
+
+        if key:
+            return records
+        elif records:
+            return records[0]
+        else:
+            return {}
+
     def _log_statement(self, statement, label=None):
         label = "SQL(%s):" % label if label else "SQL:"
         self.logger.debug("%s\n%s\n" % (label, str(statement)))
@@ -618,3 +1362,39 @@ class ResultIterator(object):
                 continue
 
             yield dict(zip(self.labels, row))
+
+    def rows(self, fields):
+        """Yields tuples of `fields` values directly from the result rows,
+        without creating dictionaries. Fields that are not in the result
+        are ``None``."""
+
+        indexes = [self.labels.index(field) if field in self.labels else None
+                   for field in fields]
+
+        if None in indexes:
+            def row_values(row):
+                return tuple(row[i] if i is not None else None
+                             for i in indexes)
+        elif len(indexes) == 1:
+            index = indexes[0]
+
+            def row_values(row):
+                return (row[index], )
+        elif indexes:
+            row_values = operator.itemgetter(*indexes)
+        else:
+            def row_values(row):
+                return ()
+
+        while True:
+            many = self.result.fetchmany()
+            if not many:
+                break
+
+            for row in many:
+                if self.exclude_if_null \
+                        and any(row[agg] is None
+                                for agg in self.exclude_if_null):
+                    continue
+
+                yield row_values(row)
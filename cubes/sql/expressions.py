@@ -8,8 +8,10 @@
 from __future__ import absolute_import
 
 import sqlalchemy.sql as sql
+from sqlalchemy.types import Float
 
-from expressions import Compiler
+from expressions import Compiler, Variable, Function
+from expressions import UnaryOperator, BinaryOperator
 from .functions import get_aggregate_function
 
 from ..errors import ExpressionError
@@ -55,6 +57,9 @@ SQL_AGGREGATE_FUNCTIONS = [
 
 SQL_ALL_FUNCTIONS = SQL_FUNCTIONS + SQL_AGGREGATE_FUNCTIONS;
 
+# Aggregate functions that are scaled when aggregating a sample
+SQL_ADDITIVE_FUNCTIONS = ["sum", "count"]
+
 SQL_VARIABLES = [
     "current_date", "current_time", "local_date", "local_time"
 ]
@@ -64,7 +69,8 @@ class SQLExpressionContext(object):
     """Context used for building a list of all columns to be used within a
     single SQL query."""
 
-    def __init__(self, columns=None, parameters=None, label=None):
+    def __init__(self, columns=None, parameters=None, label=None,
+                 scale=None):
         """Creates a SQL expression compiler context.
 
         * `bases` is a dictionary of base columns or column expressions
@@ -73,6 +79,8 @@ class SQLExpressionContext(object):
         * `label` is just informative context label to be used for debugging
           purposes or in an exception. Can be a cube name or a dimension
           name.
+        * `scale` – factor of additive aggregates (sums and counts), used
+          when the aggregated facts are only a sample
         """
 
         if columns:
@@ -81,6 +89,11 @@ class SQLExpressionContext(object):
             self._columns = {}
         self.parameters = parameters or {}
         self.label = label
+        self.scale = scale
+
+        # List of resolved variables (`name`, `column`) if the resolution
+        # is being recorded. See `compile_attributes()`
+        self.resolved = None
 
     @property
     def columns(self):
@@ -91,13 +104,19 @@ class SQLExpressionContext(object):
         dictionary or a SQL constant (in that order)."""
 
         if variable in self._columns:
-            return self._columns[variable]
+            result = self._columns[variable]
+            if self.resolved is not None:
+                self.resolved.append((variable, result))
 
         elif variable in self.parameters:
             result = self.parameters[variable]
+            # Compilation with parameters is not kept
+            self.resolved = None
 
         elif variable in SQL_VARIABLES:
             result = getattr(sql.func, variable)()
+            if self.resolved is not None:
+                self.resolved.append((variable, None))
 
         else:
             label = " in {}".format(self.label) if self.label else ""
@@ -114,21 +133,52 @@ class SQLExpressionContext(object):
         if name not in SQL_ALL_FUNCTIONS:
             raise ExpressionError("Unknown function '{}'"
                                   .format(name))
-        return getattr(sql.func, name)
+
+        function = getattr(sql.func, name)
+
+        if self.scale is not None and name in SQL_ADDITIVE_FUNCTIONS:
+            scale = self.scale
+            return lambda *args: sql.expression.type_coerce(function(*args)
+                                                            * scale, Float)
+        else:
+            return function
 
     def add_column(self, name, column):
         self._columns[name] = column
 
 
 def compile_attributes(bases, dependants, parameters, coalesce=None,
-                       label=None):
+                       label=None, scale=None, cache=None):
     """Compile dependant attributes in `dependants`. `bases` is a dictionary
-    of base attributes and their column expressions."""
-
-    context = SQLExpressionContext(bases, parameters, label=label)
+    of base attributes and their column expressions. Additive aggregates are
+    multiplied by `scale`, if specified.
+
+    Expressions are compiled from their parsed form kept by the attributes
+    (`expression_ast`). Compiled columns are kept in the `cache` dictionary,
+    if provided, together with the columns they were compiled from. The
+    kept column is reused while the attribute and all columns its
+    compilation resolved are the same objects – the same star schema
+    provides the same base columns. Columns compiled with `scale` are not
+    kept."""
+
+    context = SQLExpressionContext(bases, parameters, label=label,
+                                   scale=scale)
     compiler = SQLExpressionCompiler()
 
+    if scale is not None:
+        cache = None
+
     for attr in dependants:
+        key = (attr.ref, coalesce)
+
+        if cache is not None:
+            column = _cached_column(cache, key, attr, context)
+            if column is not None:
+                context.add_column(attr.ref, column)
+                continue
+
+            context.resolved = []
+
         # TODO: remove this hasattr with something nicer
         if hasattr(attr, "function") and attr.function:
             # Assumption: only aggregates have function, no measures or other
@@ -143,13 +193,37 @@ def compile_attributes(bases, dependants, parameters, coalesce=None,
             function = get_aggregate_function(function_name)
             column = function(attr, context, coalesce)
         else:
-            column = compiler.compile(attr.expression, context)
+            column = compiler.compile_node(context, attr.expression_ast)
+
+        if cache is not None and context.resolved is not None:
+            cache[key] = (attr, tuple(context.resolved), column)
+        context.resolved = None
 
         context.add_column(attr.ref, column)
 
     return context.columns
 
 
+def _cached_column(cache, key, attr, context):
+    """Returns column of `attr` from the `cache` if it was compiled from the
+    same columns as are in the `context`, otherwise returns `None`."""
+
+    try:
+        (cached_attr, resolved, column) = cache[key]
+    except KeyError:
+        return None
+
+    if cached_attr is not attr:
+        return None
+
+    columns = context.columns
+    for name, resolved_column in resolved:
+        if columns.get(name) is not resolved_column:
+            return None
+
+    return column
+
+
 def compile_if_else(test, true_expression, false_expression):
     return sql.case([(test, true_expression)], else_=false_expression)
 
@@ -158,6 +232,30 @@ class SQLExpressionCompiler(Compiler):
     def __init__(self, context=None):
         super(SQLExpressionCompiler, self).__init__(context)
 
+    def compile_node(self, context, node):
+        """Compiles parsed expression `node` – see
+        `cubes.metadata.parse_expression()`. Same as `compile()` without
+        parsing of the expression text."""
+
+        if isinstance(node, Variable):
+            return self.compile_variable(context, node)
+
+        elif isinstance(node, BinaryOperator):
+            left = self.compile_node(context, node.left)
+            right = self.compile_node(context, node.right)
+            return self.compile_binary(context, node.operator, left, right)
+
+        elif isinstance(node, UnaryOperator):
+            operand = self.compile_node(context, node.operand)
+            return self.compile_unary(context, node.operator, operand)
+
+        elif isinstance(node, Function):
+            args = [self.compile_node(context, arg) for arg in node.args]
+            return self.compile_function(context, node, args)
+
+        else:
+            return self.compile_literal(context, node)
+
     def compile_literal(self, context, literal):
         return sql.expression.bindparam("literal",
                                         literal,
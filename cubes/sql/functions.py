@@ -5,8 +5,13 @@
 # this type.
 
 try:
+    import sqlalchemy
     import sqlalchemy.sql as sql
     from sqlalchemy.sql.functions import ReturnTypeFromArgs
+    from sqlalchemy.sql.expression import ColumnElement
+    from sqlalchemy.ext.compiler import compiles
+    from sqlalchemy.types import Float
+    from sqlalchemy.exc import DBAPIError
 except ImportError:
     from ...common import MissingPackage
     sqlalchemy = sql = MissingPackage("sqlalchemy", "SQL aggregation browser")
@@ -17,15 +22,36 @@ except ImportError:
             # Just fail by trying to call missing package
             missing_error()
 
-from ..errors import ModelError
+    ColumnElement = Float = DBAPIError = ReturnTypeFromArgs
+
+    def compiles(*args, **kwargs):
+        return lambda function: function
+
+import weakref
+
+from ..errors import ModelError, ArgumentError
 
 
 __all__ = (
     "get_aggregate_function",
-    "available_aggregate_functions"
+    "available_aggregate_functions",
+    "get_window_function",
+    "available_window_functions",
+    "supports_window_functions",
+    "supports_tablesample",
+    "sample_hash",
+    "get_relative_function",
+    "available_relative_functions",
+    "available_approximate_functions",
+    "detect_extension_functions",
 )
 
 
+# Aggregate functions that are additive – they are scaled up when
+# aggregating a sample of facts
+ADDITIVE_FUNCTIONS = ("sum", "count", "count_nonempty")
+
+
 class AggregateFunction(object):
     requires_measure = True
 
@@ -47,6 +73,12 @@ class AggregateFunction(object):
         """
 
         expression = self.apply(aggregate, context, coalesce)
+
+        # Estimate of the whole population from a sample of facts
+        scale = getattr(context, "scale", None)
+        if scale is not None and self.name in ADDITIVE_FUNCTIONS:
+            expression = sql.expression.type_coerce(expression * scale, Float)
+
         expression = expression.label(aggregate.name)
         return expression
 
@@ -152,6 +184,78 @@ class FactCountDistinctFunction(AggregateFunction):
         super(FactCountDistinctFunction, self).__init__(name, function)
 
 
+class ApproximateFunction(AggregateFunction):
+    """Approximate aggregate function, such as distinct count or percentile,
+    computed by the database: natively or by a function of a database
+    extension. Databases that have neither estimate the aggregate after the
+    aggregation from sketches of the facts (see `APPROXIMATE_AGGREGATIONS`
+    in the query package), unless the aggregate is requested to be computed
+    exactly."""
+
+    def apply(self, aggregate, context=None, coalesce=False):
+        if not aggregate.measure:
+            raise ModelError("No measure specified for aggregate %s, "
+                             "required for aggregate function %s"
+                             % (str(aggregate), self.name))
+
+        column = context[aggregate.measure]
+
+        if self.name == "approx_percentile":
+            percentile = aggregate.percentile
+            percentile = 0.5 if percentile is None else float(percentile)
+            if percentile < 0 or percentile > 1:
+                raise ModelError("Percentile of aggregate '%s' should be "
+                                 "between 0 and 1" % aggregate.name)
+        else:
+            percentile = None
+
+        return ApproximateAggregate(self.name, column, percentile)
+
+    def is_available(self, dialect, exact=False):
+        """Returns `True` if the function can be computed by `dialect`. If
+        `exact` is `True` then the exact aggregate is considered as well."""
+
+        return approximate_template(self.name, dialect, exact) is not None
+
+
+class ApproximateAggregate(ColumnElement):
+    """Approximate aggregate `function` of `column` rendered with the
+    dialect's template from `approximate_template()`. The `percentile` is
+    rendered as a literal."""
+
+    def __init__(self, function, column, percentile=None):
+        self.function = function
+        self.column = column
+        self.percentile = percentile
+
+        if function == "approx_count_distinct":
+            self.type = sqlalchemy.types.Integer()
+        elif isinstance(column.type, sqlalchemy.types.Numeric):
+            self.type = column.type
+        else:
+            self.type = Float()
+
+    def get_children(self, **kwargs):
+        return [self.column]
+
+
+@compiles(ApproximateAggregate)
+def visit_approximate_aggregate(element, compiler, **kw):
+    # The browser uses the aggregate only if the function is available, the
+    # exact aggregate only if requested
+    template = approximate_template(element.function, compiler.dialect,
+                                    exact=True)
+    if template is None:
+        raise ArgumentError("Approximate function '%s' is not supported by "
+                            "database '%s'" % (element.function,
+                                               compiler.dialect.name))
+
+    column = compiler.process(element.column, **kw)
+    percentile = repr(element.percentile)
+
+    return template % {"column": column, "percentile": percentile}
+
+
 class avg(ReturnTypeFromArgs):
     pass
 
@@ -165,6 +269,389 @@ class variance(ReturnTypeFromArgs):
     pass
 
 
+# SQL standard sample statistics, used by the window functions
+class stddev_samp(ReturnTypeFromArgs):
+    pass
+
+
+class var_samp(ReturnTypeFromArgs):
+    pass
+
+
+class MovingWindow(ColumnElement):
+    """Window function expression over a moving window of `size` rows:
+    ``element OVER (PARTITION BY ... ORDER BY ... ROWS BETWEEN size-1
+    PRECEDING AND CURRENT ROW)``.
+
+    Note: the window frame is rendered as a literal, not as a bound
+    parameter, since the position of the frame parameters is not reliable
+    in positional parameter dialects such as SQLite."""
+
+    def __init__(self, element, partition_by=None, order_by=None, size=1):
+        self.element = element
+        self.partition_by = list(partition_by or [])
+        self.order_by = list(order_by or [])
+        self.size = int(size)
+        self.type = element.type
+
+    def get_children(self, **kwargs):
+        return [self.element] + self.partition_by + self.order_by
+
+
+@compiles(MovingWindow)
+def visit_moving_window(element, compiler, **kw):
+    # Note: the parts have to be processed in the order of their appearance
+    # in the statement to keep positional parameters in the right order
+    function = compiler.process(element.element, **kw)
+    window = []
+
+    if element.partition_by:
+        columns = [compiler.process(column, **kw)
+                   for column in element.partition_by]
+        window.append("PARTITION BY %s" % ", ".join(columns))
+
+    if element.order_by:
+        columns = [compiler.process(column, **kw)
+                   for column in element.order_by]
+        window.append("ORDER BY %s" % ", ".join(columns))
+
+    window.append("ROWS BETWEEN %d PRECEDING AND CURRENT ROW"
+                  % (element.size - 1))
+
+    return "%s OVER (%s)" % (function, " ".join(window))
+
+
+class WindowFunction(object):
+    """Moving window function computed natively by the database using the
+    SQL window functions (the ``OVER`` clause). The function is applied on
+    top of an already aggregated column, therefore it does not require
+    the post-aggregation calculation in Python.
+
+    `dialects` is a list of dialect names that provide the `function`. If
+    it is `None` then all dialects with window function support are
+    considered."""
+
+    def __init__(self, name, function=None, dialects=None):
+        self.name = name
+        self.function = function
+        self.dialects = dialects
+
+    def __call__(self, aggregate, column, partition_by=None, order_by=None,
+                 window_size=1):
+        """Applies the function on an aggregated `column` within a moving
+        window of `window_size` rows. `partition_by` and `order_by` are lists
+        of column expressions. Returns an expression labelled with the
+        aggregate's name."""
+
+        expression = self.apply(column, partition_by, order_by, window_size)
+        return expression.label(aggregate.name)
+
+    def over(self, expression, partition_by, order_by, window_size):
+        """Returns `expression` evaluated within the window: ``ROWS BETWEEN
+        n-1 PRECEDING AND CURRENT ROW``"""
+        return MovingWindow(expression, partition_by, order_by, window_size)
+
+    def apply(self, column, partition_by, order_by, window_size):
+        return self.over(self.function(column), partition_by, order_by,
+                         window_size)
+
+    def is_available(self, dialect):
+        """Returns `True` if the function can be computed by `dialect`."""
+        if not supports_window_functions(dialect):
+            return False
+
+        return self.dialects is None or dialect.name in self.dialects
+
+    def __str__(self):
+        return self.name
+
+
+class StatisticalWindowFunction(WindowFunction):
+    def apply(self, column, partition_by, order_by, window_size):
+        """Coalesce the value to 0 for windows with only one value, same as
+        the post-aggregation calculator does."""
+        expression = super(StatisticalWindowFunction, self).apply(column,
+                                                                  partition_by,
+                                                                  order_by,
+                                                                  window_size)
+        return sql.functions.coalesce(expression, 0)
+
+
+class RelativeStdDevWindowFunction(WindowFunction):
+    def apply(self, column, partition_by, order_by, window_size):
+        mean = self.over(avg(column), partition_by, order_by, window_size)
+        stddev = self.over(stddev_samp(column), partition_by, order_by,
+                           window_size)
+        stddev = sql.functions.coalesce(stddev, 0)
+
+        return sql.expression.case([(mean > 0, stddev / mean)], else_=0)
+
+
+class SummaryShareFunction(object):
+    """Share of an aggregated value in the aggregated cell – the summary.
+    The summary is computed by an uncorrelated scalar subquery of the
+    aggregation statement, therefore the function is available in every
+    database."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, aggregate, column, summary):
+        """Returns ratio of an aggregated `column` and a `summary` scalar
+        expression labelled with the aggregate's name. The column is cast to
+        float to prevent integer division."""
+
+        share = sql.expression.cast(column, Float) \
+                    / sql.functions.func.nullif(summary, 0, type_=Float)
+        return share.label(aggregate.name)
+
+    def __str__(self):
+        return self.name
+
+
+# Dialects supporting window functions. Values are minimal server versions
+# or `None` if any version is considered.
+WINDOW_FUNCTION_DIALECTS = {
+    "postgresql": None,
+    "oracle": None,
+    "mssql": None,
+    "mysql": (8, 0),
+    "sqlite": (3, 25),
+}
+
+# Dialects supporting the SQL standard TABLESAMPLE clause. Values are
+# minimal server versions.
+TABLESAMPLE_DIALECTS = {
+    "postgresql": (9, 5),
+}
+
+# Hash functions of the dialects used by the hash sampling of facts. They
+# return a non-negative integer for a value of any type.
+HASH_DIALECTS = {
+    "postgresql": lambda column: sql.func.abs(sql.cast(
+        sql.func.hashtext(sql.cast(column, sqlalchemy.types.Text)),
+        sqlalchemy.types.BigInteger)),
+    "mysql": lambda column: sql.func.crc32(column),
+    "mssql": lambda column: sql.func.abs(sql.cast(
+        sql.func.checksum(column), sqlalchemy.types.BigInteger)),
+    "oracle": lambda column: sql.func.ora_hash(column),
+}
+
+# Multiplicative hash of integer keys on other databases: the key modulo a
+# prime multiplied by a constant modulo the prime. The product fits into a
+# signed 64-bit integer.
+HASH_PRIME = 4294967291
+HASH_MULTIPLIER = 1640531527
+
+# Dialects providing the SQL standard STDDEV_SAMP and VAR_SAMP
+STATISTICAL_DIALECTS = ["postgresql", "oracle", "mysql"]
+
+
+# Native approximate aggregate functions: dialect name: (minimal server
+# version, template)
+APPROXIMATE_DIALECTS = {
+    "approx_count_distinct": {
+        "oracle": ((12, 1), "APPROX_COUNT_DISTINCT(%(column)s)"),
+        "mssql": ((15, ), "APPROX_COUNT_DISTINCT(%(column)s)"),
+        "snowflake": (None, "APPROX_COUNT_DISTINCT(%(column)s)"),
+        "bigquery": (None, "APPROX_COUNT_DISTINCT(%(column)s)"),
+        "redshift": (None, "APPROXIMATE COUNT(DISTINCT %(column)s)"),
+        "presto": (None, "approx_distinct(%(column)s)"),
+        "trino": (None, "approx_distinct(%(column)s)"),
+    },
+    "approx_percentile": {
+        "oracle": ((12, 2), "APPROX_PERCENTILE(%(percentile)s) "
+                            "WITHIN GROUP (ORDER BY %(column)s)"),
+        "mssql": ((16, ), "APPROX_PERCENTILE_CONT(%(percentile)s) "
+                          "WITHIN GROUP (ORDER BY %(column)s)"),
+        "snowflake": (None, "APPROX_PERCENTILE(%(column)s, %(percentile)s)"),
+        "redshift": (None, "APPROXIMATE PERCENTILE_DISC(%(percentile)s) "
+                           "WITHIN GROUP (ORDER BY %(column)s)"),
+        "presto": (None, "approx_percentile(%(column)s, %(percentile)s)"),
+        "trino": (None, "approx_percentile(%(column)s, %(percentile)s)"),
+    },
+}
+
+# Approximate aggregate functions of database extensions: dialect name:
+# (name of the extension's function, template). The functions are used if
+# they are found in the database, see `detect_extension_functions()`.
+APPROXIMATE_EXTENSIONS = {
+    "approx_count_distinct": {
+        # postgresql-hll
+        "postgresql": ("hll_add_agg", "hll_cardinality(hll_add_agg("
+                                      "hll_hash_any(%(column)s)))"),
+    },
+    "approx_percentile": {
+        # tdigest
+        "postgresql": ("tdigest_percentile", "tdigest_percentile("
+                                             "%(column)s, 100, "
+                                             "%(percentile)s)"),
+        # percentile extension, built into SQLite 3.47+ with
+        # SQLITE_ENABLE_PERCENTILE
+        "sqlite": ("percentile_cont", "percentile_cont(%(column)s, "
+                                      "%(percentile)s)"),
+    },
+}
+
+# Exact aggregates used for the approximate functions by databases that have
+# neither native nor extension function if the exact aggregates are requested
+# (the `approximate_exact` browser option): dialect name: (minimal server
+# version, template). The ``default`` template is used by all dialects.
+EXACT_APPROXIMATE_DIALECTS = {
+    "approx_count_distinct": {
+        "default": (None, "COUNT(DISTINCT %(column)s)"),
+    },
+    "approx_percentile": {
+        "postgresql": ((9, 4), "percentile_cont(%(percentile)s) "
+                               "WITHIN GROUP (ORDER BY %(column)s)"),
+        "oracle": (None, "PERCENTILE_CONT(%(percentile)s) "
+                         "WITHIN GROUP (ORDER BY %(column)s)"),
+    },
+}
+
+# Catalogues of database functions: dialect name: (table, name column)
+FUNCTION_CATALOGUES = {
+    "postgresql": ("pg_proc", "proname"),
+    "sqlite": ("pragma_function_list", "name"),
+}
+
+# Functions of database extensions found in the database by dialect, see
+# `detect_extension_functions()`
+_extension_functions = weakref.WeakKeyDictionary()
+
+
+def _server_version_at_least(dialect, version):
+    """Returns `True` if the server version of `dialect` is at least
+    `version`. `None` version means any version."""
+
+    if version is None:
+        return True
+
+    server_version = dialect.server_version_info
+
+    if not server_version:
+        return False
+
+    return tuple(server_version[:len(version)]) >= version
+
+
+def supports_window_functions(dialect):
+    """Returns `True` if the SQLAlchemy `dialect` supports window functions.
+    The server version is considered for dialects that have window functions
+    only since certain version."""
+
+    try:
+        version = WINDOW_FUNCTION_DIALECTS[dialect.name]
+    except KeyError:
+        return False
+
+    return _server_version_at_least(dialect, version)
+
+
+def supports_tablesample(dialect):
+    """Returns `True` if the SQLAlchemy `dialect` supports the ``TABLESAMPLE``
+    clause with ``BERNOULLI`` and ``SYSTEM`` sampling methods."""
+
+    try:
+        version = TABLESAMPLE_DIALECTS[dialect.name]
+    except KeyError:
+        return False
+
+    return _server_version_at_least(dialect, version)
+
+
+def approximate_template(function, dialect, exact=False):
+    """Returns SQL template of the approximate aggregate `function` for
+    `dialect`: the native function, the function of a database extension or,
+    if `exact` is `True`, the exact aggregate, in this order. Returns `None`
+    if the database can not compute the function."""
+
+    native = APPROXIMATE_DIALECTS.get(function, {})
+    if dialect.name in native:
+        (version, template) = native[dialect.name]
+        if _server_version_at_least(dialect, version):
+            return template
+
+    extension = APPROXIMATE_EXTENSIONS.get(function, {})
+    if dialect.name in extension:
+        (name, template) = extension[dialect.name]
+        if name in _extension_functions.get(dialect, ()):
+            return template
+
+    if not exact:
+        return None
+
+    exact = EXACT_APPROXIMATE_DIALECTS.get(function, {})
+    try:
+        (version, template) = exact.get(dialect.name) or exact["default"]
+    except KeyError:
+        return None
+
+    if _server_version_at_least(dialect, version):
+        return template
+    else:
+        return None
+
+
+def detect_extension_functions(connectable):
+    """Returns a list of names of the functions from `APPROXIMATE_EXTENSIONS`
+    that are installed in the database of `connectable`. The functions are
+    looked up once per dialect (database engine) and used when approximate
+    functions are compiled for the dialect."""
+
+    dialect = connectable.dialect
+
+    try:
+        return _extension_functions[dialect]
+    except KeyError:
+        pass
+
+    names = [dialects[dialect.name][0]
+             for dialects in APPROXIMATE_EXTENSIONS.values()
+             if dialect.name in dialects]
+
+    if not names or dialect.name not in FUNCTION_CATALOGUES:
+        found = []
+    else:
+        (table, column) = FUNCTION_CATALOGUES[dialect.name]
+        column = sql.column(column)
+        table = sql.table(table, column)
+
+        statement = sql.select([column], column.in_(names)).distinct()
+
+        try:
+            found = [row[0] for row in connectable.execute(statement)]
+        except DBAPIError:
+            # Old database versions without the function catalogue
+            found = []
+
+    _extension_functions[dialect] = found
+
+    return found
+
+
+def sample_hash(dialect, column):
+    """Returns an expression hashing values of `column` to non-negative
+    integers for the hash sampling of facts. The database hash function is
+    used if the `dialect` has one, otherwise the column has to be an integer
+    and a multiplicative hash is used. Raises `ArgumentError` for other
+    column types."""
+
+    try:
+        function = HASH_DIALECTS[dialect.name]
+    except KeyError:
+        pass
+    else:
+        return function(column)
+
+    if not isinstance(column.type, sqlalchemy.types.Integer):
+        raise ArgumentError("Hash sampling of facts on '%s' requires an "
+                            "integer fact key, key '%s' is %s"
+                            % (dialect.name, column.name, column.type))
+
+    return (sql.func.abs(column) % HASH_PRIME) * HASH_MULTIPLIER % HASH_PRIME
+
+
 _functions = (
     SummaryCoalescingFunction("sum", sql.functions.sum),
     SummaryCoalescingFunction("count_nonempty", sql.functions.count),
@@ -177,14 +664,41 @@ _functions = (
     ValueCoalescingFunction("variance", variance)
 )
 
+_approximate_functions = (
+    ApproximateFunction("approx_count_distinct"),
+    ApproximateFunction("approx_percentile"),
+)
+
+_window_functions = (
+    WindowFunction("sma", avg),
+    WindowFunction("sms", sql.functions.sum),
+    StatisticalWindowFunction("smstd", stddev_samp, STATISTICAL_DIALECTS),
+    StatisticalWindowFunction("smvar", var_samp, STATISTICAL_DIALECTS),
+    RelativeStdDevWindowFunction("smrsd", dialects=STATISTICAL_DIALECTS)
+)
+
+_relative_functions = (
+    SummaryShareFunction("share_of_summary"),
+)
+
 _function_dict = {}
+_window_function_dict = {}
+_relative_function_dict = {}
 
 
 def _create_function_dict():
     if not _function_dict:
-        for func in _functions:
+        for func in _functions + _approximate_functions:
             _function_dict[func.name] = func
 
+    if not _window_function_dict:
+        for func in _window_functions:
+            _window_function_dict[func.name] = func
+
+    if not _relative_function_dict:
+        for func in _relative_functions:
+            _relative_function_dict[func.name] = func
+
 
 def get_aggregate_function(name):
     """Returns an aggregate function `name`. The returned function takes two
@@ -196,7 +710,53 @@ def get_aggregate_function(name):
 
 
 def available_aggregate_functions():
-    """Returns a list of available aggregate function names."""
+    """Returns a list of available aggregate function names. Approximate
+    functions are not included, since they depend on the database (see
+    `available_approximate_functions()`)."""
+    return [func.name for func in _functions]
+
+
+def available_approximate_functions(dialect=None, exact=False):
+    """Returns a list of available approximate aggregate function names. If
+    `dialect` is specified, then only functions that the dialect can compute
+    – natively, by an extension or, if `exact` is `True`, exactly – are
+    returned. Extension functions are considered only after
+    `detect_extension_functions()`."""
+
+    return [func.name for func in _approximate_functions
+            if dialect is None or func.is_available(dialect, exact)]
+
+
+def get_window_function(name):
+    """Returns a window function `name`. The returned function takes an
+    aggregate, an aggregated column, window partition and order and the window
+    size. When called returns a labelled SQL expression."""
+
+    _create_function_dict()
+    return _window_function_dict[name]
+
+
+def available_window_functions(dialect=None):
+    """Returns a list of available window function names. If `dialect` is
+    specified, then only functions that the dialect can compute are
+    returned."""
+
     _create_function_dict()
-    return _function_dict.keys()
 
+    return [func.name for func in _window_functions
+            if dialect is None or func.is_available(dialect)]
+
+
+def get_relative_function(name):
+    """Returns a relative function `name`. The returned function takes an
+    aggregate, an aggregated column and a reference scalar expression. When
+    called returns a labelled SQL expression."""
+
+    _create_function_dict()
+    return _relative_function_dict[name]
+
+
+def available_relative_functions():
+    """Returns a list of available relative function names."""
+    _create_function_dict()
+    return list(_relative_function_dict.keys())
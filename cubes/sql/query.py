@@ -395,6 +395,10 @@ class StarSchema(object):
 
         self.fact_key_column = self.fact_key_column.label(FACT_KEY_LABEL)
 
+        # Compiled columns of derived attributes and aggregates kept by
+        # `compile_attributes()`
+        self.compiled_columns = {}
+
         # Rest of the initialization
         # --------------------------
         self._collect_tables()
@@ -832,7 +836,7 @@ class QueryContext(object):
     """
 
     def __init__(self, star_schema, attributes, hierarchies=None,
-                 parameters=None, safe_labels=None):
+                 parameters=None, safe_labels=None, scale=None):
         """Creates a query context for `cube`.
 
         * `attributes` – list of all attributes that are relevant to the
@@ -844,6 +848,8 @@ class QueryContext(object):
            for SQL dialects that don't support characters such as dot ``.`` in
            column labels.  See :meth:`QueryContext.column` for more
            information.
+        * `scale` – factor of additive aggregates (sums and counts), used
+          when only a sample of facts is aggregated
 
         `attributes` are objects that have attributes: `ref` – attribute
         reference, `is_base` – `True` when attribute does not depend on any
@@ -884,7 +890,9 @@ class QueryContext(object):
         bases[FACT_KEY_LABEL] = self.star_schema.fact_key_column
 
         self._columns = compile_attributes(bases, dependants, parameters,
-                                           star_schema.label)
+                                           star_schema.label,
+                                           scale=scale,
+                                           cache=star_schema.compiled_columns)
 
         self.label_attributes = {}
         if self.safe_labels:
@@ -16,10 +16,12 @@ except ImportError:
 from .browser import SQLBrowser
 from .mapper import distill_naming, Naming
 from ..logging import get_logger
-from ..common import coalesce_options
+from ..common import coalesce_options, LRUCache
 from ..stores import Store
 from ..errors import ArgumentError, StoreError, ConfigurationError
-from ..query import Drilldown, Cell
+from ..query import Drilldown, Cell, APPROXIMATE_AGGREGATIONS
+from ..query import dump_sketch, load_sketch
+from ..query.statutils import get_key
 from .utils import CreateTableAsSelect, CreateOrReplaceView
 from ..metadata import string_to_dimension_level
 
@@ -47,13 +49,20 @@ SQLALCHEMY_OPTION_TYPES = {
     "supports_unicode_binds": "bool"
 }
 
+# Number of aggregate table rows with sketch states inserted at once
+SKETCH_INSERT_BATCH = 1000
+
 # Data types of options passed to the workspace, browser and mapper
 # This is used to coalesce configuration string values
 OPTION_TYPES = {
     "include_summary": "bool",
     "include_cell_count": "bool",
     "use_denormalization": "bool",
-    "safe_labels": "bool"
+    "safe_labels": "bool",
+    "use_window_functions": "bool",
+    "approximate_exact": "bool",
+    "cell_count_cache_size": "int",
+    "cell_count_cache_timeout": "int"
 }
 
 
@@ -144,6 +153,13 @@ class SQLStore(Store):
         * `denormalized_schema` - schema wehere denormalized views are
           located (use this if the views are in different schema than fact
           tables, otherwise default schema is going to be used)
+
+        Cell count cache:
+
+        * `cell_count_cache_size` – number of drilldown cell counts cached
+          for pagination of the same drilldown (default 1000)
+        * `cell_count_cache_timeout` – number of seconds after which a
+          cached cell count expires (default 300)
         """
         super(SQLStore, self).__init__(**options)
 
@@ -167,6 +183,12 @@ class SQLStore(Store):
         self.connectable = engine
         self.schema = self.naming.schema
 
+        # Total cell counts of drilldowns shared by the browsers, so the
+        # count is not repeated for every page
+        self.cell_count_cache = LRUCache(
+                self.options.get("cell_count_cache_size", 1000),
+                self.options.get("cell_count_cache_timeout", 300))
+
         # Load metadata here. This might be too expensive operation to be
         # performed on every request, therefore it is recommended to have one
         # shared open store per process. SQLAlchemy will take care about
@@ -178,6 +200,12 @@ class SQLStore(Store):
             self.metadata = sa.MetaData(bind=self.connectable,
                                         schema=self.schema)
 
+    def invalidate_cube(self, name):
+        """Removes cached cell counts and level cardinalities of cube
+        `name`."""
+        self.cell_count_cache.remove_where(
+                lambda key: key[0] == name or key[:2] == ("members", name))
+
     # TODO: make a separate SQL utils function
     def _drop_table(self, table, schema, force=False):
         """Drops `table` in `schema`. If table exists, exception is raised
@@ -501,7 +529,8 @@ class SQLStore(Store):
 
     # TODO: make this a separate SQL utility function
     def create_table_from_statement(self, table_name, statement, schema,
-                                    replace=False, insert=False):
+                                    replace=False, insert=False,
+                                    columns=None):
         """Creates or replaces a table from statement.
 
         Arguments:
@@ -513,6 +542,8 @@ class SQLStore(Store):
           otherwise only empty table is created. Defaut is `False`
         * `replace` – if `True` old table will be dropped, otherwise if table
           already exists an exception is raised.
+        * `columns` – list of additional columns of the table that are not
+          in the statement
         """
 
         #
@@ -536,6 +567,9 @@ class SQLStore(Store):
             new_col = sa.Column(col.name, col_type)
             table.append_column(new_col)
 
+        for col in columns or []:
+            table.append_column(col)
+
         self.logger.info("creating table '%s'" % str(table))
         self.metadata.create_all(tables=[table])
 
@@ -552,6 +586,11 @@ class SQLStore(Store):
         """Creates an aggregate table. If dimensions is `None` then all cube's
         dimensions are considered.
 
+        Approximate aggregates, such as ``approx_count_distinct``, are stored
+        as states of their mergeable sketches in text columns, since their
+        values can not be rolled-up. The sketches are merged by
+        `merge_aggregate_sketches()`.
+
         Arguments:
 
         * `dimensions`: list of dimensions to use in the aggregated cuboid, if
@@ -589,27 +628,38 @@ class SQLStore(Store):
         cell = Cell(cube)
         drilldown = Drilldown(drilldown, cell)
 
+        approximate = [agg for agg in cube.aggregates
+                       if agg.function in APPROXIMATE_AGGREGATIONS]
+        aggregates = [agg for agg in cube.aggregates
+                      if agg not in approximate]
+
         # Create statement of all dimension level keys for
         # getting structure for table creation
         (statement, _) = browser.aggregation_statement(
             cell,
             drilldown=drilldown,
-            aggregates=cube.aggregates
+            aggregates=aggregates
         )
 
         # Create table
+        columns = [sa.Column(agg.ref, sa.Text) for agg in approximate]
         table = self.create_table_from_statement(
             table_name,
             statement,
             schema=schema,
             replace=replace,
-            insert=False
+            insert=False,
+            columns=columns
         )
 
         self.logger.info("Inserting...")
 
-        insert = table.insert().from_select(statement.columns, statement)
-        self.execute(insert)
+        if not approximate:
+            insert = table.insert().from_select(statement.columns, statement)
+            self.execute(insert)
+        else:
+            self._insert_sketches(table, statement, browser, approximate,
+                                  drilldown)
 
         self.logger.info("Done")
 
@@ -628,6 +678,104 @@ class SQLStore(Store):
         self.logger.info("Done")
 
 
+    def _insert_sketches(self, table, statement, browser, aggregates,
+                         drilldown):
+        """Inserts aggregated rows of `statement` into `table` together with
+        states of sketches of the approximate `aggregates` of the rows. The
+        rows and the facts are both ordered by the drilldown key, so the
+        sketches are built one row at a time while the rows are joined with
+        the facts in one pass and inserted in batches."""
+
+        key = [attr.ref for attr in drilldown.key_attributes]
+        names = [column.name for column in statement.columns]
+
+        groups = browser.iter_fact_sketches(Cell(browser.cube), aggregates,
+                                            drilldown)
+        group = next(groups, None)
+
+        rows = []
+        for row in self.execute(statement.order_by(*key)):
+            record = dict(zip(names, row))
+
+            if group is not None and group[0] == get_key(record, key):
+                row_sketches = group[1]
+                group = next(groups, None)
+            else:
+                row_sketches = None
+
+            for i, agg in enumerate(aggregates):
+                if row_sketches:
+                    record[agg.ref] = dump_sketch(row_sketches[i])
+                else:
+                    record[agg.ref] = None
+
+            rows.append(record)
+
+            if len(rows) >= SKETCH_INSERT_BATCH:
+                self.execute(table.insert(), rows)
+                rows = []
+
+        if rows:
+            self.execute(table.insert(), rows)
+
+    def merge_aggregate_sketches(self, cube, dimensions=None,
+                                 table_name=None, schema=None):
+        """Returns a list of records with approximate aggregates of the `cube`
+        rolled-up from the sketch states stored in the aggregate table by
+        `create_cube_aggregate()`. The sketches of the table rows are merged
+        by keys of the levels of `dimensions` – list of drilldown levels,
+        such as ``date:month``, which has to be in the aggregate table. All
+        rows are merged into one record if `dimensions` is not specified.
+
+        The records contain the level keys and estimated aggregate values.
+        """
+
+        schema = schema or self.naming.aggregate_schema \
+                    or self.naming.schema
+        table_name = table_name or self.naming.aggregate_table_name(cube.name)
+
+        aggregates = [agg for agg in cube.aggregates
+                      if agg.function in APPROXIMATE_AGGREGATIONS]
+
+        if not aggregates:
+            raise ArgumentError("Cube '%s' has no approximate aggregates"
+                                % cube.name)
+
+        drilldown = Drilldown(dimensions or [], Cell(cube))
+        key = [attr.ref for attr in drilldown.key_attributes]
+
+        table = sa.Table(table_name, self.metadata, autoload=True,
+                         schema=schema)
+        selection = [table.c[name] for name in key]
+        selection += [table.c[agg.ref] for agg in aggregates]
+
+        sketches = {}
+        for row in self.execute(sql.expression.select(selection)):
+            record = dict(zip(key + [agg.ref for agg in aggregates], row))
+            row_key = get_key(record, key)
+
+            try:
+                merged = sketches[row_key]
+            except KeyError:
+                merged = [APPROXIMATE_AGGREGATIONS[agg.function].sketch(agg)
+                          for agg in aggregates]
+                sketches[row_key] = merged
+
+            for sketch, agg in zip(merged, aggregates):
+                if record[agg.ref] is not None:
+                    sketch.merge(load_sketch(record[agg.ref]))
+
+        records = []
+        for row_key, merged in sketches.items():
+            record = dict(zip(key, row_key))
+            for sketch, agg in zip(merged, aggregates):
+                aggregation = APPROXIMATE_AGGREGATIONS[agg.function]
+                record[agg.ref] = aggregation.estimate(sketch, agg)
+            records.append(record)
+
+        return records
+
+
 class SQLSchemaInspector(object):
     """Object that discovers fact and dimension tables in a database according
     to specified configuration and naming conventions.
@@ -5,8 +5,11 @@ from sqlalchemy.sql.expression import Executable, ClauseElement
 from sqlalchemy.ext.compiler import compiles
 import sqlalchemy.sql as sql
 
+import json
+
 from collections import OrderedDict
 
+from ..errors import ArgumentError
 from ..query import SPLIT_DIMENSION_NAME
 
 __all__ = [
@@ -16,9 +19,17 @@ __all__ = [
     "condition_conjunction",
     "order_column",
     "order_query",
-    "paginate_query"
+    "query_order",
+    "paginate_query",
+    "seek_condition",
+    "estimated_row_count",
+    "NULLS_LARGEST_DIALECTS",
 ]
 
+
+# Dialects of databases that sort NULL after all values in ascending order
+NULLS_LARGEST_DIALECTS = ["postgresql", "oracle"]
+
 class CreateTableAsSelect(Executable, ClauseElement):
     def __init__(self, table, select):
         self.table = table
@@ -100,7 +111,69 @@ def order_column(column, order):
     elif order.lower().startswith("desc"):
         return column.desc()
     else:
-        raise ArgumentError("Unknown order %s for column %s") % (order, column)
+        raise ArgumentError("Unknown order %s for column %s"
+                            % (order, column))
+
+
+def _order_items(order):
+    """Returns list of (`name`, `direction`) tuples from `order` which might
+    be a dictionary or a list of tuples."""
+
+    if not order:
+        return []
+    elif isinstance(order, dict):
+        return list(order.items())
+    else:
+        return list(order)
+
+
+def query_order(statement, order, natural_order=None, labels=None,
+                keys=None):
+    """Returns list of tuples (`label`, `direction`) with the final order of
+    the `statement` – split dimension, the explicit `order` and the natural
+    order of the selected columns which are not ordered explicitly. Labels of
+    `keys` that are not ordered yet are appended in ascending order – they
+    should make the order of the rows total. See `order_query()` for
+    description of the arguments."""
+
+    labels = labels or []
+    natural_order = dict((str(name), direction)
+                         for name, direction
+                         in _order_items(natural_order))
+
+    final_order = OrderedDict()
+
+    # Each attribute mentioned in the order should be present in the selection
+    # or as some column from joined table. Here we get the list of already
+    # selected columns and derived aggregates
+
+    # Get logical attributes from column labels (see logical_labels
+    # description for more information why this step is necessary)
+
+    if SPLIT_DIMENSION_NAME in statement.columns:
+        final_order[SPLIT_DIMENSION_NAME] = None
+
+    # Collect the corresponding attribute columns
+    for attribute, direction in order or []:
+        attribute = str(attribute)
+        if attribute not in labels:
+            raise ArgumentError("Can not order by '%s', it is not selected"
+                                % (attribute, ))
+
+        if attribute not in final_order:
+            final_order[attribute] = direction
+
+    # Collect natural order for selected columns that have no explicit
+    # ordering
+    for name in labels:
+        if name in natural_order and name not in final_order:
+            final_order[name] = natural_order[name]
+
+    for name in keys or []:
+        if name not in final_order:
+            final_order[name] = "asc"
+
+    return list(final_order.items())
 
 
 def order_query(statement, order, natural_order=None, labels=None):
@@ -118,46 +191,82 @@ def order_query(statement, order, natural_order=None, labels=None):
       information.
     """
 
-    order = order or []
-    labels = labels or {}
-    natural_order = natural_order or []
+    labels = labels or []
+    columns = OrderedDict(zip(labels, statement.columns))
 
-    final_order = OrderedDict()
+    order_by = []
+    for name, direction in query_order(statement, order, natural_order,
+                                       labels):
+        if name == SPLIT_DIMENSION_NAME:
+            order_by.append(sql.expression.column(SPLIT_DIMENSION_NAME))
+        else:
+            order_by.append(order_column(columns[name], direction))
 
-    # Each attribute mentioned in the order should be present in the selection
-    # or as some column from joined table. Here we get the list of already
-    # selected columns and derived aggregates
+    return statement.order_by(*order_by)
 
-    # Get logical attributes from column labels (see logical_labels
-    # description for more information why this step is necessary)
 
-    columns = OrderedDict(zip(labels, statement.columns))
+def seek_condition(columns, values, nulls_largest=False):
+    """Returns a condition selecting rows following a row with `values` in
+    the order of `columns` – list of tuples (`column`, `direction`). The
+    rows are compared column by column as ``(k1, k2) > (v1, v2)`` would do,
+    but each column might have its own direction. `nulls_largest` should
+    be `True` if the database sorts ``NULL`` after all values in ascending
+    order.
+    """
 
-    # Normalize order
-    # ---------------
-    # Make sure that the `order` is a list of of tuples (`attribute`,
-    # `order`). If element of the `order` list is a string, then it is
-    # converted to (`string`, ``None``).
+    conditions = []
+    equal = []
 
-    if SPLIT_DIMENSION_NAME in statement.columns:
-        split_column = sql.expression.column(SPLIT_DIMENSION_NAME)
-        final_order[SPLIT_DIMENSION_NAME] = split_column
+    for (column, direction), value in zip(columns, values):
+        descending = bool(direction) and direction.lower().startswith("desc")
+        nulls_follow = nulls_largest != descending
 
-    # Collect the corresponding attribute columns
-    for attribute, direction in order:
-        attribute = str(attribute)
-        column = order_column(columns[attribute], direction)
+        if value is None:
+            following = None if nulls_follow else column.isnot(None)
+            equal_condition = column.is_(None)
+        else:
+            # Explicit parameter, boolean values are not compared otherwise
+            value = sql.expression.literal(value, column.type)
 
-        if attribute not in final_order:
-            final_order[attribute] = column
+            if descending:
+                following = column < value
+            else:
+                following = column > value
 
-    # Collect natural order for selected columns that have no explicit
-    # ordering
-    for (name, column) in columns.items():
-        if name in natural_order and name not in order_by:
-            final_order[name] = order_column(column, natural_order[name])
+            if nulls_follow:
+                following = sql.expression.or_(following, column.is_(None))
 
-    statement = statement.order_by(*final_order.values())
+            equal_condition = column == value
 
-    return statement
+        if following is not None:
+            conditions.append(sql.expression.and_(*(equal + [following])))
+
+        equal.append(equal_condition)
+
+    if not conditions:
+        return sql.expression.false()
+
+    return sql.expression.or_(*conditions)
+
+
+def estimated_row_count(connectable, statement):
+    """Returns number of rows of `statement` estimated by the database query
+    planner or `None` if the database of `connectable` does not provide the
+    estimate. Currently only PostgreSQL is supported."""
+
+    dialect = connectable.dialect
+
+    if dialect.name != "postgresql":
+        return None
+
+    compiled = statement.compile(dialect=dialect)
+    result = connectable.execute("EXPLAIN (FORMAT JSON) %s" % compiled,
+                                 compiled.params)
+    plan = result.scalar()
+    result.close()
+
+    # Older drivers return the plan as a string
+    if not isinstance(plan, list):
+        plan = json.loads(plan)
 
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -22,3 +22,9 @@ class Store(object):
         # TODO: this is just backward compatibility, remove this (make this
         # class variable)
         self.store_type = options.get("store_type")
+
+    def invalidate_cube(self, name):
+        """Removes results related to cube `name` cached by the store, for
+        example when the cube's model was changed. Default implementation
+        does nothing."""
+        pass
@@ -3,13 +3,15 @@
 from __future__ import absolute_import
 
 import os.path
+import threading
 
 from collections import OrderedDict, defaultdict
 
 from .metadata import read_model_metadata, find_dimension
-from .metadata import LocalizationContext
+from .metadata import LocalizationContext, LazyMetadata
+from .metadata.cube import expand_dimension_links
 from .auth import NotAuthorized
-from .common import read_json_file
+from .common import read_json_file, LRUCache
 from .errors import ConfigurationError, ArgumentError, CubesError
 from .logging import get_logger
 from .calendar import Calendar
@@ -36,6 +38,81 @@ SLICER_INFO_KEYS = (
     "related"       # List of dicts with related servers
 )
 
+# Number of linked cubes (per locale) kept by the workspace
+CUBE_CACHE_SIZE = 1024
+
+def model_signature(path):
+    """Returns a signature of model file or bundle directory `path` – a
+    tuple of names, modification times and sizes of the model files. The
+    signature changes when a model file is changed, added or removed."""
+
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return ((path, stat.st_mtime, stat.st_size), )
+
+    signature = []
+    for dirname, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            if os.path.splitext(filename)[1] != ".json":
+                continue
+            file_path = os.path.join(dirname, filename)
+            stat = os.stat(file_path)
+            signature.append((file_path, stat.st_mtime, stat.st_size))
+
+    return tuple(sorted(signature))
+
+
+class _ModelSource(object):
+    """Model imported from a file or a bundle with everything needed to
+    import it again: provider name, namespace, the current `provider` and
+    `signature` of the files."""
+
+    def __init__(self, path, provider_name, namespace, provider, lazy,
+                 cache_dir):
+        self.path = path
+        self.provider_name = provider_name
+        self.namespace = namespace
+        self.provider = provider
+        self.lazy = lazy
+        self.cache_dir = cache_dir
+        self.signature = model_signature(path)
+
+
+def _changed_cubes(old, new):
+    """Returns set of names of cubes of provider `old` that are not provided
+    by the provider `new` or that have different merged metadata, options
+    or metadata of their dimensions in `new`. Cubes that were not read by a
+    lazy provider are not compared – they were not created."""
+
+    changed = set()
+
+    for name, metadata in old.cubes_metadata.items():
+        if isinstance(metadata, LazyMetadata) and not metadata.is_loaded:
+            continue
+
+        if not new.has_cube(name):
+            changed.add(name)
+            continue
+
+        old_metadata = old.cube_metadata(name)
+        new_metadata = new.cube_metadata(name)
+
+        if old_metadata != new_metadata \
+                or old.cube_options(name) != new.cube_options(name):
+            changed.add(name)
+            continue
+
+        links = expand_dimension_links(new_metadata.get("dimensions", []))
+        for link in links:
+            dim_name = link["name"]
+            if old.dimensions_metadata.get(dim_name) \
+                    != new.dimensions_metadata.get(dim_name):
+                changed.add(name)
+                break
+
+    return changed
+
+
 def interpret_config_value(value):
     if value is None:
         return value
@@ -67,6 +144,11 @@ class Workspace(object):
         * `rot_dir` – root directory where all relative paths are looked for
         * `models_dir` – directory with models (if relative, then relative to
           the root directory)
+        * `lazy_models` – `True` if files of model bundles are read on demand
+        * `model_cache_dir` – directory of the model metadata cache or `None`
+
+        Models imported from files can be reloaded with
+        :meth:`Workspace.reload_models` when the files change.
 
         * `info` – info dictionary from the info file or info section
         * `calendar` – calendar object providing date and time functions
@@ -127,15 +209,41 @@ class Workspace(object):
         else:
             self.logger.debug("Models root set to current directory")
 
+        # Extensions advertised by installed packages are read from the index
+        # instead of scanning the package entry points
+        if config.has_option("workspace", "extension_index"):
+            path = config.get("workspace", "extension_index")
+            if self.root_dir and not os.path.isabs(path):
+                path = os.path.join(self.root_dir, path)
+            ext.use_extension_index(path)
+
+        # Lazy loading of model bundles and cache of the model metadata
+        if config.has_option("workspace", "lazy_models"):
+            self.lazy_models = config.getboolean("workspace", "lazy_models")
+        else:
+            self.lazy_models = False
+
+        if config.has_option("workspace", "model_cache"):
+            self.model_cache_dir = config.get("workspace", "model_cache")
+            if self.root_dir and not os.path.isabs(self.model_cache_dir):
+                self.model_cache_dir = os.path.join(self.root_dir,
+                                                    self.model_cache_dir)
+        else:
+            self.model_cache_dir = None
+
         # Namespaces and Model Objects
         # ============================
 
         self.namespace = Namespace()
 
-        # Cache of created global objects
-        self._cubes = {}
+        # Cache of created global objects: cubes by (reference, locale)
+        self._cubes = LRUCache(CUBE_CACHE_SIZE)
         # Note: providers are responsible for their own caching
 
+        # Models imported from files – they can be reloaded
+        self._model_sources = []
+        self._reload_lock = threading.Lock()
+
         # Info
         # ====
 
@@ -294,9 +402,20 @@ class Workspace(object):
             self.import_model(path)
 
     def flush_lookup_cache(self):
-        """Flushes the cube lookup cache."""
+        """Flushes the cube lookup cache, the cube index and lists of cubes
+        of the namespaces and the caches of the model providers – their
+        dimensions and merged cube metadata."""
         self._cubes.clear()
-        # TODO: flush also dimensions
+        self.namespace.invalidate()
+
+        namespaces = [self.namespace]
+        while namespaces:
+            namespace = namespaces.pop()
+            namespaces += namespace.namespaces.values()
+
+            for provider in namespace.providers:
+                if hasattr(provider, "clear_cache"):
+                    provider.clear_cache()
 
     def _get_namespace(self, ref):
         """Returns namespace with ference `ref`"""
@@ -311,6 +430,9 @@ class Workspace(object):
         namespace = self._get_namespace(ns)
         namespace.add_translation(locale, trans)
 
+        # Localized cubes and dimensions might be cached
+        self.flush_lookup_cache()
+
     def _register_store_dict(self, name, info):
         info = dict(info)
         try:
@@ -386,7 +508,8 @@ class Workspace(object):
     # TODO: change this to: add_model_provider(provider, info, store, languages, ns)
 
     def import_model(self, model=None, provider=None, store=None,
-                     translations=None, namespace=None):
+                     translations=None, namespace=None, lazy=None,
+                     cache_dir=None):
         """Registers the `model` in the workspace. `model` can be a
         metadata dictionary, filename, path to a model bundle directory or a
         URL.
@@ -401,6 +524,13 @@ class Workspace(object):
         Model's provider is registered together with loaded metadata. By
         default the objects are registered in default global namespace.
 
+        If `lazy` is `True` then files of cubes and dimensions in a model
+        bundle are read when the cube is requested for the first time.
+        `cache_dir` is a directory where the model metadata read from files
+        are cached. Defaults are the workspace options ``lazy_models`` and
+        ``model_cache``. See :func:`cubes.read_model_metadata_bundle` for
+        more information.
+
         Note: No actual cubes or dimensions are created at the time of calling
         this method. The creation is deferred until
         :meth:`cubes.Workspace.cube` or :meth:`cubes.Workspace.dimension` is
@@ -422,6 +552,11 @@ class Workspace(object):
         #
         # TODO: Use "InlineModelProvider" and "FileBasedModelProvider"
 
+        if lazy is None:
+            lazy = self.lazy_models
+        cache_dir = cache_dir or self.model_cache_dir
+        path = None
+
         if isinstance(model, compat.string_type):
             self.logger.debug("Importing model from %s. "
                               "Provider: %s Store: %s NS: %s"
@@ -429,7 +564,8 @@ class Workspace(object):
             path = model
             if self.models_dir and not os.path.isabs(path):
                 path = os.path.join(self.models_dir, path)
-            model = read_model_metadata(path)
+            model = read_model_metadata(path, lazy=lazy,
+                                        cache_dir=cache_dir)
         elif isinstance(model, dict):
             self.logger.debug("Importing model from dictionary. "
                               "Provider: %s Store: %s NS: %s"
@@ -447,7 +583,10 @@ class Workspace(object):
         # `provider` is a ModelProvider subclass instance
 
         if isinstance(provider, compat.string_type):
+            provider_name = provider
             provider = ext.model_provider(provider, model)
+        else:
+            provider_name = None
 
         # TODO: remove this, if provider is external, it should be specified
         if not provider:
@@ -481,6 +620,101 @@ class Workspace(object):
 
         ns.add_provider(provider)
 
+        # Only models read from files by a named provider can be reloaded
+        if path is not None and provider_name:
+            source = _ModelSource(path, provider_name, ns, provider, lazy,
+                                  cache_dir)
+            self._model_sources.append(source)
+
+    def reload_models(self, force=False):
+        """Imports again models from files that were changed since they
+        were imported (or all file models if `force` is `True`). Returns a
+        list of references of cubes that were changed or removed.
+
+        A new model provider is created and bound to the same store as the
+        current one – store connections and reflected tables are kept. Cached
+        cubes that were changed are created with the new provider and then
+        the provider and the cubes are replaced. Results cached by the store
+        are removed only for the changed cubes. If the new model can not be
+        read or a changed cube can not be created, then an exception is raised
+        and the current model is kept.
+
+        The method can be called from another thread than the one serving
+        the requests, see `cubes.server.ModelReloader`."""
+
+        changed_refs = []
+
+        with self._reload_lock:
+            for source in self._model_sources:
+                signature = model_signature(source.path)
+                if signature == source.signature and not force:
+                    continue
+
+                self.logger.info("Reloading model %s" % source.path)
+                refs = self._reload_model(source)
+                source.signature = signature
+                changed_refs += refs
+
+        return changed_refs
+
+    def _reload_model(self, source):
+        """Reloads model `source` and returns list of references of changed
+        cubes. See `reload_models()`."""
+
+        old = source.provider
+        namespace = source.namespace
+
+        metadata = read_model_metadata(source.path, lazy=source.lazy,
+                                       cache_dir=source.cache_dir)
+        provider = ext.model_provider(source.provider_name, metadata)
+        if old.store is not None:
+            provider.bind(old.store)
+
+        changed = _changed_cubes(old, provider)
+
+        # Create the changed cubes that are in use before the swap
+        cubes = []
+        for key in self._cubes.keys():
+            cube = self._cubes.get(key)
+            if cube is None or cube.namespace is not namespace \
+                    or cube.basename not in changed:
+                continue
+
+            if provider.has_cube(cube.basename):
+                (ref, locale) = key
+                cube = self._create_cube(ref, locale, namespace, provider,
+                                         cube.basename)
+            else:
+                cube = None
+
+            cubes.append((key, cube))
+
+        # Swap the provider and the cubes
+        namespace.replace_provider(old, provider)
+
+        for key, cube in cubes:
+            if cube is not None:
+                self._cubes.set(key, cube)
+            else:
+                self._cubes.remove(key)
+
+        if namespace.name:
+            refs = ["%s.%s" % (namespace.name, name) for name in changed]
+        else:
+            refs = list(changed)
+
+        if provider.store is not None \
+                and hasattr(provider.store, "invalidate_cube"):
+            for ref in refs:
+                provider.store.invalidate_cube(ref)
+
+        source.provider = provider
+
+        self.logger.info("Model %s reloaded, changed cubes: %s"
+                         % (source.path, ", ".join(sorted(refs)) or "none"))
+
+        return refs
+
     def add_slicer(self, name, url, **options):
         """Register a slicer as a model and data provider."""
         self.register_store(name, "slicer", url=url, **options)
@@ -495,8 +729,9 @@ class Workspace(object):
         """Get a list of metadata for cubes in the workspace. Result is a list
         of dictionaries with keys: `name`, `label`, `category`, `info`.
 
-        The list is fetched from the model providers on the call of this
-        method.
+        The list is fetched from the model providers and kept by the
+        namespaces until a model is imported or reloaded or until
+        `flush_lookup_cache()` is called.
 
         If the workspace has an authorizer, then it is used to authorize the
         cubes for `identity` and only authorized list of cubes is returned.
@@ -515,7 +750,10 @@ class Workspace(object):
 
     def cube(self, ref, identity=None, locale=None):
         """Returns a cube with full cube namespace reference `ref` for user
-        `identity` and translated to `locale`."""
+        `identity` and translated to `locale`.
+
+        Cubes are kept per `ref` and `locale` – the `identity` is used only
+        for authorization."""
 
         if not isinstance(ref, compat.string_type):
             raise TypeError("Reference is not a string, is %s" % type(ref))
@@ -527,14 +765,26 @@ class Workspace(object):
 
         # If we have a cached cube, return it
         # See also: flush lookup
-        cube_key = (ref, identity, locale)
-        if cube_key in self._cubes:
-            return self._cubes[cube_key]
+        cube_key = (ref, locale)
+        cube = self._cubes.get(cube_key)
+        if cube is not None:
+            return cube
 
         # Find the namespace containing the cube – we will need it for linking
         # later
         (namespace, provider, basename) = self.namespace.find_cube(ref)
 
+        cube = self._create_cube(ref, locale, namespace, provider, basename)
+
+        # Cache the cube
+        self._cubes.set(cube_key, cube)
+
+        return cube
+
+    def _create_cube(self, ref, locale, namespace, provider, basename):
+        """Returns new linked and frozen cube `basename` from the `provider`
+        in `namespace`."""
+
         cube = provider.cube(basename, locale=locale, namespace=namespace)
         cube.namespace = namespace
         cube.store = provider.store
@@ -551,8 +801,8 @@ class Workspace(object):
             trans = context.object_localization("cubes", cube.name)
             cube = cube.localized(trans)
 
-        # Cache the cube
-        self._cubes[cube_key] = cube
+        # The cube is linked, it will not be changed any more
+        cube.freeze()
 
         return cube
 
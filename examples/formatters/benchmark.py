@@ -0,0 +1,111 @@
+# -*- encoding: utf-8 -*-
+"""Measures throughput (rows per second) of the streaming formatters, of
+the cross table construction and of the JSON encoders.
+
+Usage:
+
+    python benchmark.py [ROWS]
+"""
+
+from __future__ import print_function
+
+import datetime
+import decimal
+import sys
+import time
+
+from cubes.formatters import csv_generator, JSONLinesGenerator, \
+                             xlsx_generator, make_cross_table, \
+                             SlicerJSONEncoder, json_encoder
+from cubes.metadata import Cube, MeasureAggregate
+from cubes.query import AggregationResult, Cell
+
+
+FIELDS = ["id", "date", "category", "product", "amount", "price"]
+
+
+def records(count):
+    date = datetime.date(2015, 1, 1)
+    for i in range(count):
+        yield {
+            "id": i,
+            "date": date + datetime.timedelta(days=i % 365),
+            "category": "category %d" % (i % 10),
+            "product": "product %d" % (i % 1000),
+            "amount": i % 17,
+            "price": decimal.Decimal(i % 1000) / 100
+        }
+
+
+class Result(object):
+    """Aggregation result with one cell per record."""
+
+    def __init__(self, count):
+        self.drilldown = True
+        self.aggregates = [MeasureAggregate("amount_sum", function="sum")]
+        self.cells = [{"date": record["date"],
+                       "product": record["product"],
+                       "amount_sum": record["amount"]}
+                      for record in records(count)]
+
+
+def aggregation_result(count):
+    """Returns aggregation result with 20 columns: 10 attributes and 10
+    decimal aggregates as returned by database drivers."""
+
+    aggregates = [MeasureAggregate("amount_%d" % number, function="sum")
+                  for number in range(10)]
+    result = AggregationResult(cell=Cell(Cube("sales")),
+                               aggregates=aggregates)
+    result.cells = iter([
+        dict([("date.year", 2015), ("date.month", i % 12 + 1),
+              ("date.day", i % 28 + 1),
+              ("date.date", datetime.date(2015, i % 12 + 1, i % 28 + 1))]
+             + [("product.level%d" % level, "product %d" % (i % 1000))
+                for level in range(6)]
+             + [("amount_%d" % number, decimal.Decimal(i % 1000) / 100)
+                for number in range(10)])
+        for i in range(count)])
+    return result
+
+
+def json_output(encoder, result, count):
+    encoder.iterator_limit = count
+    yield encoder.encode(result)
+
+
+def cross_table(count):
+    result = Result(count)
+    table = make_cross_table(result, onrows=["product"], oncolumns=["date"],
+                             subtotals=True)
+    yield table.data
+
+
+def measure(name, generator, count):
+    start = time.time()
+    size = 0
+    for chunk in generator:
+        size += len(chunk)
+    elapsed = time.time() - start
+
+    print("%-14s %10.0f rows/s %8.1f MB" % (name, count / elapsed,
+                                            size / 1048576.0))
+
+
+def main(count):
+    measure("csv", csv_generator(records(count), FIELDS), count)
+    measure("json_lines", JSONLinesGenerator(records(count), fields=FIELDS),
+            count)
+    measure("xlsx", xlsx_generator(records(count), FIELDS), count)
+    measure("cross_table", cross_table(count), count)
+
+    measure("json (stdlib)", json_output(SlicerJSONEncoder(),
+                                         aggregation_result(count), count),
+            count)
+    measure("json", json_output(json_encoder(), aggregation_result(count),
+                                count),
+            count)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,95 @@
+# -*- encoding: utf-8 -*-
+"""Measures the attribute look-up of a cube with 200 attributes before and
+after the cube is frozen: attribute lists, `get_attributes()`,
+`attribute()` and `collect_dependencies()` – calls done by the browsers for
+every query.
+
+Usage:
+
+    python benchmark.py [QUERIES]
+
+Frozen cube is measured with 100 times more queries.
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+
+from cubes.metadata import Cube, Dimension, Measure, MeasureAggregate
+
+
+def create_cube():
+    """Returns a cube with 10 dimensions of 3 levels with 4 attributes each
+    (120 attributes), 40 measures (half of them derived) and 40
+    aggregates."""
+
+    dimensions = []
+    for dim in range(10):
+        levels = [{"name": "level%d" % level,
+                   "attributes": ["level%d_%s" % (level, name)
+                                  for name in ["key", "name", "label",
+                                               "order"]]}
+                  for level in range(3)]
+        dimensions.append(Dimension.from_metadata({"name": "dim%d" % dim,
+                                                   "levels": levels}))
+
+    measures = [Measure("amount%d" % i) for i in range(20)]
+    measures += [Measure("ratio%d" % i,
+                         expression="amount%d / amount%d" % (i, (i + 1) % 20))
+                 for i in range(20)]
+
+    aggregates = [MeasureAggregate("%s_sum" % measure.name, function="sum",
+                                   measure=measure.name)
+                  for measure in measures]
+
+    return Cube("sales", dimensions=dimensions, measures=measures,
+                aggregates=aggregates)
+
+
+def queries():
+    """Attribute references of a few typical queries."""
+
+    return [
+        ["dim0.level0_key", "dim0.level0_name", "amount0_sum"],
+        ["dim%d.level1_key" % i for i in range(10)] + ["ratio3_sum"],
+        ["dim5.level2_label", "ratio7", "ratio8", "amount1"],
+    ]
+
+
+def run(cube, count):
+    refs_list = queries()
+
+    for i in range(count):
+        cube.all_attributes
+        cube.all_fact_attributes
+        cube.all_aggregate_attributes
+        cube.attribute("ratio19")
+
+        for refs in refs_list:
+            attributes = cube.get_attributes(refs)
+            cube.collect_dependencies(attributes)
+
+
+def measure(name, cube, count):
+    start = time.time()
+    run(cube, count)
+    elapsed = time.time() - start
+
+    print("%-10s %10.0f queries/s" % (name, count / elapsed))
+
+
+def main(count):
+    cube = create_cube()
+    print("%d attributes" % len(cube.all_attributes))
+
+    measure("unfrozen", cube, count)
+
+    # The first queries create the indexes of the frozen cube
+    cube.freeze()
+    run(cube, 1)
+    measure("frozen", cube, count * 100)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,62 @@
+# -*- encoding: utf-8 -*-
+"""Measures time of importing a large model bundle into a workspace and of
+getting one cube from it – eager loading, lazy loading and lazy loading with
+the model metadata cache (the second run reads the cache).
+
+Usage:
+
+    python loading.py [CUBES]
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from cubes import Workspace, write_model_metadata_bundle
+
+from memory import create_metadata
+
+
+def load(path, **options):
+    start = time.time()
+    workspace = Workspace()
+    workspace.import_model(path, **options)
+    imported = time.time() - start
+
+    workspace.cube("cube0")
+    elapsed = time.time() - start
+
+    return (imported, elapsed)
+
+
+def measure(name, path, **options):
+    (imported, elapsed) = load(path, **options)
+    print("%-18s import %8.1f ms   first cube %8.1f ms"
+          % (name, imported * 1000, elapsed * 1000))
+
+
+def main(cube_count):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "model.cubesmodel")
+    cache_dir = os.path.join(directory, "cache")
+
+    try:
+        write_model_metadata_bundle(path, create_metadata(cube_count))
+
+        measure("eager", path)
+        measure("lazy", path, lazy=True)
+        # The first run writes the cache
+        load(path, lazy=True, cache_dir=cache_dir)
+        measure("lazy (cached)", path, lazy=True, cache_dir=cache_dir)
+        load(path, cache_dir=cache_dir)
+        measure("eager (cached)", path, cache_dir=cache_dir)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
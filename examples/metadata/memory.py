@@ -0,0 +1,98 @@
+# -*- encoding: utf-8 -*-
+"""Measures memory used by the model objects of all cubes of a generated
+large model – cubes sharing conformed dimensions. Requires Python 3
+(`tracemalloc`).
+
+Usage:
+
+    python memory.py [CUBES]
+"""
+
+from __future__ import print_function
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from cubes import Workspace
+from cubes.metadata import Attribute, Dimension
+
+
+DIMENSIONS = 20
+DIMENSIONS_PER_CUBE = 10
+MEASURES_PER_CUBE = 10
+
+
+def create_metadata(cube_count):
+    """Returns model metadata with `DIMENSIONS` conformed dimensions of 3
+    levels with 3 attributes each and `cube_count` cubes. Every other cube
+    links the dimensions with only one of their hierarchies."""
+
+    dimensions = []
+    for dim in range(DIMENSIONS):
+        levels = [{"name": "level%d" % level,
+                   "attributes": ["level%d_%s" % (level, name)
+                                  for name in ["key", "name", "label"]]}
+                  for level in range(3)]
+        hierarchies = [
+            {"name": "default",
+             "levels": ["level0", "level1", "level2"]},
+            {"name": "short",
+             "levels": ["level0", "level1"]}
+        ]
+        dimensions.append({"name": "dim%d" % dim,
+                           "levels": levels,
+                           "hierarchies": hierarchies})
+
+    cubes = []
+    for cube in range(cube_count):
+        links = []
+        for i in range(DIMENSIONS_PER_CUBE):
+            name = "dim%d" % ((cube + i) % DIMENSIONS)
+            if cube % 2:
+                links.append({"name": name, "hierarchies": ["short"]})
+            else:
+                links.append(name)
+
+        measures = ["amount%d" % i for i in range(MEASURES_PER_CUBE)]
+        aggregates = [{"name": "%s_sum" % measure, "function": "sum",
+                       "measure": measure}
+                      for measure in measures]
+
+        cubes.append({"name": "cube%d" % cube,
+                      "dimensions": links,
+                      "measures": measures,
+                      "aggregates": aggregates})
+
+    return {"dimensions": dimensions, "cubes": cubes}
+
+
+def count_objects(class_):
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, class_))
+
+
+def main(cube_count):
+    workspace = Workspace()
+    workspace.import_model(create_metadata(cube_count))
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+
+    cubes = [workspace.cube("cube%d" % i) for i in range(cube_count)]
+
+    elapsed = time.time() - start
+    gc.collect()
+    (size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("%d cubes loaded in %.2f s" % (len(cubes), elapsed))
+    print("%10.1f MB (%.1f kB per cube)" % (size / 1048576.0,
+                                             size / 1024.0 / cube_count))
+    print("%10d dimensions" % count_objects(Dimension))
+    print("%10d attributes" % count_objects(Attribute))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
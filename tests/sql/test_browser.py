@@ -1,14 +1,27 @@
 # -*- encoding: utf-8 -*-
 from __future__ import absolute_import
 
+import datetime
+import decimal
+
 from unittest import TestCase, skip
 import sqlalchemy as sa
-
-from cubes.sql import SQLStore
+from sqlalchemy.dialects import mysql, oracle, postgresql, sqlite
+
+from cubes.errors import ArgumentError
+from cubes.query import Cell, Drilldown, PageCursor, PointCut
+from cubes.query import encode_cursor, decode_cursor
+from cubes.query import RelativeFunction, reference_specification
+from cubes.query.statutils import previous_value
+from cubes.sql import SQLStore, SQLBrowser
+from cubes.sql import functions
+from cubes.sql.functions import available_approximate_functions
+from cubes.sql.functions import sample_hash
 from cubes.sql.query import StarSchema, FACT_KEY_LABEL, to_join
 from cubes.sql.query import QueryContext
 from cubes.sql.mapper import map_base_attributes, StarSchemaMapper
 from cubes.sql.mapper import distill_naming
+from cubes.sql.utils import seek_condition
 
 from .dw.demo import create_demo_dw, TinyDemoModelProvider
 from .common import SQLTestCase
@@ -139,6 +152,681 @@ class SQLStatementsTestCase(SQLQueryContextTestCase):
         # Test lower bound only
         # Test upper bound only
 
+class SQLWindowFunctionTestCase(SQLQueryContextTestCase):
+    """Test moving window aggregates computed with SQL window functions."""
+
+    def browser(self, **options):
+        return SQLBrowser(self.cube, self.store,
+                          dimension_prefix="dim_",
+                          fact_prefix="fact_",
+                          **options)
+
+    def moving_sums(self, browser, **kwargs):
+        result = browser.aggregate(drilldown=["date:month"],
+                                   aggregates=["price_sms"],
+                                   **kwargs)
+        return [cell["price_sms"] for cell in result.cells]
+
+    def test_builtin(self):
+        browser = self.browser()
+        if not browser.window_functions:
+            self.skipTest("Database has no window functions")
+
+        self.assertTrue(browser.is_builtin_function("sms"))
+        self.assertNotIn("sms", browser.features()["post_aggregate_functions"])
+
+        browser = self.browser(use_window_functions=False)
+        self.assertFalse(browser.is_builtin_function("sms"))
+
+    def test_moving_sum(self):
+        browser = self.browser()
+        if not browser.window_functions:
+            self.skipTest("Database has no window functions")
+
+        self.assertEqual([31, 87, 62, 12], self.moving_sums(browser))
+
+    def test_page_boundary(self):
+        """Window at the page boundary contains cells from previous page"""
+        browser = self.browser()
+        if not browser.window_functions:
+            self.skipTest("Database has no window functions")
+
+        self.assertEqual([62, 12],
+                         self.moving_sums(browser, page=1, page_size=2))
+
+    def test_calculated_fallback(self):
+        browser = self.browser(use_window_functions=False)
+        self.assertEqual([31, 87, 62, 12], self.moving_sums(browser))
+
+
+class SQLRelativeAggregatesTestCase(SQLQueryContextTestCase):
+    """Test period-over-period and share aggregates."""
+
+    def setUp(self):
+        self.browser = SQLBrowser(self.cube, self.store,
+                                  dimension_prefix="dim_",
+                                  fact_prefix="fact_")
+
+    def values(self, aggregate, **kwargs):
+        result = self.browser.aggregate(aggregates=[aggregate], **kwargs)
+        return [cell[aggregate] for cell in result.cells]
+
+    def test_builtin(self):
+        self.assertTrue(self.browser.is_builtin_function("share_of_summary"))
+        self.assertFalse(self.browser.is_builtin_function("previous"))
+
+    def test_previous_period(self):
+        self.assertEqual([None, 31, 56, 6],
+                         self.values("price_previous",
+                                     drilldown=["date:month"]))
+        self.assertEqual([None, 25, -50, 0],
+                         self.values("price_delta",
+                                     drilldown=["date:month"]))
+
+        changes = self.values("price_change", drilldown=["date:month"])
+        self.assertIsNone(changes[0])
+        self.assertAlmostEqual(25.0 / 31, changes[1])
+
+        # There is no data for the previous year
+        self.assertEqual([None, None, None, None],
+                         self.values("price_yoy", drilldown=["date:month"]))
+
+    def test_previous_period_page(self):
+        """Previous period of the first cell of a page is on previous page"""
+        self.assertEqual([56, 6],
+                         self.values("price_previous",
+                                     drilldown=["date:month"],
+                                     page=1, page_size=2))
+
+    def test_previous_period_cut(self):
+        # Previous period is outside of the cell
+        self.assertEqual([31, 56, 6],
+                         self.values("price_previous",
+                                     cell="date:2015,2-2015,4",
+                                     drilldown=["date:month"]))
+
+        # No time drilldown: shifted cell
+        result = self.browser.aggregate("date:2015,2",
+                                        aggregates=["price_previous"])
+        self.assertEqual(31, result.summary["price_previous"])
+
+    def test_previous_period_page_high_cardinality(self):
+        level = self.cube.dimension("date").level("month")
+        self.addCleanup(setattr, level, "cardinality", level.cardinality)
+        level.cardinality = "high"
+
+        with self.assertRaises(ArgumentError):
+            self.values("price_sum", drilldown=["date:month"])
+
+        # Only the reference cells of the page are aggregated
+        self.assertEqual([56, 6],
+                         self.values("price_previous",
+                                     drilldown=["date:month"],
+                                     page=1, page_size=2))
+
+        shares = self.values("price_parent_share", drilldown=["date:month"],
+                             page=0, page_size=2)
+        self.assertAlmostEqual(31.0 / 99, shares[0])
+
+    def test_previous_period_null_key(self):
+        cell = Cell(self.cube)
+        spec = reference_specification("period", cell,
+                                       Drilldown(["date:month"], cell))
+
+        self.assertIsNone(spec.shift((2015, None)))
+        self.assertEqual((2015, 1), spec.shift(("2015", "2")))
+
+        calc = RelativeFunction(previous_value, "price_previous",
+                                "price_sum", key=spec.key,
+                                references={("2015", "1"): {"price_sum": 31}},
+                                shift=spec.shift)
+
+        record = {"date.year": 2015, "date.month": None, "price_sum": 3}
+        calc(record)
+        self.assertIsNone(record["price_previous"])
+
+        record = {"date.year": 2015, "date.month": 2, "price_sum": 3}
+        calc(record)
+        self.assertEqual(31, record["price_previous"])
+
+    def test_share_of_parent(self):
+        shares = self.values("price_parent_share", drilldown=["date:month"])
+        self.assertAlmostEqual(31.0 / 99, shares[0])
+        self.assertAlmostEqual(1.0, sum(shares))
+
+    def test_share_of_summary(self):
+        result = self.browser.aggregate(aggregates=["price_share"],
+                                        drilldown=["date:month"])
+        self.assertAlmostEqual(1.0, result.summary["price_share"])
+
+        shares = [cell["price_share"] for cell in result.cells]
+        self.assertAlmostEqual(56.0 / 99, shares[1])
+
+
+class SQLTopCellsTestCase(SQLQueryContextTestCase):
+    """Test top cells and their remainder."""
+
+    def browser(self, **options):
+        return SQLBrowser(self.cube, self.store,
+                          dimension_prefix="dim_",
+                          fact_prefix="fact_",
+                          **options)
+
+    def browsers(self):
+        browser = self.browser()
+        if not browser.top_by_window:
+            self.skipTest("Database has no window functions")
+
+        return [browser, self.browser(use_window_functions=False)]
+
+    def test_top(self):
+        for browser in self.browsers():
+            result = browser.aggregate(drilldown=["item"],
+                                       aggregates=["price_sum"],
+                                       top=2)
+            cells = [(cell["item.name"], cell["price_sum"])
+                     for cell in result.cells]
+            self.assertCountEqual([("jacket", 50), ("apricot", 27)], cells)
+            self.assertEqual({"price_sum": 22}, result.remainder)
+            self.assertEqual(2, result.total_cell_count)
+
+    def test_top_partition(self):
+        for browser in self.browsers():
+            result = browser.aggregate(drilldown=["date:month", "category"],
+                                       aggregates=["price_sum"],
+                                       top="1:price_sum:date")
+            cells = [(cell["date.month"], cell["category.name"])
+                     for cell in result.cells]
+            self.assertCountEqual([(1, "formal"), (2, "casual"),
+                                   (3, "produce"), (4, "produce")], cells)
+
+            remainder = dict((rec["date.month"], rec["price_sum"])
+                             for rec in result.remainder)
+            self.assertEqual({1: 11, 2: 6, 3: None, 4: None}, remainder)
+
+    def test_top_page(self):
+        for browser in self.browsers():
+            result = browser.aggregate(drilldown=["item"],
+                                       aggregates=["price_sum"],
+                                       top=2, page=0, page_size=1,
+                                       order=[("price_sum", "desc")])
+            cells = [cell["item.name"] for cell in result.cells]
+            self.assertEqual(["jacket"], cells)
+            self.assertEqual({"price_sum": 22}, result.remainder)
+
+    def test_top_partition_page(self):
+        for browser in self.browsers():
+            for page in range(3):
+                result = browser.aggregate(drilldown=["date:month",
+                                                      "category"],
+                                           aggregates=["price_sum"],
+                                           top="1:price_sum:date",
+                                           page=page, page_size=2)
+
+                # Remainder of all partitions on every page
+                remainder = dict((rec["date.month"], rec["price_sum"])
+                                 for rec in result.remainder)
+                self.assertEqual({1: 11, 2: 6, 3: None, 4: None}, remainder)
+
+    def test_invalid(self):
+        browser = self.browser()
+        with self.assertRaises(ArgumentError):
+            browser.aggregate(drilldown=["item"], aggregates=["price_sum"],
+                              top=0)
+        with self.assertRaises(ArgumentError):
+            browser.aggregate(drilldown=["item"], aggregates=["price_sum"],
+                              top="1:price_sum:date")
+
+
+class SQLApproximateAggregatesTestCase(SQLQueryContextTestCase):
+    """Test approximate distinct count and percentile aggregates."""
+
+    def setUp(self):
+        self.browser = SQLBrowser(self.cube, self.store,
+                                  dimension_prefix="dim_",
+                                  fact_prefix="fact_")
+
+    def statement(self, aggregate, dialect, version, extensions=None,
+                  exact=False):
+        dialect = dialect.dialect()
+        dialect.server_version_info = version
+        if extensions is not None:
+            functions._extension_functions[dialect] = extensions
+        self.browser.approximate_functions = \
+                available_approximate_functions(dialect, exact)
+        cell = Cell(self.cube)
+        (statement, _) = self.browser.aggregation_statement(
+                            cell,
+                            self.cube.get_aggregates([aggregate]),
+                            Drilldown(["date:month"], cell))
+        return str(statement.compile(dialect=dialect))
+
+    def test_builtin(self):
+        # SQLite has approximate percentile only with the percentile
+        # extension, both aggregates are estimated from sketches
+        self.assertFalse(self.browser.is_builtin_function(
+                                                "approx_count_distinct"))
+        self.assertFalse(self.browser.is_builtin_function("approx_percentile"))
+
+    def test_sketch_fallback(self):
+        result = self.browser.aggregate(aggregates=["price_distinct",
+                                                    "price_median"],
+                                        drilldown=["date:month"])
+        self.assertEqual(5, result.summary["price_distinct"])
+        self.assertEqual(6, result.summary["price_median"])
+
+        cells = [(cell["date.month"], cell["price_distinct"],
+                  cell["price_median"]) for cell in result.cells]
+        self.assertCountEqual([(1, 4, 3), (2, 2, 28), (3, 1, 6), (4, 1, 6)],
+                              cells)
+        self.assertEqual([], result.exact_aggregates)
+
+    def test_native(self):
+        statement = self.statement("price_distinct", oracle, (12, 2))
+        self.assertIn("APPROX_COUNT_DISTINCT(fact_sales.price)", statement)
+
+    def test_extension(self):
+        statement = self.statement("price_distinct", postgresql, (9, 6),
+                                   ["hll_add_agg"])
+        self.assertIn("hll_cardinality(hll_add_agg("
+                      "hll_hash_any(fact_sales.price)))", statement)
+
+        statement = self.statement("price_median", sqlite, (3, 47),
+                                   ["percentile_cont"])
+        self.assertIn("percentile_cont(fact_sales.price, 0.5)", statement)
+
+    def test_exact(self):
+        # Exact aggregates are used only on request
+        self.statement("price_distinct", mysql, (8, 0))
+        self.assertFalse(self.browser.is_builtin_function(
+                                                "approx_count_distinct"))
+
+        statement = self.statement("price_distinct", mysql, (8, 0),
+                                   exact=True)
+        self.assertIn("COUNT(DISTINCT fact_sales.price)", statement)
+
+        # PostgreSQL without the tdigest extension has only exact percentile
+        statement = self.statement("price_median", postgresql, (9, 6),
+                                   exact=True)
+        self.assertIn("percentile_cont(0.5) WITHIN GROUP "
+                      "(ORDER BY fact_sales.price)", statement)
+
+        # MySQL has no percentile aggregate, it is estimated from sketches
+        self.statement("price_median", mysql, (8, 0), exact=True)
+        self.assertFalse(self.browser.is_builtin_function("approx_percentile"))
+
+    def test_exact_option(self):
+        browser = SQLBrowser(self.cube, self.store,
+                             dimension_prefix="dim_",
+                             fact_prefix="fact_",
+                             approximate_exact=True)
+        result = browser.aggregate(aggregates=["price_distinct",
+                                               "price_median"],
+                                   drilldown=["date:month"])
+        self.assertEqual(5, result.summary["price_distinct"])
+        self.assertEqual(["price_distinct"], result.exact_aggregates)
+        self.assertEqual(["price_distinct"],
+                         result.to_dict()["exact_aggregates"])
+
+        cells = [(cell["date.month"], cell["price_distinct"])
+                 for cell in result.cells]
+        self.assertCountEqual([(1, 4), (2, 2), (3, 1), (4, 1)], cells)
+
+    def test_result_type(self):
+        column = sa.Column("price", sa.Integer)
+        aggregate = functions.ApproximateAggregate("approx_count_distinct",
+                                                   column)
+        self.assertIsInstance(aggregate.type, sa.Integer)
+
+        aggregate = functions.ApproximateAggregate("approx_percentile",
+                                                   column, 0.5)
+        self.assertIsInstance(aggregate.type, sa.Float)
+
+        column = sa.Column("price", sa.Numeric(10, 2))
+        aggregate = functions.ApproximateAggregate("approx_percentile",
+                                                   column, 0.5)
+        self.assertIsInstance(aggregate.type, sa.Numeric)
+
+    def test_aggregate_table(self):
+        store = SQLStore(engine=self.dw.engine, metadata=self.dw.md,
+                         fact_prefix="fact_", dimension_prefix="dim_")
+        store.create_cube_aggregate(self.cube, "agg_sales_sketches",
+                                    dimensions=["date", "item"],
+                                    replace=True)
+
+        records = store.merge_aggregate_sketches(
+                            self.cube, ["date:month"],
+                            table_name="agg_sales_sketches")
+        result = self.browser.aggregate(aggregates=["price_distinct",
+                                                    "price_median"],
+                                        drilldown=["date:month"])
+        self.assertCountEqual(list(result.cells), records)
+
+        records = store.merge_aggregate_sketches(
+                            self.cube, table_name="agg_sales_sketches")
+        self.assertEqual([result.summary], records)
+
+
+class SQLSampleTestCase(SQLQueryContextTestCase):
+    """Test aggregation of a sample of facts."""
+
+    def setUp(self):
+        self.browser = SQLBrowser(self.cube, self.store,
+                                  dimension_prefix="dim_",
+                                  fact_prefix="fact_")
+
+    def test_hash_sample(self):
+        self.assertEqual("hash", self.browser.sample_method)
+
+        result = self.browser.aggregate(aggregates=["price_sum",
+                                                    "sales_count"],
+                                        drilldown=["date:month"],
+                                        sample="50%")
+        sample = result.sample
+        self.assertEqual("hash", sample["method"])
+        self.assertAlmostEqual(0.5, sample["fraction"], places=3)
+        self.assertLess(sample["rows"], 9)
+        self.assertAlmostEqual(sample["rows"] / sample["fraction"],
+                               result.summary["sales_count"])
+        self.assertCountEqual(["price_sum", "sales_count"],
+                              sample["margins"].keys())
+
+        # Sample is deterministic and scaled cells add up to the summary
+        total = sum(cell["price_sum"] for cell in result.cells)
+        self.assertAlmostEqual(result.summary["price_sum"], total)
+
+        again = self.browser.aggregate(aggregates=["price_sum"],
+                                       sample=0.5)
+        self.assertEqual(result.summary["price_sum"],
+                         again.summary["price_sum"])
+
+    def test_sample_rows(self):
+        # Sample larger than the facts is not a sample
+        result = self.browser.aggregate(aggregates=["price_sum"],
+                                        sample_rows=100)
+        self.assertIsNone(result.sample)
+        self.assertEqual(99, result.summary["price_sum"])
+
+        result = self.browser.aggregate(aggregates=["price_sum"],
+                                        sample_rows=3)
+        self.assertAlmostEqual(3.0 / 9, result.sample["fraction"], places=3)
+
+    def test_sample_rows_cell(self):
+        # Fraction of the facts in the cell, not of all the facts
+        cell = Cell(self.cube, [PointCut("date", [2015, 1])])
+        count = self.browser.aggregate(cell, aggregates=["sales_count"])
+        count = count.summary["sales_count"]
+        self.assertLess(count, 9)
+
+        result = self.browser.aggregate(cell, aggregates=["price_sum"],
+                                        sample_rows=1)
+        self.assertAlmostEqual(1.0 / count, result.sample["fraction"],
+                               places=3)
+
+    def test_sample_hash(self):
+        integer = sa.Column("id", sa.Integer)
+        string = sa.Column("id", sa.String)
+
+        # Database hash function
+        hashed = sample_hash(postgresql.dialect(), string)
+        statement = str(hashed.compile(dialect=postgresql.dialect()))
+        self.assertIn("hashtext(CAST(id AS TEXT))", statement)
+
+        # Multiplicative hash of integers elsewhere
+        sample_hash(self.browser.connectable.dialect, integer)
+        with self.assertRaises(ArgumentError):
+            sample_hash(self.browser.connectable.dialect, string)
+
+    def test_tablesample(self):
+        self.browser.sample_method = "bernoulli"
+        cell = Cell(self.cube)
+        (statement, _) = self.browser.aggregation_statement(
+                            cell,
+                            self.cube.get_aggregates(["price_sum"]),
+                            Drilldown(["date:month"], cell),
+                            sample=0.01)
+        statement = str(statement.compile(dialect=postgresql.dialect()))
+        self.assertIn("FROM fact_sales AS fact_sales TABLESAMPLE "
+                      "bernoulli", statement)
+
+    def test_invalid(self):
+        for sample in ["0%", "150%", "many", -1]:
+            with self.assertRaises(ArgumentError):
+                self.browser.aggregate(aggregates=["price_sum"],
+                                       sample=sample)
+
+        with self.assertRaises(ArgumentError):
+            self.browser.aggregate(aggregates=["price_sum"],
+                                   sample="1%", sample_rows=10)
+
+
+class SQLFactRowsTestCase(SQLQueryContextTestCase):
+    """Test rows of facts without intermediate dictionaries."""
+
+    def setUp(self):
+        self.browser = SQLBrowser(self.cube, self.store,
+                                  dimension_prefix="dim_",
+                                  fact_prefix="fact_")
+
+    def test_rows(self):
+        facts = self.browser.facts(fields=["price"])
+        rows = list(facts.rows(["price", "unknown", FACT_KEY_LABEL]))
+
+        self.assertEqual(9, len(rows))
+        self.assertEqual(99, sum(row[0] for row in rows))
+        self.assertEqual(set([None]), set(row[1] for row in rows))
+        self.assertCountEqual(range(1, 10), [row[2] for row in rows])
+
+
+class SQLKeysetPaginationTestCase(SQLQueryContextTestCase):
+    """Test pagination by cursor with the ordering key."""
+
+    def setUp(self):
+        self.browser = SQLBrowser(self.cube, self.store,
+                                  dimension_prefix="dim_",
+                                  fact_prefix="fact_")
+
+    def pages(self, function, **kwargs):
+        records = []
+        cursor = ""
+        count = 0
+
+        while cursor is not None:
+            result = function(cursor=cursor, **kwargs)
+            if hasattr(result, "cells"):
+                records += list(result.cells)
+            else:
+                records += list(result)
+            cursor = result.next_cursor
+            count += 1
+
+        return (records, count)
+
+    def test_facts(self):
+        (facts, pages) = self.pages(self.browser.facts,
+                                    fields=["price"],
+                                    order=[("price", "desc")],
+                                    page_size=4)
+        self.assertEqual(3, pages)
+        self.assertCountEqual(range(1, 10),
+                              [fact[FACT_KEY_LABEL] for fact in facts])
+
+        # Ties of price are ordered by the fact key
+        expected = sorted(facts, key=lambda fact: (-fact["price"],
+                                                   fact[FACT_KEY_LABEL]))
+        self.assertEqual(expected, facts)
+
+    def test_drilldown(self):
+        (cells, pages) = self.pages(self.browser.aggregate,
+                                    drilldown=["date:month", "category"],
+                                    aggregates=["price_sum"],
+                                    page_size=3)
+
+        self.assertEqual(3, pages)
+        keys = [(cell["date.month"], cell["category.key"])
+                for cell in cells]
+        self.assertEqual(sorted(keys), keys)
+        self.assertEqual(7, len(set(keys)))
+
+    def test_order_by_aggregate(self):
+        (cells, pages) = self.pages(self.browser.aggregate,
+                                    drilldown=["date:month", "category"],
+                                    aggregates=["price_sum"],
+                                    order=[("price_sum", "desc")],
+                                    page_size=2)
+        self.assertEqual(4, pages)
+        self.assertEqual([50, 20, 10, 6, 6, 6, 1],
+                         [cell["price_sum"] for cell in cells])
+
+    def test_last_page(self):
+        facts = self.browser.facts(fields=["price"], cursor="",
+                                   page_size=9)
+        self.assertEqual(9, len(list(facts)))
+        self.assertIsNone(facts.next_cursor)
+
+    def test_cursor_token(self):
+        cursor = PageCursor(["date", "amount", "name"],
+                            [datetime.date(2015, 1, 2),
+                             decimal.Decimal("1.20"), None])
+        self.assertEqual(cursor, decode_cursor(encode_cursor(cursor)))
+        self.assertEqual(PageCursor(None, None), decode_cursor(""))
+
+    def test_invalid(self):
+        with self.assertRaises(ArgumentError):
+            self.browser.facts(cursor="not a cursor", page_size=2)
+
+        with self.assertRaises(ArgumentError):
+            self.browser.facts(cursor="", page=1, page_size=2)
+
+        with self.assertRaises(ArgumentError):
+            self.browser.facts(cursor="")
+
+        facts = self.browser.facts(fields=["price"], cursor="", page_size=2)
+        with self.assertRaises(ArgumentError):
+            self.browser.facts(fields=["price"], order=[("price", "asc")],
+                               cursor=facts.next_cursor, page_size=2)
+
+    def test_seek_nulls(self):
+        table = sa.Table("seek_test", sa.MetaData(),
+                         sa.Column("a", sa.Integer),
+                         sa.Column("b", sa.Integer))
+        rows = [(1, 1), (1, None), (1, 2), (None, 1), (None, None), (2, 1)]
+
+        # SQLite sorts NULL before all values
+        for direction in ["asc", "desc"]:
+            if direction == "asc":
+                order = [table.c.a.asc(), table.c.b.asc()]
+            else:
+                order = [table.c.a.desc(), table.c.b.desc()]
+
+            select = sa.select([table.c.a, table.c.b]).order_by(*order)
+            columns = [(table.c.a, direction), (table.c.b, direction)]
+
+            with self.dw.engine.connect() as connection:
+                table.create(connection)
+                connection.execute(table.insert(),
+                                   [{"a": a, "b": b} for a, b in rows])
+
+                ordered = [tuple(row) for row in connection.execute(select)]
+                for i, values in enumerate(ordered):
+                    condition = seek_condition(columns, values)
+                    following = connection.execute(select.where(condition))
+                    self.assertEqual(ordered[i + 1:],
+                                     [tuple(row) for row in following])
+
+                table.drop(connection)
+
+
+class SQLCellCountTestCase(SQLQueryContextTestCase):
+    """Test cached, estimated and skipped total cell count."""
+
+    def setUp(self):
+        self.store.cell_count_cache.clear()
+
+    def browser(self):
+        browser = SQLBrowser(self.cube, self.store,
+                             dimension_prefix="dim_",
+                             fact_prefix="fact_")
+        browser.queries = []
+        execute = browser.execute
+
+        def logged_execute(statement, label=None):
+            browser.queries.append(label)
+            return execute(statement, label)
+
+        browser.execute = logged_execute
+        return browser
+
+    def aggregate(self, browser, **kwargs):
+        return browser.aggregate(drilldown=["date:month", "category"],
+                                 aggregates=["price_sum"],
+                                 **kwargs)
+
+    def test_cached(self):
+        browser = self.browser()
+        result = self.aggregate(browser, page=0, page_size=2)
+        self.assertEqual(7, result.total_cell_count)
+        self.assertTrue(result.total_cell_count_exact)
+        self.assertIn("cell count", browser.queries)
+
+        # Next page, even in another browser of the store
+        browser = self.browser()
+        result = self.aggregate(browser, page=1, page_size=2)
+        self.assertEqual(7, result.total_cell_count)
+        self.assertNotIn("cell count", browser.queries)
+        # The data might have changed since the count was cached
+        self.assertFalse(result.total_cell_count_exact)
+
+        # Top cells are counted separately
+        result = self.aggregate(browser, page=1, page_size=2, top=2)
+        self.assertEqual(2, result.total_cell_count)
+        self.assertIn("cell count", browser.queries)
+
+    def test_estimate(self):
+        browser = self.browser()
+        result = self.aggregate(browser, cell_count="estimate")
+        self.assertFalse(result.total_cell_count_exact)
+        self.assertGreaterEqual(result.total_cell_count, 7)
+        self.assertNotIn("cell count", browser.queries)
+
+        # Member counts are cached
+        browser = self.browser()
+        self.aggregate(browser, cell_count="estimate")
+        self.assertNotIn("member count", browser.queries)
+
+        # Cached count is used once it is known
+        self.aggregate(browser)
+        browser.queries = []
+        result = self.aggregate(browser, cell_count="estimate")
+        self.assertEqual(7, result.total_cell_count)
+        self.assertNotIn("member count", browser.queries)
+
+    def test_none(self):
+        browser = self.browser()
+        result = self.aggregate(browser, cell_count="none")
+        self.assertIsNone(result.total_cell_count)
+        self.assertNotIn("cell count", browser.queries)
+
+        result = self.aggregate(browser, include_cell_count=False)
+        self.assertIsNone(result.total_cell_count)
+
+        with self.assertRaises(ArgumentError):
+            self.aggregate(browser, cell_count="guess")
+
+    def test_invalidate_cube(self):
+        browser = self.browser()
+        self.aggregate(browser, cell_count="estimate")
+        self.aggregate(browser)
+        self.store.cell_count_cache.set(("other", ""), 1)
+
+        self.store.invalidate_cube(self.cube.name)
+        self.assertEqual(1, len(self.store.cell_count_cache))
+
+        browser = self.browser()
+        self.aggregate(browser)
+        self.assertIn("cell count", browser.queries)
+
+
 @skip("Tests missing")
 class SQLAggregateTestCase(SQLQueryContextTestCase):
     def setUp(self):
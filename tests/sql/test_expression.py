@@ -7,7 +7,9 @@ from sqlalchemy.sql.expression import ColumnElement
 from unittest import TestCase, skip
 
 from cubes.errors import ExpressionError
+from cubes.metadata import Attribute, MeasureAggregate, parse_expression
 from cubes.sql.expressions import SQLExpressionCompiler, SQLExpressionContext
+from cubes.sql.expressions import compile_attributes
 from .common import SQLTestCase
 
 #
@@ -121,3 +123,46 @@ class SQLExpressionTestCase(SQLTestCase):
         column = self.compiler.compile("min(price, 0)", self.context)
         self.assertExpressionEqual(sa.func.min(self.table.columns["price"], 0),
                                    column)
+
+    def test_compile_node(self):
+        for text in ["price * quantity + 1", "-price", "min(price, 0)",
+                     "if(price > 20, price, 0)", "not (id = 1)"]:
+            node = parse_expression(text)
+            self.assertExpressionEqual(self.compiler.compile(text,
+                                                             self.context),
+                                       self.compiler.compile_node(self.context,
+                                                                  node))
+
+    def test_compiled_cache(self):
+        total = Attribute("total", expression="price * quantity")
+        double = Attribute("double", expression="total * 2")
+        count = MeasureAggregate("count", function="count")
+        dependants = [total, double, count]
+
+        cache = {}
+        columns = compile_attributes(self.columns, dependants, None,
+                                     cache=cache)
+        self.assertExpressionEqual(self.table.columns["price"]
+                                   * self.table.columns["quantity"] * 2,
+                                   columns["double"])
+
+        again = compile_attributes(self.columns, dependants, None,
+                                   cache=cache)
+        for attr in dependants:
+            self.assertIs(columns[attr.ref], again[attr.ref])
+
+        # Different base column
+        bases = dict(self.columns)
+        bases["price"] = self.table.columns["id"]
+        other = compile_attributes(bases, dependants, None, cache=cache)
+        self.assertIsNot(columns["total"], other["total"])
+        self.assertIsNot(columns["double"], other["double"])
+        self.assertExpressionEqual(self.table.columns["id"]
+                                   * self.table.columns["quantity"] * 2,
+                                   other["double"])
+
+        # Parameters are not kept
+        cache = {}
+        compile_attributes(self.columns, [Attribute("x", expression="p")],
+                           {"p": sa.literal(1)}, cache=cache)
+        self.assertEqual(cache, {})
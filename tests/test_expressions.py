@@ -5,7 +5,7 @@ import unittest
 
 from cubes import Attribute
 from cubes.errors import ExpressionError
-from cubes.metadata import depsort_attributes
+from cubes.metadata import depsort_attributes, DependencyGraph
 
 
 class ExpressionUnitTestCase(unittest.TestCase):
@@ -53,3 +53,47 @@ class ExpressionUnitTestCase(unittest.TestCase):
         with self.assertRaisesRegex(ExpressionError, "Circular"):
             depsort_attributes(["indirect_loop1", "intermediate",
                                 "indirect_loop2"], self.deps)
+
+    def test_sorted_shared_dependencies(self):
+        deps = {"a": [], "b": ["a"], "c": ["a", "b"], "d": ["c", "a"]}
+        attrs = depsort_attributes(["d"], deps)
+        self.assertListEqual(attrs, ["a", "b", "c", "d"])
+
+        # Dependencies are not modified
+        self.assertEqual(deps["d"], ["c", "a"])
+
+    def test_graph(self):
+        graph = DependencyGraph(self.deps)
+        attrs = graph.depsort(["c", "d"])
+        self.assertCountEqual(attrs, ["a", "b", "c", "d"])
+        self.assertLess(attrs.index("a"), attrs.index("b"))
+        self.assertLess(attrs.index("b"), attrs.index("c"))
+
+        self.assertCountEqual(graph.dependants["a"], ["b"])
+
+        with self.assertRaisesRegex(ExpressionError, "Unknown"):
+            graph.depsort(["e"])
+
+        with self.assertRaisesRegex(ExpressionError, "Circular"):
+            graph.depsort(["indirect_loop2"])
+
+    def test_graph_cycles(self):
+        graph = DependencyGraph(self.deps)
+        with self.assertRaisesRegex(ExpressionError, "loop1, loop2"):
+            graph.check_cycles()
+
+        # Unknown attributes are not circular references
+        deps = {name:deps for name, deps in self.deps.items()
+                if "loop" not in name and name != "intermediate"}
+        DependencyGraph(deps).check_cycles()
+
+    def test_parsed_expression(self):
+        attr = self.attrs["b"]
+        node = attr.expression_ast
+        self.assertEqual("a", node.left.name)
+        self.assertIs(node, attr.expression_ast)
+
+        attr.expression = "c * 2"
+        self.assertEqual(set(["c"]), attr.dependencies)
+
+        self.assertIsNone(self.attrs["a"].expression_ast)
@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cubes import ext
+from cubes.errors import ConfigurationError, InternalError
+from cubes.ext import ExtensionFinder
+from cubes.formatters import CSVFormatter
+
+
+class DummyFormatter(object):
+    __options__ = [
+        {"name": "count", "type": "int"}
+    ]
+
+    def __init__(self, count=None):
+        self.count = count
+
+
+class ExtensionFinderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.directory, "extensions.json")
+
+    def tearDown(self):
+        ext.use_extension_index(None)
+        shutil.rmtree(self.directory)
+
+    def write_index(self, extensions, version=ext.EXTENSION_INDEX_VERSION):
+        with open(self.index_path, "w") as f:
+            json.dump({"version": version, "extensions": extensions}, f)
+
+    def test_builtin_is_kept(self):
+        finder = ExtensionFinder("formatters")
+
+        extension = finder.get("csv")
+        self.assertIs(CSVFormatter, extension.factory)
+        self.assertIs(extension, finder.get("csv"))
+        self.assertIs(CSVFormatter, finder.factory("csv"))
+
+    def test_register(self):
+        finder = ExtensionFinder("formatters")
+        finder.register("dummy", DummyFormatter)
+
+        formatter = finder("dummy", count="10")
+        self.assertIsInstance(formatter, DummyFormatter)
+        self.assertEqual(10, formatter.count)
+
+    def test_index(self):
+        self.write_index({
+            "formatters": {
+                "dummy": "tests.test_ext:DummyFormatter",
+                "other": "cubes.formatters:CSVFormatter",
+            }
+        })
+        ext.use_extension_index(self.index_path)
+
+        finder = ExtensionFinder("formatters")
+        self.assertIs(DummyFormatter, finder.factory("dummy"))
+        self.assertIn("dummy", finder.names())
+        self.assertIn("other", finder.names())
+        self.assertIn("csv", finder.names())
+        self.assertEqual(len(set(finder.names())), len(finder.names()))
+
+        with self.assertRaises(InternalError):
+            finder.get("unknown")
+
+    def test_discover_once(self):
+        self.write_index({"formatters": {}})
+        ext.use_extension_index(self.index_path)
+
+        finder = ExtensionFinder("formatters")
+        finder.discover()
+        self.assertTrue(finder.discovered)
+
+        # Changed index is not read until the extensions are discovered again
+        self.write_index({
+            "formatters": {"dummy": "tests.test_ext:DummyFormatter"}
+        })
+        ext.use_extension_index(self.index_path)
+        finder.discover()
+        with self.assertRaises(InternalError):
+            finder.get("dummy")
+
+        finder.discover(force=True)
+        self.assertIs(DummyFormatter, finder.factory("dummy"))
+
+    def test_index_version(self):
+        self.write_index({}, version=-1)
+
+        with self.assertRaises(ConfigurationError):
+            ext.use_extension_index(self.index_path)
+
+    def test_write_index(self):
+        index = ext.write_extension_index(self.index_path)
+
+        self.assertEqual(index, ext.read_extension_index(self.index_path))
+        self.assertIn("browsers", index)
@@ -0,0 +1,358 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import
+
+import datetime
+import decimal
+import io
+import json
+import unittest
+import zipfile
+from collections import namedtuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from cubes.common import record_rows
+from cubes.errors import ArgumentError
+from cubes.formatters import csv_generator, JSONLinesGenerator, \
+                             xlsx_generator, arrow_generator, \
+                             make_cross_table, CrossTableFormatter, \
+                             compact_records, expand_records, \
+                             convert_records, json_encoder, \
+                             SlicerJSONEncoder, FastJSONEncoder
+from cubes.metadata import Attribute, Level, MeasureAggregate
+
+
+class XLSXGeneratorTestCase(unittest.TestCase):
+    def workbook(self, records, fields, **kwargs):
+        data = b"".join(xlsx_generator(records, fields, **kwargs))
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        self.assertIsNone(archive.testzip())
+        return archive
+
+    def sheet(self, archive):
+        return archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+
+    def test_parts(self):
+        archive = self.workbook([], ["a"])
+        self.assertCountEqual(["[Content_Types].xml", "_rels/.rels",
+                               "xl/workbook.xml",
+                               "xl/_rels/workbook.xml.rels",
+                               "xl/styles.xml", "xl/worksheets/sheet1.xml"],
+                              archive.namelist())
+
+    def test_typed_cells(self):
+        records = [{"number": 10, "text": u"a < b", "date":
+                    datetime.date(2015, 1, 2), "empty": None}]
+        sheet = self.sheet(self.workbook(records,
+                                         ["number", "text", "date", "empty"],
+                                         header=["Number", "Text", "Date",
+                                                 "Empty"]))
+
+        self.assertIn(u'<c r="A1" t="inlineStr"><is>'
+                      u'<t xml:space="preserve">Number</t></is></c>', sheet)
+        self.assertIn(u'<c r="A2"><v>10</v></c>', sheet)
+        self.assertIn(u'<t xml:space="preserve">a &lt; b</t>', sheet)
+        self.assertIn(u'<c r="C2" s="1"><v>42006</v></c>', sheet)
+        self.assertNotIn(u'r="D2"', sheet)
+
+    def test_no_header(self):
+        sheet = self.sheet(self.workbook([{"a": 1}], ["a"],
+                                         include_header=False))
+        self.assertIn(u'<row r="1"><c r="A1"><v>1</v></c></row>', sheet)
+
+    def test_streaming(self):
+        records = ({"key": i, "name": "item %d" % i} for i in range(20000))
+        chunks = list(xlsx_generator(records, ["key", "name"]))
+
+        self.assertGreater(len(chunks), 10)
+        self.assertLess(max(len(chunk) for chunk in chunks), 64 * 1024)
+
+
+class RecordRowsTestCase(unittest.TestCase):
+    def test_rows(self):
+        records = [{"a": 1, "b": 2}, {"a": 3}]
+        self.assertEqual([(1, 2), (3, None)],
+                         list(record_rows(records, ["a", "b"])))
+        self.assertEqual([(2, ), (None, )],
+                         list(record_rows(records, ["b"])))
+        self.assertEqual([(), ()], list(record_rows(records, [])))
+
+
+class CSVGeneratorTestCase(unittest.TestCase):
+    def test_content(self):
+        records = [{"a": 1, "b": u"x,y"}, {"a": None, "b": u"z"}]
+        output = u"".join(csv_generator(records, ["a", "b"],
+                                        header=["A", "B"]))
+        self.assertEqual(u'A,B\r\n1,"x,y"\r\n,z\r\n', output)
+
+    def test_chunks(self):
+        records = ({"key": i} for i in range(10000))
+        chunks = list(csv_generator(records, ["key"], chunk_size=1024))
+
+        self.assertGreater(len(chunks), 10)
+        lines = u"".join(chunks).splitlines()
+        self.assertEqual(10001, len(lines))
+        self.assertEqual(u"9999", lines[-1])
+
+
+class JSONLinesGeneratorTestCase(unittest.TestCase):
+    def test_conversion(self):
+        records = [
+            {"price": None, "date": None, "name": u"a"},
+            {"price": decimal.Decimal("1.5"),
+             "date": datetime.date(2015, 1, 2), "name": u"b"},
+        ]
+        lines = u"".join(JSONLinesGenerator(records)).splitlines()
+
+        self.assertEqual([{"price": None, "date": None, "name": u"a"},
+                          {"price": 1.5, "date": u"2015-01-02",
+                           "name": u"b"}],
+                         [json.loads(line) for line in lines])
+
+    def test_fields(self):
+        records = [{"a": 1, "b": 2}]
+        output = u"".join(JSONLinesGenerator(records, fields=["b"]))
+        self.assertTrue(output.endswith(u"\n"))
+        self.assertEqual({"b": 2}, json.loads(output))
+
+    def test_chunks(self):
+        records = ({"key": i} for i in range(10000))
+        chunks = list(JSONLinesGenerator(records, chunk_size=1024))
+
+        self.assertGreater(len(chunks), 10)
+        self.assertTrue(all(chunk.endswith(u"\n") for chunk in chunks))
+        self.assertEqual(10000, len(u"".join(chunks).splitlines()))
+
+
+class RecordLayoutTestCase(unittest.TestCase):
+    def setUp(self):
+        self.records = [{"a": 1, "b": u"x"}, {"a": 2, "b": None}]
+
+    def test_rows(self):
+        data = compact_records(self.records, ["a", "b"], "rows")
+        self.assertEqual([(1, u"x"), (2, None)], data)
+        self.assertEqual(self.records,
+                         list(expand_records(data, ["a", "b"], "rows")))
+
+    def test_columns(self):
+        data = compact_records(self.records, ["b", "a"], "columns")
+        self.assertEqual(["b", "a"], list(data.keys()))
+        self.assertEqual({"a": [1, 2], "b": [u"x", None]}, data)
+        self.assertEqual(self.records,
+                         list(expand_records(data, ["b", "a"], "columns")))
+
+    def test_limit(self):
+        data = compact_records(self.records, ["a"], "columns", limit=1)
+        self.assertEqual({"a": [1]}, data)
+
+    def test_unknown_layout(self):
+        with self.assertRaises(ArgumentError):
+            compact_records(self.records, ["a"], "records")
+
+
+class JSONEncoderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.records = [
+            {"price": None, "date": datetime.date(2015, 1, 2), "n": 1},
+            {"price": decimal.Decimal("1.5"), "date": None, "n": 2},
+        ]
+
+    def test_convert_records(self):
+        converted = convert_records(self.records)
+        self.assertEqual([{"price": None, "date": u"2015-01-02", "n": 1},
+                          {"price": 1.5, "date": None, "n": 2}], converted)
+        self.assertIsInstance(converted[1]["price"], float)
+
+        # Original records are not changed
+        self.assertEqual(decimal.Decimal("1.5"), self.records[1]["price"])
+
+    def test_iterator_limit(self):
+        encoder = json_encoder()
+        encoder.iterator_limit = 1
+        output = json.loads(encoder.encode({"data": iter(self.records * 3)}))
+        self.assertEqual(2, len(output["data"]))
+        self.assertEqual(1.5, output["data"][1]["price"])
+
+    def test_indent(self):
+        self.assertIsInstance(json_encoder(indent=4), SlicerJSONEncoder)
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_fast_encoder(self):
+        encoder = json_encoder()
+        self.assertIsInstance(encoder, FastJSONEncoder)
+
+        def value():
+            return {"records": iter(self.records), "tuple": (1, 2),
+                    "datetime": datetime.datetime(2015, 1, 2, 3, 4, 5)}
+
+        self.assertEqual(json.loads(SlicerJSONEncoder().encode(value())),
+                         json.loads(encoder.encode(value())))
+
+    @unittest.skipIf(orjson is None, "orjson is not installed")
+    def test_fast_encoder_chunks(self):
+        encoder = FastJSONEncoder()
+        encoder.batch_size = 2
+        encoder.iterator_limit = 4
+
+        value = {"records": iter(self.records * 5), "empty": iter([]),
+                 "count": 3}
+        chunks = list(encoder.iterencode(value))
+
+        # Records are encoded in batches, not as one chunk
+        self.assertGreater(len(chunks), 5)
+
+        output = json.loads("".join(chunks))
+        self.assertEqual(5, len(output["records"]))
+        self.assertEqual(1.5, output["records"][1]["price"])
+        self.assertEqual([], output["empty"])
+        self.assertEqual(3, output["count"])
+
+
+Drilldown = namedtuple("Drilldown", ["drilldown"])
+DrilldownItem = namedtuple("DrilldownItem", ["levels"])
+
+
+class Result(object):
+    def __init__(self, cells):
+        level = Level("product", [Attribute("product"), Attribute("rank")],
+                      order_attribute="rank", order="desc")
+        self.drilldown = Drilldown([DrilldownItem([level])])
+        self.aggregates = [MeasureAggregate("amount_sum", function="sum"),
+                           MeasureAggregate("amount_avg", function="avg")]
+        self.attributes = ["year", "product", "rank"]
+        self.cells = cells
+
+
+class CrossTableTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cells = [
+            {"year": 2014, "product": "a", "rank": 1,
+             "amount_sum": 10, "amount_avg": 5},
+            {"year": 2015, "product": "b", "rank": 2,
+             "amount_sum": 20, "amount_avg": 20},
+            {"year": 2015, "product": "a", "rank": 1,
+             "amount_sum": 30, "amount_avg": 15},
+        ]
+
+    def table(self, **kwargs):
+        return make_cross_table(Result(self.cells), onrows=["product"],
+                                oncolumns=["year"], **kwargs)
+
+    def test_cells(self):
+        table = self.table()
+        self.assertEqual([("a", ), ("b", )], table.rows)
+        self.assertEqual([(2014, ), (2015, )], table.columns)
+        self.assertEqual([[(10, 5), (30, 15)], [None, (20, 20)]],
+                         table.data)
+
+    def test_aggregates_on(self):
+        table = self.table(aggregates_on="rows")
+        self.assertEqual([("a", "amount_sum"), ("a", "amount_avg"),
+                          ("b", "amount_sum"), ("b", "amount_avg")],
+                         table.rows)
+        self.assertEqual([[10, 30], [5, 15], [None, 20], [None, 20]],
+                         table.data)
+
+        table = self.table(aggregates_on="columns")
+        self.assertEqual([(2014, "amount_sum"), (2014, "amount_avg"),
+                          (2015, "amount_sum"), (2015, "amount_avg")],
+                         table.columns)
+        self.assertEqual([[10, 5, 30, 15], [None, None, 20, 20]],
+                         table.data)
+
+    def test_order_headers(self):
+        table = self.table(order_headers=True)
+        self.assertEqual([("b", ), ("a", )], table.rows)
+        self.assertEqual([[None, (20, 20)], [(10, 5), (30, 15)]],
+                         table.data)
+
+    def test_subtotals(self):
+        table = self.table(subtotals=True)
+        self.assertEqual([("a", ), ("b", ), ("Total", )], table.rows)
+        self.assertEqual([(2014, ), (2015, ), ("Total", )], table.columns)
+        # Averages have no subtotals
+        self.assertEqual([[(10, 5), (30, 15), (40, None)],
+                          [None, (20, 20), (20, None)],
+                          [(10, None), (50, None), (60, None)]],
+                         table.data)
+
+    def test_nested_subtotals(self):
+        table = make_cross_table(Result(self.cells),
+                                 onrows=["year", "product"], oncolumns=[],
+                                 aggregates_on="columns", subtotals=True)
+        self.assertEqual([(2014, "a"), (2014, "Total"),
+                          (2015, "b"), (2015, "a"), (2015, "Total"),
+                          ("Total", None)], table.rows)
+        self.assertEqual([10, 10, 20, 30, 50, 60],
+                         [row[0] for row in table.data])
+
+    def test_header_limit(self):
+        self.table(header_limit=2)
+        with self.assertRaises(ArgumentError):
+            self.table(header_limit=1)
+
+    def test_json(self):
+        formatter = CrossTableFormatter()
+        output = formatter.format(None, Result(self.cells),
+                                  onrows=["product"], oncolumns=["year"])
+        self.assertEqual({"columns": [[2014], [2015]],
+                          "rows": [["a"], ["b"]],
+                          "data": [[[10, 5], [30, 15]], [None, [20, 20]]]},
+                         json.loads(output))
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class ArrowGeneratorTestCase(unittest.TestCase):
+    records = [
+        {"key": 1, "price": decimal.Decimal("1.5"), "name": None,
+         "date": datetime.date(2015, 1, 2)},
+        {"key": 2, "price": None, "name": u"b",
+         "date": datetime.date(2015, 2, 3)},
+    ]
+    fields = ["key", "price", "name", "date"]
+
+    def read(self, chunks, format):
+        data = b"".join(chunks)
+        if format == "parquet":
+            return pyarrow.parquet.read_table(pyarrow.BufferReader(data))
+        else:
+            return pyarrow.ipc.open_stream(data).read_all()
+
+    def test_types(self):
+        for format in ["arrow", "parquet"]:
+            chunks = arrow_generator(self.records, self.fields, format=format,
+                                     types=["integer", "float", None, None])
+            table = self.read(chunks, format)
+
+            self.assertEqual(["int64", "double", "string", "date32[day]"],
+                             [str(field.type) for field in table.schema])
+            self.assertEqual([1.5, None],
+                             table.column("price").to_pylist())
+            self.assertEqual([None, u"b"],
+                             table.column("name").to_pylist())
+
+    def test_batches(self):
+        records = ({"key": i} for i in range(100))
+        chunks = list(arrow_generator(records, ["key"], batch_size=10))
+
+        self.assertEqual(11, len(chunks))
+        table = self.read(chunks, "arrow")
+        self.assertEqual(list(range(100)), table.column("key").to_pylist())
+
+    def test_empty(self):
+        table = self.read(arrow_generator([], ["key"], types=["integer"]),
+                          "arrow")
+        self.assertEqual(0, table.num_rows)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ArgumentError):
+            list(arrow_generator(self.records, self.fields, format="orc"))
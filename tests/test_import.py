@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from .common import TESTS_PATH
+
+# Packages that should not be imported with cubes – they are imported by the
+# modules that use them
+HEAVY_MODULES = [
+    "sqlalchemy",
+    "flask",
+    "jinja2",
+    "pkg_resources",
+    "openpyxl",
+    "pyarrow",
+    "urllib.request",
+]
+
+IMPORT_SCRIPT = """
+import json
+import sys
+import time
+
+start = time.time()
+import {module}
+elapsed = time.time() - start
+
+print(json.dumps({{"elapsed": elapsed,
+                  "modules": [name for name in {modules!r}
+                              if name in sys.modules]}}))
+"""
+
+
+def import_module(module):
+    """Imports `module` in a new interpreter. Returns tuple (`elapsed`,
+    `modules`) where `modules` is a list of heavy modules that were imported
+    with the module."""
+
+    script = IMPORT_SCRIPT.format(module=module, modules=HEAVY_MODULES)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(TESTS_PATH)
+
+    output = subprocess.check_output([sys.executable, "-c", script], env=env)
+    result = json.loads(output.decode("utf-8"))
+
+    return (result["elapsed"], result["modules"])
+
+
+@unittest.skipIf(sys.version_info < (3, 7),
+                 "Lazy import requires module __getattr__ (Python 3.7)")
+class ImportTestCase(unittest.TestCase):
+    def test_import_package(self):
+        (elapsed, modules) = import_module("cubes")
+
+        self.assertEqual([], modules)
+        # Generous limit, the import should take a few milliseconds
+        self.assertLess(elapsed, 1.0)
+
+    def test_import_slicer(self):
+        (elapsed, modules) = import_module("cubes.slicer.commands")
+
+        self.assertEqual([], modules)
+        self.assertLess(elapsed, 2.0)
+
+    def test_lazy_names(self):
+        import cubes
+        from cubes.workspace import Workspace
+        from cubes.errors import ModelError
+
+        self.assertIs(Workspace, cubes.Workspace)
+        self.assertIs(ModelError, cubes.ModelError)
+        self.assertIn("Workspace", cubes.__all__)
+        self.assertIn("Workspace", dir(cubes))
+
+        # Submodules
+        self.assertEqual("cubes.ext", cubes.ext.__name__)
+
+        with self.assertRaises(AttributeError):
+            cubes.no_such_name
@@ -1,11 +1,15 @@
 import unittest
 import os
 import re
+import json
+import shutil
+import tempfile
 
 from cubes import read_model_metadata, read_model_metadata_bundle
+from cubes.metadata import LazyMetadata, read_metadata_file
 from cubes.errors import ArgumentError, ModelError, HierarchyError
 from cubes.errors import ModelInconsistencyError, NoSuchAttributeError
-from cubes.errors import NoSuchDimensionError
+from cubes.errors import NoSuchDimensionError, ExpressionError
 from cubes.metadata import Level, Attribute, Measure, MeasureAggregate
 from cubes.metadata import create_list_of
 from cubes.metadata import Dimension, Hierarchy, Cube
@@ -87,6 +91,25 @@ class AttributeTestCase(unittest.TestCase):
         self.assertEqual("group.name", str(attr))
         self.assertEqual("group.name", attr.ref)
 
+    def test_slots(self):
+        """Attributes have no instance dictionary, references are
+        interned"""
+
+        level = Level("name", attributes=[Attribute("key")])
+        dim = Dimension("group", levels=[level])
+        attr = dim.attribute("key")
+
+        for obj in [attr, Measure("amount"), MeasureAggregate("amount_sum"),
+                    level, dim.hierarchy()]:
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+        self.assertIs(attr.ref, Attribute("key", dimension=dim).ref)
+
+        localized = attr.localized({"label": "Key"})
+        self.assertEqual("Key", localized.label)
+        self.assertEqual("group.key", localized.ref)
+        self.assertIsNone(attr.label)
+
     def test_create_attribute(self):
         """Coalesce attribute object (string or Attribute instance)"""
 
@@ -827,6 +850,80 @@ class CubeTestCase(unittest.TestCase):
         with self.assertRaises(NoSuchAttributeError):
             self.cube.get_attributes(["UNKNOWN"])
 
+    def test_frozen_attributes(self):
+        expected = [a.ref for a in self.cube.all_attributes]
+        fact = [a.ref for a in self.cube.all_fact_attributes]
+        aggregated = [a.ref for a in self.cube.all_aggregate_attributes]
+
+        self.assertFalse(self.cube.is_frozen)
+        self.cube.freeze()
+        self.assertTrue(self.cube.is_frozen)
+
+        refs = [a.ref for a in self.cube.all_attributes]
+        self.assertSequenceEqual(expected, refs)
+        refs = [a.ref for a in self.cube.all_fact_attributes]
+        self.assertSequenceEqual(fact, refs)
+        refs = [a.ref for a in self.cube.all_aggregate_attributes]
+        self.assertSequenceEqual(aggregated, refs)
+
+        # Returned lists are copies
+        self.cube.all_attributes.append("something")
+        self.assertEqual(len(expected), len(self.cube.all_attributes))
+
+        attributes = self.cube.get_attributes(["product.name", "amount"])
+        self.assertSequenceEqual(["product.name", "amount"],
+                                 [a.ref for a in attributes])
+
+        self.assertIs(self.cube.attribute("date.year"),
+                      self.cube.dimension("date").attribute("year"))
+        self.assertEqual("detail", self.cube.attribute("detail").name)
+        self.assertEqual("amount", self.cube.attribute("amount").name)
+
+        with self.assertRaises(NoSuchAttributeError):
+            self.cube.attribute("UNKNOWN")
+        with self.assertRaises(NoSuchAttributeError):
+            self.cube.get_attributes(["UNKNOWN"])
+
+        dim = Dimension.from_metadata({"name": "other"})
+        with self.assertRaises(ModelError):
+            self.cube.link_dimension(dim)
+
+    def test_frozen_dependencies(self):
+        measures = create_list_of(Measure, [
+            "amount",
+            {"name": "discount", "expression": "amount * rate"},
+            {"name": "rate", "expression": "0.1"},
+        ])
+        cube = Cube("contracts", measures=measures).freeze()
+
+        attributes = cube.get_attributes(["discount"])
+        collected = cube.collect_dependencies(attributes)
+        self.assertSequenceEqual(["discount"], [a.ref for a in collected][-1:])
+        self.assertCountEqual(["amount", "rate", "discount"],
+                              [a.ref for a in collected])
+
+        # Dependencies are not consumed by the sorting
+        self.assertEqual(set(["amount", "rate"]),
+                         cube.attribute_dependencies["discount"])
+
+        again = cube.collect_dependencies(attributes)
+        self.assertEqual(collected, again)
+
+        # Kept for the set of attributes
+        attributes = cube.get_attributes(["rate", "discount"])
+        self.assertEqual(collected, cube.collect_dependencies(attributes))
+
+    def test_freeze_circular(self):
+        measures = create_list_of(Measure, [
+            {"name": "amount", "expression": "discount"},
+            {"name": "discount", "expression": "amount * 0.1"},
+        ])
+        cube = Cube("contracts", measures=measures)
+
+        with self.assertRaisesRegex(ExpressionError, "Circular"):
+            cube.freeze()
+        self.assertFalse(cube.is_frozen)
+
     @unittest.skip("deferred (needs workspace)")
     def test_to_dict(self):
         desc = self.cube.to_dict()
@@ -936,6 +1033,63 @@ class ReadModelDescriptionTestCase(ModelTestCaseBase):
             path = self.model_path("model.json")
             desc = read_model_metadata_bundle(path)
 
+    def test_lazy_bundle(self):
+        path = self.model_path("test.cubesmodel")
+        desc = read_model_metadata(path, lazy=True)
+
+        self.assertEqual(1, len(desc["cubes"]))
+        self.assertEqual(6, len(desc["dimensions"]))
+
+        cube = desc["cubes"][0]
+        self.assertIsInstance(cube, LazyMetadata)
+        self.assertEqual("contracts", cube["name"])
+        self.assertFalse(cube.is_loaded)
+
+        self.assertEqual("contracts", Cube.from_metadata(cube).name)
+        self.assertTrue(cube.is_loaded)
+        self.assertFalse(any(dim.is_loaded for dim in desc["dimensions"]))
+
+    def test_lazy_name_mismatch(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        with open(os.path.join(directory, "cube_sales.json"), "w") as f:
+            json.dump({"name": "orders"}, f)
+
+        lazy = LazyMetadata(os.path.join(directory, "cube_sales.json"),
+                            "sales")
+        with self.assertRaises(ModelError):
+            lazy.load()
+
+    def test_metadata_cache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache_dir = os.path.join(directory, "cache")
+        path = os.path.join(directory, "cube_sales.json")
+
+        with open(path, "w") as f:
+            json.dump({"name": "sales", "measures": ["amount"]}, f)
+
+        expanded = read_metadata_file(path, cache_dir,
+                                      expand=lambda md: dict(md, expanded=1))
+        self.assertEqual(1, expanded["expanded"])
+        self.assertEqual(1, len(os.listdir(cache_dir)))
+
+        # Cached expanded metadata
+        cached = read_metadata_file(path, cache_dir)
+        self.assertEqual(expanded, cached)
+
+        # Changed file is read again
+        with open(path, "w") as f:
+            json.dump({"name": "sales", "measures": ["amount", "discount"]},
+                      f)
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+        changed = read_metadata_file(path, cache_dir)
+        self.assertEqual(["amount", "discount"], changed["measures"])
+        self.assertNotIn("expanded", changed)
+
 def test_suite():
     suite = unittest.TestSuite()
 
@@ -1,4 +1,6 @@
 import unittest
+from cubes.errors import NoSuchCubeError
+from cubes.metadata import StaticModelProvider
 from cubes.namespace import Namespace
 # from .common import CubesTestCaseBase
 
@@ -83,3 +85,71 @@ class NamespaceTestCase(unittest.TestCase):
         self.assertEqual(nsname, "")
         self.assertEqual(basename, "cube")
 
+
+class CountingProvider(StaticModelProvider):
+    def __init__(self, *cubes):
+        metadata = {"cubes": [{"name": name} for name in cubes]}
+        super(CountingProvider, self).__init__(metadata)
+        self.list_count = 0
+
+    def list_cubes(self):
+        self.list_count += 1
+        return super(CountingProvider, self).list_cubes()
+
+
+class NamespaceIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.base = Namespace()
+        self.provider = CountingProvider("sales", "costs")
+        self.base.add_provider(self.provider)
+
+        (self.nested, _) = self.base.namespace("one.two", create=True)
+        self.nested_provider = CountingProvider("sales")
+        self.nested.add_provider(self.nested_provider)
+
+    def test_find_cube(self):
+        self.assertEqual((self.base, self.provider, "sales"),
+                         self.base.find_cube("sales"))
+        self.assertEqual((self.nested, self.nested_provider, "sales"),
+                         self.base.find_cube("one.two.sales"))
+        self.assertEqual((self.nested, self.nested_provider, "sales"),
+                         self.nested.find_cube("sales"))
+
+        with self.assertRaises(NoSuchCubeError):
+            self.base.find_cube("unknown")
+        with self.assertRaises(NoSuchCubeError):
+            self.base.find_cube("one.two.costs")
+
+    def test_index_version(self):
+        index = self.base.cube_index()
+        self.assertEqual(["costs", "one.two.sales", "sales"], sorted(index))
+        self.assertIs(index, self.base.cube_index())
+
+        # First provider provides the cube
+        other = CountingProvider("sales", "other")
+        self.nested.add_provider(other)
+        self.assertEqual((self.nested, self.nested_provider, "sales"),
+                         self.base.find_cube("one.two.sales"))
+        self.assertEqual((self.nested, other, "other"),
+                         self.base.find_cube("one.two.other"))
+
+        self.nested.replace_provider(self.nested_provider, other)
+        self.assertEqual((self.nested, other, "sales"),
+                         self.base.find_cube("one.two.sales"))
+
+    def test_list_cubes(self):
+        names = [cube["name"] for cube in self.base.list_cubes(True)]
+        self.assertEqual(["sales", "costs", "one.two.sales"], names)
+
+        self.base.list_cubes(True)
+        self.assertEqual(1, self.provider.list_count)
+        self.assertEqual(1, self.nested_provider.list_count)
+
+        # Returned lists can be modified
+        self.base.list_cubes(True)[0]["name"] = "changed"
+        self.assertEqual("sales", self.base.list_cubes(True)[0]["name"])
+
+        self.nested.invalidate()
+        self.base.list_cubes(True)
+        self.assertEqual(2, self.provider.list_count)
+        self.assertEqual(2, self.nested_provider.list_count)
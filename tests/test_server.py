@@ -9,10 +9,18 @@ from werkzeug.test import Client
 from werkzeug.wrappers import BaseResponse
 
 from cubes.server import create_server
+from cubes.server.browser import SlicerBrowser
+from cubes.server.store import SlicerStore
+from cubes.server.compression import CompressionStats, compress_response
 from cubes import compat
 from cubes import Workspace
 
 import csv
+import gzip
+import zlib
+
+from werkzeug.datastructures import Accept
+from werkzeug.wrappers import Response
 
 
 TEST_DB_URL = "sqlite:///"
@@ -59,6 +67,68 @@ class SlicerTestCase(SlicerTestCaseBase):
         response, status = self.get("this_is_unknown")
         self.assertEqual(404, status)
 
+    def test_compression_vary(self):
+        response = self.server.get("/version",
+                                   headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(200, response.status_code)
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        # Too small to be compressed
+        self.assertNotIn("Content-Encoding", response.headers)
+
+
+class CompressionTestCase(unittest.TestCase):
+    def response(self, chunks, mimetype="text/csv"):
+        return Response(iter(chunks), mimetype=mimetype)
+
+    def compress(self, response, accept=None, **kwargs):
+        accept = Accept([(enc, 1) for enc in accept or ["gzip"]])
+        return compress_response(response, accept, ["gzip"], **kwargs)
+
+    def test_streamed(self):
+        chunks = [b"a,b\n"] + [b"%d,%d\n" % (i, i * 2) for i in range(1000)]
+        stats = CompressionStats()
+        response = self.compress(self.response(chunks), min_size=10,
+                                 stats=stats)
+
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertNotIn("Content-Length", response.headers)
+
+        data = b"".join(response.response)
+        self.assertEqual(b"".join(chunks), gzip.decompress(data))
+
+        stats = stats.to_dict()["gzip"]
+        self.assertEqual(1, stats["responses"])
+        self.assertEqual(len(b"".join(chunks)), stats["size"])
+        self.assertEqual(len(data), stats["compressed_size"])
+        self.assertGreater(stats["ratio"], 1)
+
+    def test_first_chunk_flushed(self):
+        response = self.compress(self.response([b"x" * 100, b"y" * 100]),
+                                 min_size=10)
+        first = next(iter(response.response))
+        self.assertEqual(b"x" * 100,
+                         zlib.decompressobj(16 + zlib.MAX_WBITS)
+                         .decompress(first))
+
+    def test_not_compressed(self):
+        # Small
+        response = self.compress(self.response([b"a", b"b"]), min_size=10)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(b"ab", b"".join(response.response))
+        self.assertEqual("2", response.headers["Content-Length"])
+
+        # Not accepted
+        response = self.compress(self.response([b"a" * 100]),
+                                 accept=["br"])
+        self.assertNotIn("Content-Encoding", response.headers)
+
+        # Already compressed mime type
+        mimetype = "application/vnd.openxmlformats-officedocument" \
+                   ".spreadsheetml.sheet"
+        response = self.compress(self.response([b"a" * 100], mimetype))
+        self.assertNotIn("Content-Encoding", response.headers)
+
+
 @unittest.skip("We need to fix the model")
 class SlicerModelTestCase(SlicerTestCaseBase):
 
@@ -261,3 +331,112 @@ class SlicerAggregateTestCase(SlicerTestCaseBase):
         header = next(reader)
         self.assertSequenceEqual(["2013", "100", "5"],
                                  header)
+
+
+
+class SlicerSalesTestCaseBase(SlicerTestCaseBase):
+    """Slicer serving a small SQLite cube of sales."""
+
+    def setUp(self):
+        super(SlicerSalesTestCaseBase, self).setUp()
+
+        ws = Workspace()
+        ws.register_default_store("sql", url=TEST_DB_URL)
+        self.slicer.cubes_workspace = ws
+
+        store = ws.get_store("default")
+        table = Table("sales", store.metadata,
+                      Column("id", Integer),
+                      Column("item", String),
+                      Column("amount", Integer))
+        table.create()
+        rows = [{"id": i, "item": "item%d" % (i % 3), "amount": i}
+                for i in range(9)]
+        store.connectable.execute(table.insert(), rows)
+
+        ws.import_model({
+            "cubes": [{
+                "name": "sales",
+                "dimensions": ["item"],
+                "measures": ["amount"],
+                "aggregates": [
+                    {"name": "amount_sum", "measure": "amount",
+                     "function": "sum"}
+                ]
+            }],
+            "dimensions": [{"name": "item"}]
+        })
+
+
+class SlicerRecordLimitTestCase(SlicerSalesTestCaseBase):
+    def test_aggregate_compact_layout_limit(self):
+        url = "cube/sales/aggregate?drilldown=item&layout=rows"
+        response, status = self.get(url)
+        self.assertEqual(200, status)
+        self.assertEqual(3, len(response["cells"]))
+
+        self.slicer.slicer.json_record_limit = 2
+        response, status = self.get(url)
+        self.assertEqual(2, len(response["cells"]))
+
+        url = "cube/sales/aggregate?drilldown=item&layout=columns"
+        response, status = self.get(url)
+        self.assertEqual(2, len(response["cells"]["item.item"]))
+
+
+class _ClientResponse(object):
+    """Response of the test client with the interface of a response opened
+    by urllib."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def getcode(self):
+        return self.response.status_code
+
+    def info(self):
+        return self.response.headers
+
+    def read(self):
+        return self.response.data
+
+    def __iter__(self):
+        return iter(self.response.data.splitlines())
+
+
+class _ClientOpener(object):
+    """Opener of the Slicer store that sends requests to the test server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def open(self, url, *args, **kwargs):
+        url = compat.urlparse(url)
+        path = "%s?%s" % (url.path, url.query)
+        return _ClientResponse(self.client.get(path))
+
+
+class SlicerBrowserTestCase(SlicerSalesTestCaseBase):
+    """Slicer browser of the test server."""
+
+    def setUp(self):
+        super(SlicerBrowserTestCase, self).setUp()
+
+        self.store = SlicerStore(url="http://localhost")
+        self.store.opener = _ClientOpener(self.server)
+        cube = self.slicer.cubes_workspace.cube("sales")
+        self.browser = SlicerBrowser(cube, self.store)
+
+    def test_facts(self):
+        facts = list(self.browser.facts(fields=["amount"]))
+        self.assertEqual(9, len(facts))
+
+    def test_facts_cursor(self):
+        facts = self.browser.facts(fields=["amount"], page_size=4,
+                                   cursor="")
+        self.assertEqual([0, 1, 2, 3], [f["amount"] for f in facts])
+        self.assertIsNotNone(facts.next_cursor)
+
+        facts = self.browser.facts(fields=["amount"], page_size=4,
+                                   cursor=facts.next_cursor)
+        self.assertEqual([4, 5, 6, 7], [f["amount"] for f in facts])
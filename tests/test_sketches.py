@@ -0,0 +1,87 @@
+# -*- encoding: utf-8 -*-
+from __future__ import absolute_import
+
+import unittest
+
+from cubes.errors import ArgumentError
+from cubes.query import HyperLogLog, TDigest, dump_sketch, load_sketch
+
+
+class HyperLogLogTestCase(unittest.TestCase):
+    def test_count(self):
+        sketch = HyperLogLog()
+        for i in range(10000):
+            sketch.add(i % 5000)
+
+        self.assertAlmostEqual(5000, sketch.count(), delta=250)
+
+    def test_merge(self):
+        left = HyperLogLog()
+        right = HyperLogLog()
+        for i in range(3000):
+            left.add(i)
+            right.add(i + 1000)
+
+        left.merge(right)
+        self.assertAlmostEqual(4000, left.count(), delta=200)
+
+        with self.assertRaises(ArgumentError):
+            left.merge(HyperLogLog(10))
+
+    def test_serialization(self):
+        sketch = HyperLogLog(10)
+        for value in ["a", "b", "c"]:
+            sketch.add(value)
+
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+        self.assertEqual(10, restored.precision)
+        self.assertEqual(3, restored.count())
+
+
+class TDigestTestCase(unittest.TestCase):
+    def test_exact(self):
+        sketch = TDigest()
+        for value in [1, 2, 3, 4]:
+            sketch.add(value)
+
+        self.assertEqual(2.5, sketch.quantile(0.5))
+        self.assertEqual(1, sketch.quantile(0))
+        self.assertEqual(4, sketch.quantile(1))
+        self.assertIsNone(TDigest().quantile(0.5))
+
+        with self.assertRaises(ArgumentError):
+            sketch.quantile(2)
+
+    def test_merge(self):
+        left = TDigest()
+        right = TDigest()
+        for i in range(10000):
+            (left if i % 2 else right).add(i)
+
+        left.merge(right)
+        self.assertAlmostEqual(4999.5, left.quantile(0.5), delta=50)
+        self.assertAlmostEqual(8999.1, left.quantile(0.9), delta=50)
+
+        restored = TDigest.from_list(left.to_list())
+        self.assertAlmostEqual(left.quantile(0.9), restored.quantile(0.9))
+
+
+class SketchStateTestCase(unittest.TestCase):
+    def test_dump(self):
+        hll = HyperLogLog(10)
+        digest = TDigest()
+        for value in [1, 2, 3, 4]:
+            hll.add(value)
+            digest.add(value)
+
+        restored = load_sketch(dump_sketch(hll))
+        self.assertIsInstance(restored, HyperLogLog)
+        self.assertEqual(4, restored.count())
+
+        restored = load_sketch(dump_sketch(digest))
+        self.assertIsInstance(restored, TDigest)
+        self.assertEqual(2.5, restored.quantile(0.5))
+        self.assertEqual(1, restored.quantile(0))
+
+        with self.assertRaises(ArgumentError):
+            load_sketch("unknown:")
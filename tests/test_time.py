@@ -44,6 +44,29 @@ class DateTimeTestCase(CubesTestCaseBase):
         self.assertEqual([12, 24], self.cal.path(date, ["month", "day"]))
         self.assertEqual([2012, 4], self.cal.path(date, ["year", "quarter"]))
 
+    def test_path_time(self):
+        self.assertEqual(datetime(2012, 1, 1),
+                         self.cal.path_time([2012], ["year"]))
+        self.assertEqual(datetime(2012, 10, 1),
+                         self.cal.path_time([2012, 4], ["year", "quarter"]))
+        self.assertEqual(datetime(2012, 12, 24),
+                         self.cal.path_time(["2012", "12", "24"],
+                                            ["year", "month", "day"]))
+
+        with self.assertRaises(ArgumentError):
+            self.cal.path_time([12], ["month"])
+
+    def test_shift_path(self):
+        units = ["year", "quarter", "month", "day"]
+
+        self.assertEqual([2011, 4, 12],
+                         self.cal.shift_path([2012, 1, 1], units, "month", -1))
+        self.assertEqual([2011, 1],
+                         self.cal.shift_path([2012, 1], units, "year", -1))
+        self.assertEqual([2012, 1, 2, 29],
+                         self.cal.shift_path([2012, 1, 3, 1], units, "day",
+                                             -1))
+
     def test_path_weekday(self):
         # This is monday:
         date = datetime(2013, 10, 21)
@@ -2,6 +2,8 @@ import unittest
 import os
 import json
 import re
+import shutil
+import tempfile
 from cubes.errors import NoSuchCubeError, NoSuchDimensionError
 from cubes.errors import NoSuchAttributeError
 from cubes.workspace import Workspace
@@ -28,6 +30,7 @@ class WorkspaceModelTestCase(WorkspaceTestCaseBase):
         self.assertEqual("contracts", cube.name)
         # self.assertEqual(6, len(cube.dimensions))
         self.assertEqual(1, len(cube.measures))
+        self.assertTrue(cube.is_frozen)
 
     def test_get_namespace_cube(self):
         ws = Workspace()
@@ -94,6 +97,172 @@ class WorkspaceModelTestCase(WorkspaceTestCaseBase):
         with self.assertRaises(ModelError):
             ws.import_model(model)
 
+    def test_shared_dimensions(self):
+        date = {
+            "name": "date",
+            "levels": ["year", "month", "day"],
+            "hierarchies": [
+                {"name": "ymd", "levels": ["year", "month", "day"]},
+                {"name": "ym", "levels": ["year", "month"]}
+            ]
+        }
+        link = {"name": "date", "hierarchies": ["ym"]}
+        model = {
+            "dimensions": [date],
+            "cubes": [
+                {"name": "first", "dimensions": ["date"]},
+                {"name": "second", "dimensions": ["date"]},
+                {"name": "third", "dimensions": [link]},
+                {"name": "fourth", "dimensions": [dict(link)]}
+            ]
+        }
+        ws = Workspace()
+        ws.import_model(model)
+
+        dim = ws.cube("first").dimension("date")
+        self.assertIs(dim, ws.cube("second").dimension("date"))
+
+        clone = ws.cube("third").dimension("date")
+        self.assertIsNot(dim, clone)
+        self.assertEqual(["ym"], [hier.name for hier in clone.hierarchies])
+        self.assertEqual(["year", "month"], clone.level_names)
+        self.assertIs(clone.attribute("year").dimension, clone)
+        self.assertIs(clone, ws.cube("fourth").dimension("date"))
+
+    def test_cube_cache(self):
+        ws = self.default_workspace()
+
+        cube = ws.cube("contracts")
+        self.assertIs(cube, ws.cube("contracts", identity="john"))
+        self.assertIsNot(cube, ws.cube("contracts", locale="sk"))
+
+        # Dimensions linked to the cube are kept by the provider
+        provider = ws.namespace.providers[0]
+        self.assertEqual(2 * len(cube.dimensions),
+                         len(provider.linked_dimensions))
+
+        ws.flush_lookup_cache()
+        self.assertEqual(0, len(provider.linked_dimensions))
+        self.assertIsNot(cube, ws.cube("contracts"))
+
+    def test_cube_metadata_cache(self):
+        model = {
+            "mappings": {"amount": "fact.amount"},
+            "browser_options": {"safe_labels": True},
+            "joins": [{"name": "date", "master": "date_id",
+                       "detail": "dim_date.id"}],
+            "cubes": [
+                {"name": "sales",
+                 "mappings": {"discount": "fact.discount"},
+                 "browser_options": {"page_size": 10},
+                 "joins": [{"name": "date", "alias": "sale_date"}]}
+            ]
+        }
+        ws = Workspace()
+        ws.import_model(model)
+        provider = ws.namespace.providers[0]
+
+        metadata = provider.cube_metadata("sales")
+        self.assertEqual({"amount": "fact.amount",
+                          "discount": "fact.discount"},
+                         metadata["mappings"])
+        self.assertEqual({"safe_labels": True, "page_size": 10},
+                         metadata["browser_options"])
+        self.assertEqual("sale_date", metadata["joins"][0]["alias"])
+        self.assertEqual("dim_date.id", metadata["joins"][0]["detail"])
+
+        # Model metadata are not changed by the merge
+        self.assertEqual({"amount": "fact.amount"}, model["mappings"])
+        self.assertEqual({"safe_labels": True}, model["browser_options"])
+        self.assertNotIn("alias", model["joins"][0])
+
+        # Merged metadata are kept
+        metadata["mappings"] = {}
+        again = provider.cube_metadata("sales")
+        self.assertEqual(2, len(again["mappings"]))
+        self.assertIs(metadata["joins"], again["joins"])
+
+    def test_reload_models(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "model.json")
+
+        versions = []
+
+        def write_model(model):
+            with open(path, "w") as f:
+                json.dump(model, f)
+            # Make sure that the modification time changes
+            versions.append(model)
+            mtime = os.stat(path).st_mtime + len(versions)
+            os.utime(path, (mtime, mtime))
+
+        model = {
+            "dimensions": [{"name": "date", "levels": ["year", "month"]}],
+            "cubes": [
+                {"name": "sales", "dimensions": ["date"],
+                 "measures": ["amount"]},
+                {"name": "orders", "dimensions": ["date"],
+                 "measures": ["count"]}
+            ]
+        }
+        write_model(model)
+
+        ws = Workspace()
+        ws.import_model(path)
+        sales = ws.cube("sales")
+        orders = ws.cube("orders")
+
+        self.assertEqual([], ws.reload_models())
+
+        model["cubes"][1]["measures"].append("discount")
+        write_model(model)
+
+        self.assertEqual(["orders"], ws.reload_models())
+        self.assertIs(sales, ws.cube("sales"))
+        self.assertIsNot(orders, ws.cube("orders"))
+        self.assertEqual(["count", "discount"],
+                         [m.name for m in ws.cube("orders").measures])
+
+        # Broken model is not used
+        with open(path, "w") as f:
+            f.write("{")
+        with self.assertRaises(SyntaxError):
+            ws.reload_models(force=True)
+        self.assertEqual(2, len(ws.cube("orders").measures))
+
+        # Changed dimension changes all the cubes
+        model["dimensions"][0]["levels"].append("day")
+        write_model(model)
+        self.assertEqual(["orders", "sales"], sorted(ws.reload_models()))
+        self.assertEqual(3, len(ws.cube("sales").dimension("date").levels))
+
+    def test_lazy_bundle(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "model.cubesmodel")
+        cache_dir = os.path.join(directory, "cache")
+
+        metadata = read_model_metadata(self.model_path("model.json"))
+        write_model_metadata_bundle(path, metadata)
+
+        ws = Workspace()
+        ws.import_model(path, lazy=True, cache_dir=cache_dir)
+        provider = ws.namespace.providers[0]
+        metadata = provider.cubes_metadata["contracts"]
+        self.assertFalse(metadata.is_loaded)
+
+        cube = ws.cube("contracts")
+        self.assertTrue(metadata.is_loaded)
+        self.assertEqual(1, len(cube.measures))
+
+        # Second workspace reads the cached metadata
+        cached = os.listdir(cache_dir)
+        ws = Workspace()
+        ws.import_model(path, lazy=True, cache_dir=cache_dir)
+        self.assertEqual(1, len(ws.cube("contracts").measures))
+        self.assertEqual(sorted(cached), sorted(os.listdir(cache_dir)))
+
     def test_local_dimension(self):
         # Test whether we can use local dimension with the same name as the
         # public one